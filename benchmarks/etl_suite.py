@@ -0,0 +1,222 @@
+"""Scaling benchmark suite for the ETL generators.
+
+Runs each generator (user pools, CRM, sales, web, data providers) at several scale
+factors of a config, offline and without Snowflake, and records per case:
+
+    rows, seconds, rows/sec     best wall time over --repeat runs
+    peak_rss_mb                 peak resident memory of the process running the case
+    traced_peak_mb              peak Python and NumPy heap during the case (tracemalloc)
+    allocated_blocks            heap blocks the case leaves allocated (caches, leaks)
+
+Scale factors multiply the config's user counts. Every case runs in a fresh process,
+so peak RSS is per case; the tracemalloc metrics come from a separate traced run,
+as tracing slows generation down. Python has no cumulative allocation counter, so
+allocation is tracked as the traced peak and the blocks retained.
+
+Results are written to --output as JSON. With --baseline, they are compared to a
+previous results file, and the suite exits with status 1 when a case is slower or
+uses more memory than the baseline by more than --threshold. Record the baseline on
+the machine that gates changes, e.g. by running once with --output baseline.json.
+
+Usage:
+    python -m benchmarks.etl_suite --config config/loreal.yaml --scales 0.01 0.05 0.1
+    python -m benchmarks.etl_suite --baseline baseline.json --threshold 0.15
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from symmetri.etl.generators.common import Constants, UserPoolManager, Utilities
+from symmetri.etl.generators.crm import CRMDataGenerator
+from symmetri.etl.generators.data_providers import DataProviderGenerator
+from symmetri.etl.generators.transactions import SalesDataGenerator
+from symmetri.etl.generators.web import WebsiteEventsGenerator
+
+CASES = ('user_pools', 'crm', 'sales', 'web', 'data_providers')
+
+# Constants attributes multiplied by the scale factor
+SCALED_COUNTS = ('TOTAL_CRM_USERS', 'TOTAL_WEBSITE_EVENTS_USERS', 'TOTAL_DATA_PROVIDER_USERS')
+
+# Fixed 'now' of the generated dates, so every run generates the same rows
+REFERENCE_TIME = datetime(2025, 1, 1, 12, 0, 0)
+
+# Metrics compared against the baseline: (name, True when higher is better)
+COMPARED_METRICS = (('rows_per_sec', True), ('peak_rss_mb', False), ('traced_peak_mb', False))
+
+
+def _build(config_path, scale, seed):
+    constants = Constants(config_path)
+    for attribute in SCALED_COUNTS:
+        setattr(constants, attribute, max(1, int(getattr(constants, attribute) * scale)))
+    utilities = Utilities(seed=seed, reference_time=REFERENCE_TIME)
+    return constants, utilities, UserPoolManager(constants, utilities)
+
+
+def _case_runner(case, constants, utilities, user_manager):
+    """Return a function that runs the case once and returns the number of rows it generated."""
+    def user_pools():
+        UserPoolManager(constants, utilities).generate_user_pools()
+        return constants.TOTAL_CRM_USERS + constants.TOTAL_WEBSITE_EVENTS_USERS + constants.TOTAL_DATA_PROVIDER_USERS
+
+    def crm():
+        generator = CRMDataGenerator(user_manager, constants, utilities, None)
+        return sum(len(chunk) for chunk in generator.iter_crm_data())
+
+    def sales():
+        generator = SalesDataGenerator(user_manager, constants, utilities, None)
+        return sum(len(transactions) + len(line_items) for transactions, line_items in generator.iter_sales_data())
+
+    def web():
+        generator = WebsiteEventsGenerator(user_manager, constants, utilities, None)
+        return sum(len(chunk) for chunk in generator.iter_website_events())
+
+    def data_providers():
+        generator = DataProviderGenerator(user_manager, constants, utilities, None)
+        providers = generator.generate_data_providers()
+        segments = generator.generate_data_provider_segments()
+        segment_map_rows = sum(len(chunk) for chunk in generator.iter_data_provider_user_segment_map(segments))
+        return len(providers) + len(segments) + segment_map_rows
+
+    return {'user_pools': user_pools, 'crm': crm, 'sales': sales, 'web': web, 'data_providers': data_providers}[case]
+
+
+def run_case(case, config_path, scale, seed, repeat, trace):
+    """Measure one case at one scale; runs in its own process."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        constants, utilities, user_manager = _build(config_path, scale, seed)
+        if case != 'user_pools':
+            user_manager.generate_user_pools()
+        runner = _case_runner(case, constants, utilities, user_manager)
+
+        seconds = None
+        rows = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rows = runner()
+            elapsed = time.perf_counter() - start
+            seconds = elapsed if seconds is None else min(seconds, elapsed)
+        peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+        traced_peak_mb = None
+        allocated_blocks = None
+        if trace:
+            tracemalloc.start()
+            runner()
+            traced_peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            allocated_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+            tracemalloc.stop()
+
+    return {
+        'case': case,
+        'scale': scale,
+        'rows': rows,
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(rows / seconds, 1) if seconds else None,
+        'peak_rss_mb': round(peak_rss_mb, 1),
+        'traced_peak_mb': round(traced_peak_mb, 1) if traced_peak_mb is not None else None,
+        'allocated_blocks': allocated_blocks,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Compare results to a baseline; returns {(case, scale): {metric: relative change}} and the regressions."""
+    baseline_results = {(result['case'], result['scale']): result for result in baseline['results']}
+    changes = {}
+    regressions = []
+    for result in results:
+        key = (result['case'], result['scale'])
+        if key not in baseline_results:
+            continue
+        changes[key] = {}
+        for metric, higher_is_better in COMPARED_METRICS:
+            current, previous = result.get(metric), baseline_results[key].get(metric)
+            if not current or not previous:
+                continue
+            change = current / previous - 1
+            changes[key][metric] = change
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append((key, metric, change))
+    return changes, regressions
+
+
+def _format_change(changes, key, metric):
+    change = changes.get(key, {}).get(metric)
+    return f"{change:+.1%}" if change is not None else ''
+
+
+def run(config_path, cases, scales, seed, repeat, trace, output, baseline_path, threshold):
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for scale in scales:
+        for case in cases:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results.append(executor.submit(run_case, case, config_path, scale, seed, repeat, trace).result())
+
+    report = {
+        'config': config_path,
+        'seed': seed,
+        'repeat': repeat,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': f"{platform.system()} {platform.machine()}, {os.cpu_count()} cpus",
+        'results': results,
+    }
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+
+    changes, regressions = {}, []
+    if baseline_path:
+        with open(baseline_path, 'r') as file:
+            changes, regressions = compare(results, json.load(file), threshold)
+
+    print(f"{'case':>15} {'scale':>7} {'rows':>12} {'seconds':>9} {'rows/sec':>12} {'change':>8} "
+          f"{'rss MB':>8} {'change':>8} {'traced MB':>10} {'change':>8} {'blocks':>9}")
+    for result in results:
+        key = (result['case'], result['scale'])
+        traced = f"{result['traced_peak_mb']:.1f}" if result['traced_peak_mb'] is not None else ''
+        blocks = f"{result['allocated_blocks']:,}" if result['allocated_blocks'] is not None else ''
+        print(f"{result['case']:>15} {result['scale']:>7g} {result['rows']:>12,} {result['seconds']:>9.3f} "
+              f"{result['rows_per_sec']:>12,.0f} {_format_change(changes, key, 'rows_per_sec'):>8} "
+              f"{result['peak_rss_mb']:>8.1f} {_format_change(changes, key, 'peak_rss_mb'):>8} "
+              f"{traced:>10} {_format_change(changes, key, 'traced_peak_mb'):>8} {blocks:>9}")
+    print(f"\nResults written to {output}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond the {threshold:.0%} threshold:")
+        for (case, scale), metric, change in regressions:
+            print(f"  {case} at scale {scale:g}: {metric} {change:+.1%}")
+    return not regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='config/loreal.yaml')
+    parser.add_argument('--cases', nargs='+', default=list(CASES), choices=CASES)
+    parser.add_argument('--scales', type=float, nargs='+', default=[0.01, 0.05, 0.1],
+                        help='factors applied to the user counts of the config')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case; the fastest is kept')
+    parser.add_argument('--skip_allocations', action='store_true',
+                        help='skip the traced run that measures heap allocations')
+    parser.add_argument('--output', default='etl_suite_results.json')
+    parser.add_argument('--baseline', default=None, help='results file of a previous run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='relative slowdown or memory growth reported as a regression')
+    args = parser.parse_args()
+    passed = run(args.config, args.cases, args.scales, args.seed, args.repeat, not args.skip_allocations,
+                 args.output, args.baseline, args.threshold)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == '__main__':
+    main()
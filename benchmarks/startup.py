@@ -0,0 +1,156 @@
+"""Startup-time benchmark of the CLI commands.
+
+Each command of main.py imports its subsystem only when it runs. This benchmark
+measures, per command, the cold import cost of starting it: a fresh interpreter runs
+the imports of the command under `python -X importtime`, and the import time of the
+fastest of --repeat runs is compared against the command's budget.
+
+    import_seconds      time spent importing modules, interpreter startup included
+    wall_seconds        wall time of the whole interpreter run
+    slowest             top-level imports with the largest cumulative time
+
+The suite exits with status 1 when a command is over its budget (scaled by
+--budget_scale, for slower machines) or its imports fail, e.g. because a driver
+is not installed.
+
+Usage:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --commands data-generator --repeat 10 --output startup.json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imports each command runs before doing any work, and their budget in seconds of import
+# time. Keep them in sync with the function-level imports of the commands in main.py and cli.py;
+# 'main' is the command group alone, as for --help.
+COMMANDS = {
+    'main': (
+        ['import main'],
+        0.3
+    ),
+    'add-organization-cli': (
+        ['import main',
+         'from symmetri.api.domain.organizations import Organization',
+         'from symmetri.api.services.organization_management import OrganizationManagementService',
+         'from symmetri.db.postgres import PostgresProvider'],
+        0.6
+    ),
+    'schema-analyzer-cli': (
+        ['import main',
+         'from symmetri.agents.schema_analyzer.core import SchemaAnalyzer',
+         'from symmetri.db.postgres import PostgresProvider',
+         'from symmetri.db.snowflake import SnowflakeDbProvider'],
+        3.0
+    ),
+    'data-generator': (
+        ['import main',
+         'from symmetri.etl.config_compiler import compile_config',
+         'from symmetri.etl.data_generator import DataGenerator',
+         'from symmetri.etl.sinks.embedded import EmbeddedSink'],
+        1.2
+    ),
+    'data-generator --sink snowflake': (
+        ['import main',
+         'from symmetri.etl.config_compiler import compile_config',
+         'from symmetri.etl.data_generator import DataGenerator',
+         'from symmetri.etl.snowflake.connection_manager import SnowflakeConnectionManager'],
+        2.0
+    ),
+}
+
+_IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+def measure(statements):
+    """Run the statements in a fresh interpreter with -X importtime.
+
+    Returns:
+        tuple: (import seconds, wall seconds, [(top-level module, cumulative seconds)],
+            error output or None)
+    """
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', '\n'.join(statements)],
+                             cwd=REPO_ROOT, capture_output=True, text=True)
+    wall_seconds = time.perf_counter() - start
+
+    top_level = []
+    errors = []
+    for line in process.stderr.splitlines():
+        match = _IMPORT_TIME_LINE.match(line)
+        if match is None:
+            if not line.startswith('import time:'):
+                errors.append(line)
+        elif not match.group(3):
+            top_level.append((match.group(4), int(match.group(2)) / 1e6))
+    import_seconds = sum(seconds for _, seconds in top_level)
+    error = '\n'.join(errors[-3:]) if process.returncode != 0 else None
+    return import_seconds, wall_seconds, top_level, error
+
+
+def run(commands, repeat, budget_scale, top, output):
+    results = []
+    for command in commands:
+        statements, budget = COMMANDS[command]
+        best = None
+        for _ in range(repeat):
+            measured = measure(statements)
+            if measured[3] is not None:
+                best = measured
+                break
+            if best is None or measured[0] < best[0]:
+                best = measured
+        import_seconds, wall_seconds, top_level, error = best
+        slowest = sorted(top_level, key=lambda item: -item[1])[:top]
+        results.append({
+            'command': command,
+            'import_seconds': round(import_seconds, 4),
+            'wall_seconds': round(wall_seconds, 4),
+            'budget_seconds': round(budget * budget_scale, 4),
+            'over_budget': error is None and import_seconds > budget * budget_scale,
+            'error': error,
+            'slowest': [{'module': module, 'seconds': round(seconds, 4)} for module, seconds in slowest],
+        })
+
+    if output:
+        with open(output, 'w') as file:
+            json.dump({'python': sys.version.split()[0], 'repeat': repeat, 'results': results}, file, indent=2)
+
+    print(f"{'command':<32} {'import s':>9} {'wall s':>8} {'budget s':>9}  slowest imports")
+    for result in results:
+        if result['error'] is not None:
+            status = 'FAILED: ' + result['error'].splitlines()[-1]
+        else:
+            status = ', '.join(f"{item['module']} {item['seconds']:.2f}" for item in result['slowest'])
+            if result['over_budget']:
+                status = 'OVER BUDGET; ' + status
+        print(f"{result['command']:<32} {result['import_seconds']:>9.3f} {result['wall_seconds']:>8.3f} "
+              f"{result['budget_seconds']:>9.2f}  {status}")
+
+    failed = [result['command'] for result in results if result['over_budget'] or result['error'] is not None]
+    if failed:
+        print(f"\n{len(failed)} command(s) over budget or failing to import: {', '.join(failed)}")
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--commands', nargs='+', default=list(COMMANDS), choices=COMMANDS)
+    parser.add_argument('--repeat', type=int, default=5, help='cold starts per command; the fastest is kept')
+    parser.add_argument('--budget_scale', type=float, default=1.0,
+                        help='factor applied to every budget, e.g. 2 on a machine twice as slow')
+    parser.add_argument('--top', type=int, default=3, help='slowest top-level imports listed per command')
+    parser.add_argument('--output', default=None, help='JSON file to write the results to')
+    args = parser.parse_args()
+    passed = run(args.commands, args.repeat, args.budget_scale, args.top, args.output)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == '__main__':
+    main()
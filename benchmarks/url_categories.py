@@ -0,0 +1,67 @@
+"""Micro-benchmark for page category resolution of website events.
+
+Compares the per-event linear substring scan over url_category_patterns
+(the former WebsiteEventsGenerator.get_page_category_from_url) with the
+compiled UrlCategoryIndex, both by URL string and by integer URL index.
+
+Usage:
+    python -m benchmarks.url_categories --config config/unilever.yaml --events 1000000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from symmetri.etl.generators.common import Constants
+from symmetri.etl.generators.url_index import UrlCategoryIndex
+
+
+def linear_scan(url, url_category_patterns, page_categories):
+    for pattern, category in url_category_patterns.items():
+        if pattern in url:
+            return category
+    return random.choice(page_categories)
+
+
+def run(config_path, num_events):
+    constants = Constants(config_path)
+    rng = np.random.default_rng(42)
+
+    build_start = time.perf_counter()
+    index = UrlCategoryIndex.from_constants(constants)
+    build_seconds = time.perf_counter() - build_start
+
+    url_indices = rng.integers(0, len(index.urls), size=num_events)
+    event_urls = [index.urls[i] for i in url_indices]
+
+    start = time.perf_counter()
+    [linear_scan(url, constants.URL_CATEGORY_PATTERNS, constants.PAGE_CATEGORIES) for url in event_urls]
+    scan_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index.categorize(event_urls)
+    string_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index.category_codes(url_indices)
+    integer_seconds = time.perf_counter() - start
+
+    print(f"{len(index.urls)} configured URLs, {len(constants.URL_CATEGORY_PATTERNS)} patterns, "
+          f"index built in {build_seconds * 1000:.2f} ms")
+    print(f"{'method':>22} {'seconds':>10} {'events/sec':>16} {'speedup':>9}")
+    for name, seconds in (('linear scan', scan_seconds), ('index by url string', string_seconds),
+                          ('index by url index', integer_seconds)):
+        print(f"{name:>22} {seconds:>10.3f} {num_events / seconds:>16,.0f} {scan_seconds / seconds:>8.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='config/unilever.yaml')
+    parser.add_argument('--events', type=int, default=1_000_000)
+    args = parser.parse_args()
+    run(args.config, args.events)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Throughput benchmark for user identity pool generation.
+
+Compares the per-user Faker/hashlib loop (Utilities.generate_user_email_sha256_pool)
+against the batched digest pool builder (Utilities.generate_user_digest_pool).
+
+The legacy loop runs at roughly 5k users/sec, so it is measured on at most
+--legacy_max users and its time at the requested size is extrapolated.
+
+Usage:
+    python -m benchmarks.user_pool --sizes 1000000 10000000 50000000
+"""
+import argparse
+import time
+
+from symmetri.etl.generators.common import Utilities
+
+
+def _time_call(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run(sizes, legacy_max, methods):
+    utilities = Utilities()
+
+    legacy_users = min(legacy_max, max(sizes))
+    legacy_seconds, _ = _time_call(utilities.generate_user_email_sha256_pool, legacy_users)
+    legacy_rate = legacy_users / legacy_seconds
+
+    print(f"{'users':>12} {'method':>8} {'seconds':>10} {'users/sec':>14} {'speedup':>9}")
+    for size in sizes:
+        estimated = ' (est.)' if size > legacy_users else ''
+        print(f"{size:>12,} {'legacy':>8} {size / legacy_rate:>10.2f} {legacy_rate:>14,.0f} {'1.0x':>9}{estimated}")
+        for method in methods:
+            seconds, digests = _time_call(utilities.generate_user_digest_pool, size, method=method)
+            rate = size / seconds
+            print(f"{size:>12,} {method:>8} {seconds:>10.2f} {rate:>14,.0f} {rate / legacy_rate:>8.1f}x")
+            del digests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000_000, 10_000_000, 50_000_000])
+    parser.add_argument('--legacy_max', type=int, default=100_000,
+                        help='maximum number of users to run through the legacy loop')
+    parser.add_argument('--methods', nargs='+', default=['mix', 'sha256'], choices=['mix', 'sha256'])
+    args = parser.parse_args()
+    run(args.sizes, args.legacy_max, args.methods)
+
+
+if __name__ == '__main__':
+    main()
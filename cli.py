@@ -1,14 +1,15 @@
 import os
 
-from symmetri.agents.schema_analyzer.core import SchemaAnalyzer
-from symmetri.api.domain.organizations import Organization
-from symmetri.api.services.organization_management import OrganizationManagementService
-from symmetri.db.postgres import PostgresProvider
-from symmetri.db.snowflake import SnowflakeDbProvider
+# Commands import what they use when they run, so importing this module stays cheap and
+# add_organization does not load the LLM SDKs or the Snowflake connector
 
 
 def schema_analyzer(snowflake_db: str, organization_code: str,
                     llm: str, model: str):
+    from symmetri.agents.schema_analyzer.core import SchemaAnalyzer
+    from symmetri.db.postgres import PostgresProvider
+    from symmetri.db.snowflake import SnowflakeDbProvider
+
     snowflake_db_provider = SnowflakeDbProvider(
         database=snowflake_db,
         schema='SYMMETRI',
@@ -27,10 +28,17 @@ def schema_analyzer(snowflake_db: str, organization_code: str,
         postgres_provider=postgres_db_provider,
         llm_name=llm, model_name=model
     )
-    schema_analyzer.analyze_schema(organization_code=organization_code)
+    try:
+        schema_analyzer.analyze_schema(organization_code=organization_code)
+    finally:
+        snowflake_db_provider.close()
 
 
 def add_organization(code: str, name: str):
+    from symmetri.api.domain.organizations import Organization
+    from symmetri.api.services.organization_management import OrganizationManagementService
+    from symmetri.db.postgres import PostgresProvider
+
     postgres_db = os.environ.get('POSTGRES_DATABASE', None)
     postgres_schema = os.environ.get('POSTGRES_SCHEMA', None)
 
@@ -1,12 +1,14 @@
 import os
+from datetime import datetime
 
 import click
 from dotenv import load_dotenv
 
-from cli import audience_planner, schema_analyzer, add_organization
 from symmetri.symmetri_logger import setup_logs
-from symmetri.etl.data_generator import DataGenerator
-from symmetri.etl.snowflake.connection_manager import SnowflakeConnectionManager
+
+# Each command imports its subsystem (LLM SDKs, database drivers, pandas and the generators)
+# only when it runs, so starting a command does not pay for the others; see benchmarks/startup.py
+
 
 @click.group()
 def commands():
@@ -27,6 +29,7 @@ def commands():
     required=True
 )
 def audience_planner_cli(llm: str, model: str):
+    from cli import audience_planner
     audience_planner(llm=llm, model=model)
 
 
@@ -56,6 +59,7 @@ def audience_planner_cli(llm: str, model: str):
     required=True
 )
 def schema_analyzer_cli(llm: str, model: str, snowflake_db: str, org_code: str):
+    from cli import schema_analyzer
     schema_analyzer(
         snowflake_db=snowflake_db, organization_code=org_code,
         llm=llm, model=model
@@ -76,6 +80,7 @@ def schema_analyzer_cli(llm: str, model: str, snowflake_db: str, org_code: str):
     required=True
 )
 def add_organization_cli(code: str, name: str):
+    from cli import add_organization
     add_organization(code, name)
 
 
@@ -98,20 +103,190 @@ def add_organization_cli(code: str, name: str):
     help='the snowflake database to load the data into',
     required=True
 )
-def data_generator(config_file:str, output_dir:str, snowflake_db:str):
-    scm = SnowflakeConnectionManager(
-        snowflake_database=snowflake_db,
-        snowflake_schema='SYMMETRI'
-    )
-    connection = scm.get_connection()
-    connection.close()
-
-    generator = DataGenerator(
-        config_path=config_file, 
-        output_dir=output_dir, 
-        snowflake_db=snowflake_db, 
-        snowflake_schema='SYMMETRI'
-    )
+@click.option(
+    '--memory_budget_mb', '-m',
+    type=int,
+    default=1024,
+    help='approximate memory budget per in-flight chunk; tables are generated and loaded in chunks that fit it',
+    required=False
+)
+@click.option(
+    '--workers', '-w',
+    type=int,
+    default=1,
+    help='number of processes generating the large tables; the output does not depend on it',
+    required=False
+)
+@click.option(
+    '--seed',
+    type=int,
+    default=None,
+    help='the root seed of all random draws (default: the seed in the config file, else 42)',
+    required=False
+)
+@click.option(
+    '--output_format', '-f',
+    type=click.Choice(['csv', 'parallel_csv', 'parquet']),
+    default='csv',
+    help='the format of the generated files: gzip-compressed csv, csv compressed on a thread pool, '
+         'or parquet typed after the data model',
+    required=False
+)
+@click.option(
+    '--parquet_compression',
+    type=click.Choice(['snappy', 'zstd']),
+    default='snappy',
+    help='the compression codec of parquet files',
+    required=False
+)
+@click.option(
+    '--row_group_size',
+    type=int,
+    default=1_000_000,
+    help='the number of rows per parquet row group',
+    required=False
+)
+@click.option(
+    '--csv_compression',
+    type=click.Choice(['gzip', 'zstd']),
+    default='gzip',
+    help='the compression codec of parallel_csv files',
+    required=False
+)
+@click.option(
+    '--writer_threads',
+    type=int,
+    default=None,
+    help='the number of threads formatting and compressing each parallel_csv file (default: number of cpus)',
+    required=False
+)
+@click.option(
+    '--stage_limit', '-s',
+    type=str,
+    multiple=True,
+    help='a concurrency limit as STAGE=N, e.g. tables=4, generate=2, write=2 or load=4; may be repeated',
+    required=False
+)
+@click.option(
+    '--load_mode', '-l',
+    type=click.Choice(['stream', 'copy']),
+    default='stream',
+    help='stream chunks into snowflake as they are generated, or copy the written files in via the table stage',
+    required=False
+)
+@click.option(
+    '--upload_parallel',
+    type=int,
+    default=4,
+    help='the number of threads uploading each file in copy mode',
+    required=False
+)
+@click.option(
+    '--previous_manifest',
+    type=click.Path(exists=True),
+    default=None,
+    help='the manifest (or output directory) of a previous run; generates and merges only the activity since then',
+    required=False
+)
+@click.option(
+    '--window_start',
+    type=click.DateTime(),
+    default=None,
+    help='the start of the incremental window (default: the end of the previous run); needs --previous_manifest',
+    required=False
+)
+@click.option(
+    '--window_end',
+    type=click.DateTime(),
+    default=None,
+    help='the end of the incremental window (default: now); needs --previous_manifest',
+    required=False
+)
+@click.option(
+    '--reference_time',
+    type=click.DateTime(),
+    default=None,
+    help='the time a full run generates its dates relative to (default: now); incremental runs use --window_end',
+    required=False
+)
+@click.option(
+    '--sink',
+    type=click.Choice(['snowflake', 'duckdb', 'sqlite']),
+    default='snowflake',
+    help='where to load the data: snowflake, or a local duckdb/sqlite database file that needs no credentials',
+    required=False
+)
+@click.option(
+    '--sink_path',
+    type=str,
+    default=None,
+    help='the database file of a duckdb/sqlite sink (default: <snowflake_db>.<sink> in the output directory)',
+    required=False
+)
+def data_generator(config_file:str, output_dir:str, snowflake_db:str, memory_budget_mb:int, workers:int,
+                   seed:int, output_format:str, parquet_compression:str, row_group_size:int, csv_compression:str,
+                   writer_threads:int, stage_limit:tuple[str, ...], load_mode:str, upload_parallel:int,
+                   previous_manifest:str, window_start:datetime, window_end:datetime, reference_time:datetime,
+                   sink:str, sink_path:str):
+    from symmetri.etl.config_compiler import compile_config
+    from symmetri.etl.data_generator import DataGenerator
+    from symmetri.etl.pipeline import DEFAULT_STAGE_LIMITS
+
+    # The window bounds an incremental run; a full run is dated relative to --reference_time
+    if previous_manifest is None and (window_start is not None or window_end is not None):
+        raise click.UsageError('--window_start and --window_end need --previous_manifest; '
+                               'use --reference_time to date a full run')
+    if previous_manifest is not None and reference_time is not None:
+        raise click.UsageError('--reference_time applies to full runs; use --window_end for an incremental run')
+
+    stage_limits = {}
+    for limit in stage_limit:
+        stage, _, value = limit.partition('=')
+        if stage not in DEFAULT_STAGE_LIMITS:
+            raise click.BadParameter(f'unknown stage {stage!r} in {limit}; expected one of '
+                                     f'{", ".join(DEFAULT_STAGE_LIMITS)}', param_hint='--stage_limit')
+        if not value.isdigit() or int(value) < 1:
+            raise click.BadParameter(f'expected STAGE=N with N >= 1, got {limit}', param_hint='--stage_limit')
+        stage_limits[stage] = int(value)
+
+    # Reject an invalid config before connecting to anything
+    compile_config(config_file)
+    if sink == 'snowflake':
+        from symmetri.etl.snowflake.connection_manager import SnowflakeConnectionManager
+
+        # Fail fast on bad credentials; the session opened here stays in the pool for the loads
+        SnowflakeConnectionManager(
+            snowflake_database=snowflake_db,
+            snowflake_schema='SYMMETRI'
+        )
+
+    try:
+        generator = DataGenerator(
+            config_path=config_file,
+            output_dir=output_dir,
+            snowflake_db=snowflake_db,
+            snowflake_schema='SYMMETRI',
+            memory_budget_mb=memory_budget_mb,
+            workers=workers,
+            seed=seed,
+            output_format=output_format,
+            parquet_compression=parquet_compression,
+            row_group_size=row_group_size,
+            csv_compression=csv_compression,
+            writer_threads=writer_threads,
+            stage_limits=stage_limits,
+            load_mode=load_mode,
+            upload_parallel=upload_parallel,
+            previous_manifest=previous_manifest,
+            window_start=window_start,
+            window_end=window_end,
+            reference_time=reference_time,
+            sink=sink,
+            sink_path=sink_path
+        )
+    except ValueError as e:
+        # An incremental run that does not fit its previous run, or an empty window
+        raise click.UsageError(str(e))
     generator.generate_all_data()
 
 
@@ -3,6 +3,7 @@ DROP TABLE IF EXISTS DATA_PROVIDER_SEGMENTS;
 DROP TABLE IF EXISTS DATA_PROVIDERS;
 DROP TABLE IF EXISTS WEBSITE_EVENTS;
 DROP TABLE IF EXISTS SALES_LINE_ITEMS;
+DROP TABLE IF EXISTS PRODUCTS;
 DROP TABLE IF EXISTS SALES_TRANSACTIONS;
 DROP TABLE IF EXISTS CRM_USERS;
 
@@ -52,6 +53,16 @@ CREATE OR REPLACE TABLE SALES_LINE_ITEMS (
     total_line_amount DECIMAL(18,2)
 );
 
+-- Create PRODUCTS table
+CREATE OR REPLACE TABLE PRODUCTS (
+    product_id INT NOT NULL PRIMARY KEY,
+    product_category STRING,
+    product_sub_category STRING,
+    product_type STRING,
+    product_brand STRING,
+    product_name STRING
+);
+
 -- Create WEBSITE_EVENTS table
 CREATE OR REPLACE TABLE WEBSITE_EVENTS (
     event_id INT NOT NULL PRIMARY KEY,
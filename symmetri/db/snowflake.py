@@ -3,76 +3,53 @@ from typing import Any, Dict, List
 
 import snowflake
 import snowflake.connector as snow
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import serialization
 
-from symmetri.db.base import DbProvider, Column
+from symmetri.db.base import DbProvider, Column, Table
+from symmetri.db.snowflake_sessions import get_session_pool
 
 
 class SnowflakeDbProvider(DbProvider):
 
     def __init__(self, database: str, schema: str):
         super().__init__(database, schema)
-        self.user = os.environ.get('SNOWFLAKE_DB_USER', None)
-        self.private_key_path = os.environ.get('SNOWFLAKE_PRIVATE_KEY_PATH', None)
-        self.private_key_passphrase = os.environ.get('SNOWFLAKE_PRIVATE_KEY_PASSPHRASE', None)
-        self.account = os.environ.get('SNOWFLAKE_ACCOUNT', None)
         self.warehouse = os.environ.get('SNOWFLAKE_COMPUTE_WAREHOUSE', None)
-        self.role = os.environ.get('SNOWFLAKE_DB_ROLE', None)
-        self.private_key = self._load_private_key()
+        # Sessions and the key-pair credential are shared with the ETL loaders of the same database
+        self.session_pool = get_session_pool(database)
 
     def get_connection_for_schema(self, schema: str):
-        snow.paramstyle = 'qmark'
-        return snow.connect(
-            user=self.user.upper(),
-            private_key=self._get_private_key_pkcs8(),
-            account=self.account.upper(),
-            database=self.database.upper(),
-            warehouse=self.warehouse.upper(),
-            role=self.role.upper(),
-            autocommit=False
-        )
-        
-    def _load_private_key(self):
-        """Load the private key from file and return the key object."""
-        try:
-            with open(self.private_key_path, 'rb') as key_file:
-                p_key = serialization.load_pem_private_key(
-                    key_file.read(),
-                    password=self.private_key_passphrase.encode() if self.private_key_passphrase else None,
-                    backend=default_backend()
-                )
-                return p_key
-        except Exception as e:
-            raise Exception(f"Failed to load private key: {str(e)}")
-
-    def _get_private_key_pkcs8(self):
-        """Convert the private key to PKCS8 format as required by Snowflake."""
-        if not self.private_key:
-            raise Exception("Private key not loaded")
-        
-        try:
-            private_key_bytes = self.private_key.private_bytes(
-                encoding=serialization.Encoding.DER,
-                format=serialization.PrivateFormat.PKCS8,
-                encryption_algorithm=serialization.NoEncryption()
+        """Borrow a pooled session; hand it back with release_connection()."""
+        return self.session_pool.acquire()
+
+    def release_connection(self, connection, discard: bool = False):
+        self.session_pool.release(connection, discard=discard)
+
+    def session(self):
+        """Borrow a pooled session for the duration of a with block."""
+        return self.session_pool.session()
+
+    def close(self):
+        """Close the idle sessions of the pool."""
+        self.session_pool.close()
+
+    def get_default_catalog(self, table_names: list[str] = None) -> list[Table]:
+        with self.session() as connection:
+            return self.get_catalog(
+                connection=connection,
+                schema=self.get_db_provider_schema(),
+                table_names=table_names
             )
-            return private_key_bytes
-        except Exception as e:
-            raise Exception(f"Failed to convert private key to PKCS8: {str(e)}")
 
     def suspend_warehouse(self):
-        connection = self.get_default_connection()
-        try:
-            cursor = connection.cursor()
-            cursor.execute("ALTER WAREHOUSE %s SUSPEND IF SUSPENDED" % self.warehouse)
-            cursor.close()
-        except snowflake.connector.errors.ProgrammingError:
-            # ignore this exception silently.
-            # this exception is thrown by snowflake when the compute warehouse cannot be suspended
-            # because it is not in active state
-            pass
-        connection.close()
+        with self.session() as connection:
+            try:
+                cursor = connection.cursor()
+                cursor.execute("ALTER WAREHOUSE %s SUSPEND IF SUSPENDED" % self.warehouse)
+                cursor.close()
+            except snowflake.connector.errors.ProgrammingError:
+                # ignore this exception silently.
+                # this exception is thrown by snowflake when the compute warehouse cannot be suspended
+                # because it is not in active state
+                pass
 
     def get_table_columns(self, connection, schema: str, tables_in_filter: set[str]) -> dict[str, list[Column]]:
         cursor = connection.cursor(snow.DictCursor)
@@ -112,26 +89,16 @@ class SnowflakeDbProvider(DbProvider):
         Returns:
             List of result rows
         """
-        conn = self.connect()
-        cursor = None
-        
-        try:
+        with self.session() as conn:
             cursor = conn.cursor()
-            
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-            
-            results = cursor.fetchall()
-            
-            return results
-            
-        except Exception as e:
-            raise
-            
-        finally:
-            if cursor:
+            try:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+
+                return cursor.fetchall()
+            finally:
                 cursor.close()
     
     def get_table_schema(self, table_name: str) -> List[Dict[str, Any]]:
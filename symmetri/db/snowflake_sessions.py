@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+import snowflake.connector as snow
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+
+
+@lru_cache(maxsize=None)
+def load_private_key_der(private_key_path: str, private_key_passphrase: str = None) -> bytes:
+    """Load a PEM private key and return it as the PKCS8 DER bytes Snowflake expects.
+
+    The result is cached per key file, so the key is read and converted once per process.
+    """
+    try:
+        with open(private_key_path, 'rb') as key_file:
+            p_key = serialization.load_pem_private_key(
+                key_file.read(),
+                password=private_key_passphrase.encode() if private_key_passphrase else None,
+                backend=default_backend()
+            )
+    except Exception as e:
+        raise Exception(f"Failed to load private key: {str(e)}")
+
+    try:
+        return p_key.private_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+    except Exception as e:
+        raise Exception(f"Failed to convert private key to PKCS8: {str(e)}")
+
+
+class SnowflakeSessionPool(object):
+    """Thread-safe pool of key-pair authenticated Snowflake sessions for one database.
+
+    Sessions are kept alive and handed out again after release(), so a run pays the
+    authentication handshake once per concurrent session instead of once per table.
+    The pool does not limit how many sessions are out at once; it keeps at most
+    max_idle of them open between uses.
+    """
+
+    def __init__(self, database: str, user: str, account: str, warehouse: str, role: str,
+                 private_key_der: bytes, max_idle: int = 8):
+        self.database = database
+        self.user = user
+        self.account = account
+        self.warehouse = warehouse
+        self.role = role
+        self.private_key_der = private_key_der
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+        # Load summary counters
+        self.sessions_opened = 0
+        self.sessions_reused = 0
+        self.connect_seconds = 0.0
+
+    @classmethod
+    def from_env(cls, database: str) -> 'SnowflakeSessionPool':
+        """Create a pool with the credentials of the SNOWFLAKE_* environment variables."""
+        return cls(
+            database=database,
+            user=os.environ.get('SNOWFLAKE_DB_USER', None),
+            account=os.environ.get('SNOWFLAKE_ACCOUNT', None),
+            warehouse=os.environ.get('SNOWFLAKE_COMPUTE_WAREHOUSE', None),
+            role=os.environ.get('SNOWFLAKE_DB_ROLE', None),
+            private_key_der=load_private_key_der(
+                os.environ.get('SNOWFLAKE_PRIVATE_KEY_PATH', None),
+                os.environ.get('SNOWFLAKE_PRIVATE_KEY_PASSPHRASE', None)
+            )
+        )
+
+    def connect(self):
+        """Open a new session; the caller owns it and closes it."""
+        start = time.perf_counter()
+        snow.paramstyle = 'qmark'
+        connection = snow.connect(
+            user=self.user.upper(),
+            private_key=self.private_key_der,
+            account=self.account.upper(),
+            database=self.database.upper(),
+            warehouse=self.warehouse.upper(),
+            role=self.role.upper(),
+            autocommit=False,
+            client_session_keep_alive=True
+        )
+        with self._lock:
+            self.sessions_opened += 1
+            self.connect_seconds += time.perf_counter() - start
+        return connection
+
+    def acquire(self):
+        """Hand out an idle session, or open a new one when none is idle."""
+        with self._lock:
+            while self._idle:
+                connection = self._idle.pop()
+                if not connection.is_closed():
+                    self.sessions_reused += 1
+                    return connection
+        return self.connect()
+
+    def release(self, connection, discard: bool = False):
+        """Return a session to the pool; uncommitted work is rolled back."""
+        if connection.is_closed():
+            return
+        if not discard:
+            try:
+                connection.rollback()
+            except Exception:
+                discard = True
+        with self._lock:
+            if not discard and len(self._idle) < self.max_idle:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    @contextmanager
+    def session(self):
+        """Borrow a session for the duration of the block; it is discarded if the block fails."""
+        connection = self.acquire()
+        try:
+            yield connection
+        except Exception:
+            self.release(connection, discard=True)
+            raise
+        self.release(connection)
+
+    def close(self):
+        """Close every idle session."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def summary(self) -> str:
+        """One-line summary of the connection setup cost, for load reports."""
+        return (f"Snowflake sessions: {self.sessions_opened} opened in {self.connect_seconds:.2f}s, "
+                f"{self.sessions_reused} reused")
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_session_pool(database: str) -> SnowflakeSessionPool:
+    """Return the process-wide session pool for a database, creating it on first use."""
+    key = database.upper()
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = SnowflakeSessionPool.from_env(database)
+        return _pools[key]
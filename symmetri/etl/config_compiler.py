@@ -0,0 +1,473 @@
+"""Compile a generation config once into a frozen, validated and precomputed form.
+
+compile_config loads a YAML file through ConfigLoader (imports and directives), fills in
+the defaults, validates it, and precomputes a WeightedChoice (probability and alias
+tables) for every weighted choice of the generators. The result is immutable and is
+cached in memory and on disk, keyed by the content of the file and its imports, so a
+bad config fails before any data is generated and later runs (and shard workers) skip
+the YAML parsing altogether.
+
+The disk cache lives in $SYMMETRI_CONFIG_CACHE (default ~/.cache/symmetri/config);
+setting the variable to an empty string disables it. Entries are pickles, so the directory
+is created private to the user (0700), and a directory other users can write to is
+neither read nor written.
+"""
+import hashlib
+import math
+import os
+import pickle
+import tempfile
+from dataclasses import dataclass
+from numbers import Real
+
+import numpy as np
+
+from symmetri.etl.config_loader import ConfigLoader
+
+# Bump when the compiled form changes, so stale cache entries are not reused
+COMPILER_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'symmetri', 'config')
+
+# Tolerance on the sum of a weight map that must add up to 1
+WEIGHT_SUM_TOLERANCE = 1e-6
+
+# Per-section defaults of every key the generators read
+DEFAULTS = {
+    'user_counts': {
+        'total_crm_users': 500_000,
+        'crm_users_with_transactions_percentage': 0.80,
+        'total_website_events_users': 800_000,
+        'website_users_with_transactions_percentage': 0.30,
+        'website_users_in_crm_percentage': 0.50,
+        'total_data_provider_users': 1_000_000,
+        'data_provider_users_in_website_percentage': 0.20,
+        'data_provider_users_in_crm_percentage': 0.35,
+    },
+    'website': {
+        'names': [],
+        'page_categories': [],
+        'page_urls': {},
+        'event_types': [],
+        'device_types': [],
+        'browsers': [],
+        'referrer_urls': [],
+        'url_category_patterns': {},
+        'event_weights': {},
+    },
+    'crm': {
+        'loyalty_tiers': {},
+        'loyalty_points_ranges': {},
+        'genders': {},
+        'countries': {},
+        'marketing_consent_weights': {},
+        'daily_update_percentage': 0.02,
+    },
+    'products': {
+        'structure': {},
+        'brands': {},
+    },
+    'sales': {
+        'payment_methods': [],
+        'currencies': [],
+        'channels': [],
+        'store_ids': [f'ST{i:03d}' for i in range(1, 51)],  # Used when the config lists none
+    },
+    'data_providers': {
+        'providers': [
+            {'id': 1, 'name': 'Provider 1'},
+            {'id': 2, 'name': 'Provider 2'},
+            {'id': 3, 'name': 'Provider 3'}
+        ],
+        'segment_structure': {
+            'Generic': {
+                'Type1': ['Value1', 'Value2', 'Value3'],
+                'Type2': ['ValueA', 'ValueB', 'ValueC']
+            }
+        },
+    },
+    'validation': {
+        # Allowed deviation of a user pool overlap from its configured percentage
+        'overlap_tolerance': 0.01,
+    },
+}
+
+# Weight maps of the CRM section drawn from per user; they must add up to 1
+CRM_WEIGHT_MAPS = ('loyalty_tiers', 'genders', 'countries', 'marketing_consent_weights')
+
+# Event type weights of page categories without configured event_weights
+DEFAULT_EVENT_WEIGHTS = {
+    'product': {
+        'page_view': 0.3,
+        'product_view': 0.25,
+        'add_to_cart': 0.15,
+        'click': 0.1,
+        'wishlist_add': 0.1,
+        'product_comparison': 0.05,
+        'scroll': 0.05
+    },
+    'checkout': {
+        'page_view': 0.25,
+        'form_submit': 0.25,
+        'purchase': 0.2,
+        'click': 0.15,
+        'remove_from_cart': 0.1,
+        'scroll': 0.05
+    },
+    'other': {
+        'page_view': 0.4,
+        'click': 0.25,
+        'scroll': 0.15,
+        'search': 0.1,
+        'form_submit': 0.05,
+        'login': 0.05
+    },
+}
+
+
+class FrozenDict(dict):
+    """A dict that cannot be modified once built."""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError(f'{type(self).__name__} is read-only')
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+def freeze(value):
+    """Recursively turn dicts into FrozenDicts and lists into tuples."""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def _read_only_array(values, dtype=None):
+    array = np.array(values, dtype=dtype)
+    array.flags.writeable = False
+    return array
+
+
+@dataclass(frozen=True, eq=False)
+class WeightedChoice:
+    """A weighted choice among keys, sampled in constant time per draw with Vose's alias method."""
+    keys: np.ndarray
+    probabilities: np.ndarray
+    alias_probabilities: np.ndarray
+    aliases: np.ndarray
+
+    @classmethod
+    def from_weights(cls, keys, weights) -> 'WeightedChoice':
+        """Build the choice from keys and non-negative weights with a positive sum (normalized here)."""
+        probabilities = np.asarray(weights, dtype=float)
+        probabilities = probabilities / probabilities.sum()
+        count = len(probabilities)
+
+        # Split the scaled probabilities into columns of height 1: each column keeps its own
+        # index with alias_probabilities and falls through to its alias otherwise
+        scaled = probabilities * count
+        alias_probabilities = np.ones(count)
+        aliases = np.arange(count)
+        small = [index for index in range(count) if scaled[index] < 1]
+        large = [index for index in range(count) if scaled[index] >= 1]
+        while small and large:
+            short, tall = small.pop(), large.pop()
+            alias_probabilities[short] = scaled[short]
+            aliases[short] = tall
+            scaled[tall] -= 1 - scaled[short]
+            (small if scaled[tall] < 1 else large).append(tall)
+
+        return cls(_read_only_array(list(keys)), _read_only_array(probabilities),
+                   _read_only_array(alias_probabilities), _read_only_array(aliases, dtype=np.int64))
+
+    @classmethod
+    def from_mapping(cls, weights) -> 'WeightedChoice':
+        return cls.from_weights(list(weights.keys()), list(weights.values()))
+
+    def __reduce__(self):
+        return _restore_weighted_choice, (self.keys, self.probabilities, self.alias_probabilities, self.aliases)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        """Draw integer codes into keys, one uniform draw per sample."""
+        scaled = rng.random(size) * len(self.keys)
+        columns = np.minimum(scaled.astype(np.int64), len(self.keys) - 1)
+        keep = scaled - columns < self.alias_probabilities[columns]
+        return np.where(keep, columns, self.aliases[columns])
+
+
+def _restore_weighted_choice(keys, probabilities, alias_probabilities, aliases):
+    """Unpickle a WeightedChoice with its arrays read-only again."""
+    for array in (keys, probabilities, alias_probabilities, aliases):
+        array.flags.writeable = False
+    return WeightedChoice(keys, probabilities, alias_probabilities, aliases)
+
+
+@dataclass(frozen=True, eq=False)
+class CompiledConfig:
+    """A validated generation config with its defaults filled in and its sampling tables precomputed."""
+    path: str
+    content_hash: str  # sha256 of the config file and its imports
+    config: FrozenDict  # Every section of DEFAULTS, with the defaults filled in
+    choices: FrozenDict  # 'section.key' -> WeightedChoice of every configured weight map
+    event_types: tuple  # Configured event types followed by those only named in event weights
+    event_type_choices: FrozenDict  # Page category -> WeightedChoice over event types
+
+
+def default_event_weights(page_category):
+    """Event type weights of a page category that has no configured event_weights."""
+    if page_category == "Product Pages":
+        return DEFAULT_EVENT_WEIGHTS['product']
+    elif "Checkout" in page_category or "Cart" in page_category:
+        return DEFAULT_EVENT_WEIGHTS['checkout']
+    return DEFAULT_EVENT_WEIGHTS['other']
+
+
+def _with_defaults(config):
+    """Fill in every missing (or empty) key of DEFAULTS, section by section."""
+    merged = dict(config)
+    for section, defaults in DEFAULTS.items():
+        values = config.get(section) or {}
+        merged[section] = {**defaults, **{key: value for key, value in values.items() if value is not None}}
+    # Empty lists fall back to the defaults for the lists that have a non-empty default
+    for section, key in (('sales', 'store_ids'), ('data_providers', 'providers'),
+                         ('data_providers', 'segment_structure')):
+        if not merged[section][key]:
+            merged[section][key] = DEFAULTS[section][key]
+    return merged
+
+
+def _is_number(value):
+    return isinstance(value, Real) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _generates_website_events(config):
+    """Whether the config generates website events (the generator skips them without websites)."""
+    website = config['website']
+    return config['user_counts']['total_website_events_users'] > 0 and website['names'] and website['page_urls']
+
+
+def _weight_problems(name, weights, must_sum_to_one):
+    """Problems of a weight map: key -> non-negative weight, with a positive (or unit) sum."""
+    if not isinstance(weights, dict) or not weights:
+        return [f'{name}: expected a non-empty mapping of weights']
+    problems = [f'{name}.{key}: weight must be a non-negative number, got {value!r}'
+                for key, value in weights.items() if not _is_number(value) or value < 0]
+    if problems:
+        return problems
+    total = sum(weights.values())
+    if must_sum_to_one and abs(total - 1) > WEIGHT_SUM_TOLERANCE:
+        return [f'{name}: weights must add up to 1, got {total:g}']
+    if total <= 0:
+        return [f'{name}: weights must not all be 0']
+    return []
+
+
+def _validate(config):
+    """Return every problem of a config with its defaults filled in."""
+    problems = []
+
+    seed = config.get('seed')
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool) or seed < 0):
+        problems.append(f'seed: expected a non-negative integer, got {seed!r}')
+
+    user_counts = config['user_counts']
+    count_problems = []
+    for key, value in user_counts.items():
+        if key.startswith('total_'):
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                count_problems.append(f'user_counts.{key}: expected a non-negative integer, got {value!r}')
+        elif not _is_number(value) or not 0 <= value <= 1:
+            count_problems.append(f'user_counts.{key}: expected a fraction between 0 and 1, got {value!r}')
+    if count_problems:
+        return problems + count_problems
+
+    # The overlaps are drawn without replacement, so each must fit in the pool it is drawn from
+    crm_users = user_counts['total_crm_users']
+    website_users = user_counts['total_website_events_users']
+    data_provider_users = user_counts['total_data_provider_users']
+    website_in_crm = int(website_users * user_counts['website_users_in_crm_percentage'])
+    data_provider_in_crm = int(data_provider_users * user_counts['data_provider_users_in_crm_percentage'])
+    data_provider_in_website = int(data_provider_users * user_counts['data_provider_users_in_website_percentage'])
+    if website_in_crm > crm_users:
+        problems.append(f'user_counts: {website_in_crm} website users in CRM exceed the {crm_users} CRM users')
+    if data_provider_in_crm > crm_users:
+        problems.append(f'user_counts: {data_provider_in_crm} data provider users in CRM exceed the '
+                        f'{crm_users} CRM users')
+    if website_users > website_in_crm and data_provider_in_website > website_users - website_in_crm:
+        problems.append(f'user_counts: {data_provider_in_website} data provider users in website exceed the '
+                        f'{website_users - website_in_crm} website users outside CRM')
+    if data_provider_in_crm + data_provider_in_website > data_provider_users:
+        problems.append('user_counts: data_provider_users_in_crm_percentage and '
+                        'data_provider_users_in_website_percentage add up to more than 1')
+
+    crm = config['crm']
+    if crm_users > 0:
+        for key in CRM_WEIGHT_MAPS:
+            problems.extend(_weight_problems(f'crm.{key}', crm[key], must_sum_to_one=True))
+        for tier in crm['loyalty_tiers'] if isinstance(crm['loyalty_tiers'], dict) else ():
+            points = crm['loyalty_points_ranges'].get(tier)
+            if not isinstance(points, dict) or not all(_is_number(points.get(bound)) for bound in ('min', 'max')):
+                problems.append(f'crm.loyalty_points_ranges.{tier}: expected numeric min and max')
+            elif points['min'] > points['max']:
+                problems.append(f'crm.loyalty_points_ranges.{tier}: min is above max')
+    if not _is_number(crm['daily_update_percentage']) or not 0 <= crm['daily_update_percentage'] <= 1:
+        problems.append(f"crm.daily_update_percentage: expected a fraction between 0 and 1, "
+                        f"got {crm['daily_update_percentage']!r}")
+
+    website = config['website']
+    if _generates_website_events(config):
+        if not website['page_categories']:
+            problems.append('website.page_categories: expected at least one page category')
+        for category, weights in website['event_weights'].items():
+            problems.extend(_weight_problems(f'website.event_weights.{category}', weights, must_sum_to_one=False))
+
+    sales = config['sales']
+    if crm_users > 0 or website_users > 0:
+        for key in ('payment_methods', 'currencies', 'channels'):
+            if not sales[key]:
+                problems.append(f'sales.{key}: expected at least one value')
+
+    tolerance = config['validation']['overlap_tolerance']
+    if not _is_number(tolerance) or not 0 <= tolerance <= 1:
+        problems.append(f'validation.overlap_tolerance: expected a fraction between 0 and 1, got {tolerance!r}')
+    return problems
+
+
+def _compile_event_types(website):
+    """Per page category, the choice over event types and the full list of event types."""
+    event_types = list(website['event_types'])
+    choices = {}
+    for category in website['page_categories']:
+        weights = website['event_weights'].get(category) or default_event_weights(category)
+        valid_types = [event_type for event_type in weights if event_type in website['event_types']]
+        if not valid_types:
+            valid_types = list(weights)
+        type_weights = [weights[event_type] for event_type in valid_types]
+        if sum(type_weights) <= 0:
+            type_weights = [1] * len(valid_types)
+        for event_type in valid_types:
+            if event_type not in event_types:
+                event_types.append(event_type)
+        choices[category] = WeightedChoice.from_weights(valid_types, type_weights)
+    return tuple(event_types), FrozenDict(choices)
+
+
+def _compile(path, content_hash, raw_config):
+    if not isinstance(raw_config, dict):
+        raise ValueError(f'Invalid config {path}: expected a mapping at the top level')
+    problems = [f'{section}: expected a mapping' for section in DEFAULTS
+                if not isinstance(raw_config.get(section) or {}, dict)]
+    if not problems:
+        config = _with_defaults(raw_config)
+        problems = _validate(config)
+    if problems:
+        raise ValueError(f'Invalid config {path}:\n' + '\n'.join(f'  - {problem}' for problem in problems))
+
+    choices = {
+        f'crm.{key}': WeightedChoice.from_mapping(config['crm'][key])
+        for key in CRM_WEIGHT_MAPS if not _weight_problems(key, config['crm'][key], must_sum_to_one=True)
+    }
+    event_types, event_type_choices = (), FrozenDict()
+    if _generates_website_events(config):
+        event_types, event_type_choices = _compile_event_types(config['website'])
+    return CompiledConfig(path=path, content_hash=content_hash, config=freeze(config),
+                          choices=FrozenDict(choices), event_types=event_types,
+                          event_type_choices=event_type_choices)
+
+
+def _file_digest(path):
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def _is_private_directory(path):
+    """Whether only the current user can write to a directory, so its pickles can be trusted."""
+    if not hasattr(os, 'getuid'):
+        return True
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+def _imports_unchanged(import_digests):
+    try:
+        return all(_file_digest(path) == digest for path, digest in import_digests.items())
+    except OSError:
+        return False
+
+
+# In-process cache: cache key -> (digest of every import, CompiledConfig)
+_compiled_configs = {}
+
+
+def compile_config(config_path: str, cache_dir: str = None) -> CompiledConfig:
+    """Load, validate and compile a config, reusing the cached result while no file changed.
+
+    Args:
+        config_path: YAML config; its imports are resolved relative to its directory
+        cache_dir: Directory of the disk cache (defaults to $SYMMETRI_CONFIG_CACHE or
+            DEFAULT_CACHE_DIR; an empty string disables the disk cache)
+
+    Returns:
+        CompiledConfig: The frozen, compiled config
+
+    Raises:
+        ValueError: Listing every problem of an invalid config
+    """
+    path = os.path.abspath(config_path)
+    with open(path, 'rb') as file:
+        main_digest = hashlib.sha256(file.read()).hexdigest()
+    cache_key = hashlib.sha256(f'{COMPILER_VERSION}:{path}:{main_digest}'.encode()).hexdigest()
+
+    cached = _compiled_configs.get(cache_key)
+    if cached is not None and _imports_unchanged(cached[0]):
+        return cached[1]
+
+    if cache_dir is None:
+        cache_dir = os.getenv('SYMMETRI_CONFIG_CACHE', DEFAULT_CACHE_DIR)
+    cache_file = os.path.join(cache_dir, f'{cache_key}.pickle') if cache_dir else None
+    if cache_file and os.path.exists(cache_file) and _is_private_directory(cache_dir):
+        try:
+            with open(cache_file, 'rb') as file:
+                cached = pickle.load(file)
+        except Exception:
+            cached = None  # Unreadable or from an incompatible version: compile again
+        if cached is not None and _imports_unchanged(cached[0]):
+            _compiled_configs[cache_key] = cached
+            return cached[1]
+
+    loader = ConfigLoader(os.path.dirname(path))
+    raw_config = loader.load_config(os.path.basename(path))
+    import_digests = {import_path: _file_digest(import_path) for import_path in loader.imported_files(path)}
+    content_hash = hashlib.sha256(
+        ':'.join([main_digest] + [import_digests[import_path] for import_path in sorted(import_digests)]).encode()
+    ).hexdigest()
+    compiled = _compile(path, content_hash, raw_config)
+    cached = (import_digests, compiled)
+    _compiled_configs[cache_key] = cached
+
+    if cache_file:
+        # Write to a temporary file first so concurrent runs never read a partial entry
+        tmp_path = None
+        try:
+            os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+            if _is_private_directory(cache_dir):
+                with tempfile.NamedTemporaryFile('wb', dir=cache_dir, suffix='.tmp', delete=False) as tmp_file:
+                    tmp_path = tmp_file.name
+                    pickle.dump(cached, tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, cache_file)
+        except OSError:
+            # The cache is an optimization; a read-only home directory only costs a recompile
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return compiled
@@ -3,12 +3,16 @@ import os
 
 import yaml
 
+# The LibYAML parser is an order of magnitude faster where PyYAML was built with it
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 
 class ConfigLoader:
 
     def __init__(self, base_config_dir="./config"):
         self.base_config_dir = base_config_dir
         self.loaded_configs = {}  # Cache of loaded configs
+        self.import_paths = {}  # Files imported by each loaded config
 
     def load_config(self, config_path):
         """
@@ -29,11 +33,12 @@ class ConfigLoader:
 
         # Load the main config file
         with open(full_config_path, 'r') as file:
-            config = yaml.safe_load(file)
+            config = yaml.load(file, Loader=SafeLoader)
 
         # Handle imports if present
         if 'imports' in config:
             imports = config.pop('imports')
+            self.import_paths[full_config_path] = [os.path.join(self.base_config_dir, path) for path in imports]
             merged_config = {}
 
             # Load and merge each imported config
@@ -57,10 +62,14 @@ class ConfigLoader:
             self.loaded_configs[full_config_path] = copy.deepcopy(config)
             return config
 
+    def imported_files(self, config_path):
+        """Paths of the files imported by a config loaded with load_config."""
+        return list(self.import_paths.get(os.path.join(self.base_config_dir, config_path), []))
+
     def _load_single_config(self, config_path):
         """Load a single config file without processing imports."""
         with open(config_path, 'r') as file:
-            return yaml.safe_load(file)
+            return yaml.load(file, Loader=SafeLoader)
 
     def _deep_merge(self, dict1, dict2):
         """
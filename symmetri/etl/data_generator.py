@@ -1,97 +1,419 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 import pandas as pd
+import pyarrow as pa
 
-import snowflake.connector as snow
-from symmetri.etl.generators.common import Constants, Utilities, UserPoolManager
-from symmetri.etl.generators.crm import CRMDataGenerator
+from symmetri.db.base import Table
+from symmetri.etl.generators.common import DEFAULT_SEED, Constants, Utilities, UserPoolManager
+from symmetri.etl.generators.crm import CRM_UPDATE_COLUMNS, CRMDataGenerator
 from symmetri.etl.generators.data_providers import DataProviderGenerator
 from symmetri.etl.generators.transactions import SalesDataGenerator
 from symmetri.etl.generators.web import WebsiteEventsGenerator
-from symmetri.etl.snowflake.connection_manager import SnowflakeConnectionManager
+from symmetri.etl.instrumentation import REPORT_FILE, RunInstrumentation
+from symmetri.etl.manifest import RunManifest
+from symmetri.etl.pipeline import Pipeline
+from symmetri.etl.schema import load_data_model, primary_key_columns
+from symmetri.etl.sharding import ShardExecutor
+from symmetri.etl.sinks.factory import get_sink
+from symmetri.etl.validation import ForeignKeyCollector, format_checks, require_passed
+from symmetri.etl.writers import DEFAULT_ROW_GROUP_SIZE, arrow_schema, open_dataset_writer, to_arrow_table
+
+# Approximate peak bytes held per user of a chunk while it is generated, formatted and loaded.
+# Used to turn the memory budget into the number of users per chunk for each generator.
+BYTES_PER_USER = {
+    'CRM_USERS': 1_500,
+    'SALES': 8_000,
+    'WEBSITE_EVENTS': 12_000,
+    'DATA_PROVIDER_USER_SEGMENT_MAP': 5_000,
+}
+MIN_CHUNK_USERS = 1_000
+
+# (child table, child columns, parent table, parent columns) verified after every run; a key is
+# only checked when both of its tables were generated by the run
+FOREIGN_KEYS = [
+    ('SALES_LINE_ITEMS', ('transaction_id',), 'SALES_TRANSACTIONS', ('transaction_id',)),
+    ('SALES_LINE_ITEMS', ('product_id',), 'PRODUCTS', ('product_id',)),
+    ('DATA_PROVIDER_SEGMENTS', ('data_provider_id',), 'DATA_PROVIDERS', ('id',)),
+    ('DATA_PROVIDER_USER_SEGMENT_MAP', ('data_provider_id', 'data_provider_segment_id'),
+     'DATA_PROVIDER_SEGMENTS', ('data_provider_id', 'id')),
+]
 
 
 class DataGenerator:
     """Main data generator class that orchestrates the entire process."""
 
-    def __init__(self, config_path: str, output_dir: str, snowflake_db: str, snowflake_schema: str):
-        """Initialize the data generator with config path and output directory."""
+    def __init__(self, config_path: str, output_dir: str, snowflake_db: str, snowflake_schema: str,
+                 memory_budget_mb: int = 1024, workers: int = 1, seed: int = None,
+                 output_format: str = 'csv', parquet_compression: str = 'snappy',
+                 row_group_size: int = DEFAULT_ROW_GROUP_SIZE, csv_compression: str = 'gzip',
+                 writer_threads: int = None, stage_limits: dict[str, int] = None,
+                 load_mode: str = 'stream', upload_parallel: int = 4, previous_manifest: str = None,
+                 window_start: datetime = None, window_end: datetime = None, reference_time: datetime = None,
+                 sink: str = 'snowflake', sink_path: str = None):
+        """Initialize the data generator with config path and output directory.
+
+        Args:
+            config_path: YAML config that drives the data generation
+            output_dir: Directory the generated datasets are written to
+            snowflake_db: Snowflake database to load the data into (names the database file of local sinks)
+            snowflake_schema: Snowflake schema to load the data into
+            memory_budget_mb: Approximate memory allowed per in-flight chunk; tables are
+                generated, written and loaded in chunks sized to fit this budget
+            workers: Number of processes generating shards of the large tables; the
+                output is identical for any number of workers
+            seed: Root seed of all random draws (defaults to the config's seed, then to DEFAULT_SEED);
+                each generator and shard draws from its own stream derived from it
+            output_format: 'csv' for gzip-compressed CSV files, 'parallel_csv' for CSV files
+                formatted and compressed on a thread pool, or 'parquet' for Parquet files
+                typed after the customer data model
+            parquet_compression: Parquet compression codec, 'snappy' or 'zstd'
+            row_group_size: Rows per Parquet row group
+            csv_compression: Compression codec of parallel CSV files, 'gzip' or 'zstd'
+            writer_threads: Threads per parallel CSV file (defaults to the number of CPUs)
+            stage_limits: Concurrency limits overriding pipeline.DEFAULT_STAGE_LIMITS: how many tables
+                run at once ('tables') and how many may generate, write or load at once
+            load_mode: 'stream' to load each chunk through the sink's table loader as it is generated
+                (in Snowflake, a Parquet file per chunk PUT to the table stage and COPYed in; in the
+                embedded sinks, their bulk insert path), or 'copy' to load the finished output
+                files (in Snowflake, PUT to the table stage and COPYed in)
+            upload_parallel: Upload threads per file in copy mode (the PUT PARALLEL option)
+            previous_manifest: Manifest file (or output directory) of a previous run; when given,
+                the run is incremental: it generates the transactions and website events of the
+                window plus a sample of CRM updates, and merges them into the tables; config_path
+                must hold the config of that run
+            window_start: Start of the incremental window (defaults to the end of the previous run's)
+            window_end: End of the incremental window (defaults to now); the window is only used
+                by incremental runs, a full run ignores window_start and window_end
+            reference_time: The 'now' a full run's dates are generated relative to (defaults to now);
+                an incremental run generates relative to window_end instead
+            sink: Where the tables are loaded: 'snowflake', or 'duckdb' / 'sqlite' for a local
+                database file that needs no credentials or network
+            sink_path: Database file of a local sink (defaults to <snowflake_db>.<sink> in output_dir)
+        """
         self.config_path = config_path
         self.output_dir = output_dir
         self.snowflake_db = snowflake_db
         self.snowflake_schema = snowflake_schema
+        self.memory_budget_mb = memory_budget_mb
+        self.workers = workers
+        self.output_format = output_format
+        self.writer_options = {}
+        if output_format == 'parallel_csv':
+            self.writer_options = {'compression': csv_compression, 'threads': writer_threads}
+        elif output_format == 'parquet':
+            self.writer_options = {'compression': parquet_compression, 'row_group_size': row_group_size}
+        self.data_model = load_data_model()
+        self.stage_limits = stage_limits
+        if load_mode not in ('stream', 'copy'):
+            raise ValueError(f'Unknown load mode: {load_mode}')
+        self.load_mode = load_mode
+        self.upload_parallel = upload_parallel
+        self.pipeline = Pipeline(stage_limits)
         os.makedirs(output_dir, exist_ok=True)
 
-        # Initialize components
+        # An incremental run continues the previous run's tables: same seed (hence the same user
+        # pools), ID sequences picking up where they stopped, and a window after the last one
         self.constants = Constants(config_path)
-        self.utilities = Utilities()
+        if seed is None:
+            seed = self.constants.SEED if self.constants.SEED is not None else DEFAULT_SEED
+        self.previous_manifest = RunManifest.load(previous_manifest) if previous_manifest else None
+        delta_window = None
+        if self.previous_manifest is not None:
+            config_hash = self.previous_manifest.config_hash
+            if config_hash is not None and config_hash != self.constants.compiled.content_hash:
+                raise ValueError(f'{config_path} is not the config the previous run was generated from '
+                                 f'({self.previous_manifest.config_path}); an incremental run needs the same '
+                                 f'config to rebuild its user pools')
+            seed = self.previous_manifest.seed
+            window_start = window_start or self.previous_manifest.window_end
+            window_end = window_end or datetime.now().replace(microsecond=0)
+            if window_end <= window_start:
+                raise ValueError(f'Empty incremental window: {window_start} - {window_end}')
+            delta_window = (window_start, window_end)
+            reference_time = window_end
+        self.table_rows = {}
+        self.table_files = {}
+        self.instrumentation = RunInstrumentation()
+        self.foreign_keys = ForeignKeyCollector(FOREIGN_KEYS)
+
+        # Initialize components
+        self.utilities = Utilities(seed=seed, reference_time=reference_time, delta_window=delta_window)
         self.user_manager = UserPoolManager(self.constants, self.utilities)
-        self.snowflake_manager = SnowflakeConnectionManager(
-            snowflake_database=self.snowflake_db,
-            snowflake_schema=self.snowflake_schema
-        )
+        if sink != 'snowflake' and sink_path is None:
+            sink_path = os.path.join(output_dir, f'{snowflake_db.lower()}.{sink}')
+        self.sink_name = sink
+        self.sink = get_sink(sink, self.snowflake_db, self.snowflake_schema, path=sink_path)
 
-    def _save_dataset(self, dataset_df, csv_file, table_name):
-        output_path = f"{self.output_dir}/{csv_file}.gz"
-        dataset_df.to_csv(output_path, index=False, compression='gzip')
-        self.snowflake_manager.write_df_to_table(
-            df=dataset_df, 
-            table_name=table_name
-        )
+    def _chunk_size(self, dataset: str) -> int:
+        """Number of users per chunk for a dataset under the memory budget."""
+        return max(MIN_CHUNK_USERS, self.memory_budget_mb * 1024 * 1024 // BYTES_PER_USER[dataset])
+
+    @property
+    def incremental(self) -> bool:
+        return self.previous_manifest is not None
+
+    def _output_table(self, table_name: str) -> Table:
+        """The data model table of an output; incremental CRM rows only carry the updated columns."""
+        table = self.data_model[table_name]
+        if self.incremental and table_name == 'CRM_USERS':
+            table = Table(table.name, [column for column in table.columns if column.name in CRM_UPDATE_COLUMNS])
+        return table
+
+    def _save_dataset(self, dataset, file_name, table_name):
+        """Write a dataset to an output file and load it into table_name.
+
+        Args:
+            dataset: A DataFrame or Arrow table, or an iterable of DataFrame or Arrow table chunks
+                that are written and loaded one at a time as they are generated
+            file_name: Output file name, without the extension of the output format
+            table_name: Target table
+        """
+        if isinstance(dataset, (pd.DataFrame, pa.Table)):
+            dataset = [dataset]
+        self._save_datasets(((chunk,) for chunk in dataset), [(file_name, table_name)])
+
+    def _save_datasets(self, chunks, outputs):
+        """Stream chunks of one or more tables to their output files and sink tables.
+
+        Args:
+            chunks: Iterable of tuples with one DataFrame or Arrow table per output
+            outputs: List of (file_name, table_name) pairs, aligned with the chunk tuples
+        """
+        # Incremental runs merge on the primary key, so a retried delta does not duplicate rows
+        table_mode = 'merge' if self.incremental else 'replace'
+        if self.incremental:
+            suffix = f"_delta_{self.utilities.reference_time:%Y%m%dT%H%M%S}"
+            outputs = [(file_name + suffix, table_name) for file_name, table_name in outputs]
+
+        table_names = [table_name for _, table_name in outputs]
+        chunks = self.instrumentation.iter_measured('generate', ', '.join(table_names), chunks,
+                                                    count_rows=lambda chunk: sum(len(df) for df in chunk))
+        writers = []
+        loaders = []
+        try:
+            for file_name, table_name in outputs:
+                writers.append(open_dataset_writer(
+                    self.output_format, self.output_dir, file_name, self._output_table(table_name),
+                    **self.writer_options
+                ))
+                if self.load_mode == 'stream':
+                    with self.pipeline.stage('load'):
+                        loaders.append(self.sink.open_table_loader(
+                            table_name, mode=table_mode,
+                            primary_keys=primary_key_columns(self.data_model[table_name])
+                        ))
+
+            # Chunks are handed to the writers and loaders as Arrow tables typed after the data model
+            schemas = [arrow_schema(writer.table) for writer in writers]
+
+            # Write (and stream-load) each chunk on a separate thread while the next one is generated
+            with ThreadPoolExecutor(max_workers=1) as output_executor:
+                pending = None
+                for chunk in self.pipeline.iter_stage('generate', chunks):
+                    if pending is not None:
+                        pending.result()
+                    pending = output_executor.submit(self._output_chunk, chunk, table_names, schemas, writers,
+                                                     loaders)
+                if pending is not None:
+                    pending.result()
+
+            with self.pipeline.stage('load'):
+                for table_name, loader in zip(table_names, loaders):
+                    with self.instrumentation.measure('load', table_name):
+                        loader.commit()
+        finally:
+            for table_name, writer in zip(table_names, writers):
+                with self.instrumentation.measure('write', table_name) as measurement:
+                    writer.close()
+                    if os.path.exists(writer.path):
+                        measurement.bytes = os.path.getsize(writer.path)
+            for loader in loaders:
+                loader.close()
+
+        if self.load_mode == 'copy':
+            # Load the finished files as they are instead of serializing the rows again
+            for (_, table_name), writer in zip(outputs, writers):
+                with self.pipeline.stage('load'), self.instrumentation.measure('load', table_name) as measurement:
+                    measurement.rows = self.sink.copy_files_into_table(
+                        table_name, [writer.path], writer.snowflake_file_format,
+                        upload_parallel=self.upload_parallel, mode=table_mode,
+                        primary_keys=primary_key_columns(self.data_model[table_name]),
+                        columns=[column.name for column in writer.table.columns]
+                    )
+                    measurement.bytes = os.path.getsize(writer.path)
+
+        for (_, table_name), writer in zip(outputs, writers):
+            self.table_rows[table_name] = writer.rows_written
+            self.table_files[table_name] = writer.path
+            print(f"{self.snowflake_schema}.{table_name} table generated with {writer.rows_written} rows")
+
+    def _output_chunk(self, chunk, table_names, schemas, writers, loaders):
+        """Write one chunk of each output to its file and, when streaming, load it into its table."""
+        for i, dataset in enumerate(chunk):
+            self.foreign_keys.add(table_names[i], dataset)
+            # Generators carry integer user indices; join to the digest table only when the chunk is
+            # assembled into the Arrow table handed to the writer and the loader
+            with self.instrumentation.measure('assemble', table_names[i]) as measurement:
+                table = self.user_manager.resolve_user_hashes(to_arrow_table(dataset))
+                table = to_arrow_table(table, schemas[i])
+                measurement.rows = len(table)
+                measurement.bytes = table.nbytes
+            with self.pipeline.stage('write'), self.instrumentation.measure('write', table_names[i]) as measurement:
+                writers[i].write(table)
+                measurement.rows = len(table)
+            if loaders:
+                with self.pipeline.stage('load'), self.instrumentation.measure('load', table_names[i]) as measurement:
+                    loaders[i].append(table)
+                    measurement.rows = len(table)
 
-        print(f"{self.snowflake_schema}.{table_name} table generated with {len(dataset_df)} rows")
-        
     def generate_all_data(self):
         print(f"Starting data generation using configuration from {self.config_path}")
+        if self.incremental:
+            window_start, window_end = self.utilities.delta_window
+            print(f"Incremental run for {window_start} - {window_end}")
         print(f"Output will be saved to {self.output_dir}\n")
+        self.instrumentation = RunInstrumentation()
+        self.foreign_keys = ForeignKeyCollector(FOREIGN_KEYS)
 
-        # Initialize user pools
-        self.user_manager.generate_user_pools()
+        # The sink is closed on failure too, so pooled warehouse sessions are not left open
+        try:
+            # Initialize user pools
+            with self.instrumentation.measure('user_pools') as measurement:
+                self.user_manager.generate_user_pools()
+                measurement.rows = self.user_manager.total_users
 
-        # Generate tables
-        crm_generator = CRMDataGenerator(self.user_manager, self.constants, self.utilities, self.output_dir)
-        crm_users = crm_generator.generate_crm_data()
-        self._save_dataset(
-            dataset_df=crm_users, csv_file="crm_users", 
-            table_name="CRM_USERS"
-        )
+            crm_generator = CRMDataGenerator(self.user_manager, self.constants, self.utilities, self.output_dir)
+            with self.instrumentation.measure('locale_pools'):
+                locale_pools = crm_generator.build_locale_pools()
 
-        sales_generator = SalesDataGenerator(self.user_manager, self.constants, self.utilities, self.output_dir)
-        sales_transactions, sales_line_items = sales_generator.generate_sales_data()
-        self._save_dataset(
-            dataset_df=sales_transactions, csv_file="sales_transactions", 
-            table_name="SALES_TRANSACTIONS"
-        )
-        self._save_dataset(
-            dataset_df=sales_line_items, csv_file="sales_line_items", 
-            table_name="SALES_LINE_ITEMS"
+            with ShardExecutor(self.config_path, self.utilities.seed, self.utilities.reference_time,
+                               locale_pools, workers=self.workers,
+                               delta_window=self.utilities.delta_window) as executor:
+                if self.incremental:
+                    self._generate_delta_tables(executor, crm_generator)
+                else:
+                    self._generate_tables(executor, crm_generator)
+
+            with self.instrumentation.measure('validate') as measurement:
+                checks = self.foreign_keys.checks()
+                measurement.rows = sum(check.rows for check in checks)
+            print("\nForeign key checks:")
+            print(format_checks(checks))
+            require_passed(checks, 'foreign key')
+
+            # Written last, so a failed run leaves the previous manifest to be retried from
+            self._run_manifest().save(self.output_dir)
+
+            print(f"\nData generation complete! All files saved to {self.output_dir}/ "
+                  f"and stored in the {self.sink_name} sink")
+            print(self.sink.summary())
+        finally:
+            self.sink.close()
+
+        report = self.instrumentation.save(self.output_dir)
+        print(f"\nRun report saved to {os.path.join(self.output_dir, REPORT_FILE)}")
+        print(RunInstrumentation.summary_table(report))
+
+    def _next_ids(self) -> dict[str, int]:
+        """The next free ID of each generated ID sequence, after this run's rows."""
+        previous = self.previous_manifest.next_ids if self.incremental else {}
+        return {
+            id_column: previous.get(id_column, 1) + self.table_rows.get(table_name, 0)
+            for id_column, table_name in [('transaction_id', 'SALES_TRANSACTIONS'),
+                                          ('line_item_id', 'SALES_LINE_ITEMS'),
+                                          ('event_id', 'WEBSITE_EVENTS')]
+        }
+
+    def _run_manifest(self) -> RunManifest:
+        window_start = self.utilities.delta_window[0] if self.incremental else None
+        return RunManifest(
+            run_type='incremental' if self.incremental else 'full',
+            config_path=self.config_path,
+            seed=self.utilities.seed,
+            config_hash=self.constants.compiled.content_hash,
+            window_start=window_start,
+            window_end=self.utilities.reference_time,
+            next_ids=self._next_ids(),
+            tables=dict(self.table_rows),
+            files={table_name: os.path.basename(path) for table_name, path in self.table_files.items()}
         )
 
+    def _generate_delta_tables(self, executor: ShardExecutor, crm_generator: CRMDataGenerator):
+        """Generate the activity of the incremental window: CRM updates, sales and website events.
+
+        Products, data providers and segment memberships are not time-based and are left as
+        the previous runs loaded them.
+        """
+        sales_generator = SalesDataGenerator(self.user_manager, self.constants, self.utilities, self.output_dir)
         website_generator = WebsiteEventsGenerator(self.user_manager, self.constants, self.utilities, self.output_dir)
-        website_events = website_generator.generate_website_events()
-        self._save_dataset(
-            dataset_df=website_events, csv_file="website_events", 
-            table_name="WEBSITE_EVENTS"
-        )
+        next_ids = self.previous_manifest.next_ids
 
-        data_provider_generator = DataProviderGenerator(self.user_manager, self.constants, 
+        self.pipeline = Pipeline(self.stage_limits)
+        self.pipeline.add('CRM_USERS', lambda: self._save_dataset(
+            dataset=crm_generator.iter_crm_data(self._chunk_size('CRM_USERS'), executor),
+            file_name="crm_users", table_name="CRM_USERS"
+        ))
+        self.pipeline.add('SALES', lambda: self._save_datasets(
+            sales_generator.iter_sales_data(self._chunk_size('SALES'), executor,
+                                            first_transaction_id=next_ids.get('transaction_id', 1),
+                                            first_line_item_id=next_ids.get('line_item_id', 1)),
+            [("sales_transactions", "SALES_TRANSACTIONS"), ("sales_line_items", "SALES_LINE_ITEMS")]
+        ))
+        self.pipeline.add('WEBSITE_EVENTS', lambda: self._save_dataset(
+            dataset=website_generator.iter_website_events(self._chunk_size('WEBSITE_EVENTS'), executor,
+                                                          first_event_id=next_ids.get('event_id', 1)),
+            file_name="website_events", table_name="WEBSITE_EVENTS"
+        ))
+        self.pipeline.run()
+
+    def _generate_tables(self, executor: ShardExecutor, crm_generator: CRMDataGenerator):
+        """Generate every table, running independent tables concurrently.
+
+        Each table streams chunk by chunk to its file and sink table, so the file
+        writes and loads of one table overlap with the generation of the others. Only
+        DATA_PROVIDER_USER_SEGMENT_MAP waits for another table, the segments it maps to.
+        """
+        sales_generator = SalesDataGenerator(self.user_manager, self.constants, self.utilities, self.output_dir)
+        website_generator = WebsiteEventsGenerator(self.user_manager, self.constants, self.utilities, self.output_dir)
+        data_provider_generator = DataProviderGenerator(self.user_manager, self.constants,
                                                         self.utilities, self.output_dir)
-        data_providers = data_provider_generator.generate_data_providers()
-        data_provider_segments = data_provider_generator.generate_data_provider_segments()
-        data_provider_user_segment_map = data_provider_generator.generate_data_provider_user_segment_map(
-            data_provider_segments
-        )
 
-        self._save_dataset(
-            dataset_df=data_providers, csv_file="data_providers", 
-            table_name="DATA_PROVIDERS"
-        )
-        self._save_dataset(
-            dataset_df=data_provider_segments, csv_file="data_provider_segments", 
-            table_name="DATA_PROVIDER_SEGMENTS"
-        )
-        self._save_dataset(
-            dataset_df=data_provider_user_segment_map, csv_file="data_provider_user_segment_map", 
-            table_name="DATA_PROVIDER_USER_SEGMENT_MAP"
-        )
+        def save_data_provider_segments():
+            data_provider_segments = data_provider_generator.generate_data_provider_segments()
+            self._save_dataset(
+                dataset=data_provider_segments, file_name="data_provider_segments",
+                table_name="DATA_PROVIDER_SEGMENTS"
+            )
+            return data_provider_segments
 
-        print(f"\nData generation complete! All files saved to {self.output_dir}/ and stored in Snowflake")
+        self.pipeline = Pipeline(self.stage_limits)
+        self.pipeline.add('CRM_USERS', lambda: self._save_dataset(
+            dataset=crm_generator.iter_crm_data(self._chunk_size('CRM_USERS'), executor),
+            file_name="crm_users", table_name="CRM_USERS"
+        ))
+        self.pipeline.add('SALES', lambda: self._save_datasets(
+            sales_generator.iter_sales_data(self._chunk_size('SALES'), executor),
+            [("sales_transactions", "SALES_TRANSACTIONS"), ("sales_line_items", "SALES_LINE_ITEMS")]
+        ))
+        self.pipeline.add('PRODUCTS', lambda: self._save_dataset(
+            dataset=sales_generator.products, file_name="products",
+            table_name="PRODUCTS"
+        ))
+        self.pipeline.add('WEBSITE_EVENTS', lambda: self._save_dataset(
+            dataset=website_generator.iter_website_events(self._chunk_size('WEBSITE_EVENTS'), executor),
+            file_name="website_events", table_name="WEBSITE_EVENTS"
+        ))
+        self.pipeline.add('DATA_PROVIDERS', lambda: self._save_dataset(
+            dataset=data_provider_generator.generate_data_providers(), file_name="data_providers",
+            table_name="DATA_PROVIDERS"
+        ))
+        self.pipeline.add('DATA_PROVIDER_SEGMENTS', save_data_provider_segments)
+        self.pipeline.add('DATA_PROVIDER_USER_SEGMENT_MAP', lambda data_provider_segments: self._save_dataset(
+            dataset=data_provider_generator.iter_data_provider_user_segment_map(
+                data_provider_segments, chunk_size=self._chunk_size('DATA_PROVIDER_USER_SEGMENT_MAP'),
+                executor=executor
+            ),
+            file_name="data_provider_user_segment_map", table_name="DATA_PROVIDER_USER_SEGMENT_MAP"
+        ), depends_on=('DATA_PROVIDER_SEGMENTS',))
+        self.pipeline.run()
@@ -1,112 +1,278 @@
 import hashlib
-import random
-from datetime import datetime, timedelta, date
+import zlib
+from datetime import datetime, timedelta
+from functools import lru_cache
 
 import numpy as np
-import yaml
+import pandas as pd
+import pyarrow as pa
 from faker import Faker
 
+from symmetri.etl.config_compiler import WeightedChoice, compile_config
+from symmetri.etl.validation import format_checks, pool_overlap_checks, require_passed
 
-class YAMLConfigLoader:
-    """Loads configuration from YAML files."""
+DEFAULT_SEED = 42
+DIGEST_SIZE = 32
+LOCALE_POOL_SIZE = 1000
 
-    @staticmethod
-    def load_config(config_path):
-        """Load configuration from a YAML file."""
-        with open(config_path, 'r') as file:
-            config = yaml.safe_load(file)
-        return config
+# Relative activity by hour of day (00:00-23:00) used for diurnal timestamps
+DIURNAL_HOUR_WEIGHTS = np.array([
+    0.6, 0.4, 0.3, 0.2, 0.2, 0.3, 0.6, 1.0, 1.4, 1.6, 1.7, 1.8,
+    2.0, 1.9, 1.7, 1.6, 1.6, 1.8, 2.1, 2.4, 2.5, 2.2, 1.6, 1.0
+])
+
+# Relative activity by calendar month (January-December) used for seasonal dates
+SEASONAL_MONTH_WEIGHTS = np.array([0.85, 0.8, 0.9, 0.95, 1.0, 0.95, 0.95, 1.0, 0.95, 1.0, 1.25, 1.45])
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# Alias sampler over the hours of the day, weighted by DIURNAL_HOUR_WEIGHTS
+_DIURNAL_HOUR_CHOICE = WeightedChoice.from_weights(np.arange(24), DIURNAL_HOUR_WEIGHTS)
+
+# Lookup table from a byte value to its two lowercase hex characters
+_HEX_PAIRS = np.frombuffer(''.join(f'{i:02x}' for i in range(256)).encode(), dtype=np.uint8).reshape(256, 2)
+
+
+def fixed_width_string_array(chars):
+    """Arrow string array of the rows of an (n, width) uint8 array of ASCII characters, without copying them."""
+    count, width = chars.shape
+    offsets = np.arange(0, (count + 1) * width, width, dtype=np.int32)
+    return pa.StringArray.from_buffers(count, pa.py_buffer(offsets), pa.py_buffer(np.ascontiguousarray(chars)))
+
+
+@lru_cache(maxsize=64)
+def _seasonal_day_choice(first_day, last_day):
+    """Alias sampler over the days first_day..last_day (datetime64[D]), weighted by SEASONAL_MONTH_WEIGHTS."""
+    days = np.arange(first_day, last_day + np.timedelta64(1, 'D'))
+    months = days.astype('datetime64[M]').astype(np.int64) % 12
+    return WeightedChoice.from_weights(days, SEASONAL_MONTH_WEIGHTS[months])
+
+
+def _mix64(values):
+    """SplitMix64 finalizer: a bijective 64-bit mixing function applied element-wise."""
+    z = values + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
 
 
 class Constants:
-    """Holds all configuration data loaded from YAML."""
+    """Holds all configuration data of a compiled config (see config_compiler.compile_config)."""
 
     def __init__(self, config_path):
-        """Initialize constants from YAML configuration file."""
-        self.config = YAMLConfigLoader.load_config(config_path)
+        """Initialize constants from a YAML configuration file, compiled and validated once."""
+        self.compiled = compile_config(config_path)
+        self.config = self.compiled.config
+        user_counts = self.config['user_counts']
+        website = self.config['website']
+        crm = self.config['crm']
+        sales = self.config['sales']
 
         # User counts and percentages
-        self.TOTAL_CRM_USERS = self.config.get('user_counts', {}).get('total_crm_users', 500_000)
-        self.CRM_USERS_WITH_TRANSACTIONS_PERCENTAGE = self.config.get('user_counts', {}).get(
-            'crm_users_with_transactions_percentage', 0.80)
-        self.TOTAL_WEBSITE_EVENTS_USERS = self.config.get('user_counts', {}).get('total_website_events_users', 800_000)
-        self.WEBSITE_USERS_WITH_TRANSACTIONS_PERCENTAGE = self.config.get('user_counts', {}).get(
-            'website_users_with_transactions_percentage', 0.30)
-        self.WEBSITE_USERS_IN_CRM_PERCENTAGE = self.config.get('user_counts', {}).get('website_users_in_crm_percentage',
-                                                                                      0.50)
-        self.TOTAL_DATA_PROVIDER_USERS = self.config.get('user_counts', {}).get('total_data_provider_users', 1_000_000)
-        self.DATA_PROVIDER_USERS_IN_WEBSITE_PERCENTAGE = self.config.get('user_counts', {}).get(
-            'data_provider_users_in_website_percentage', 0.20)
-        self.DATA_PROVIDER_USERS_IN_CRM_PERCENTAGE = self.config.get('user_counts', {}).get(
-            'data_provider_users_in_crm_percentage', 0.35)
+        self.TOTAL_CRM_USERS = user_counts['total_crm_users']
+        self.CRM_USERS_WITH_TRANSACTIONS_PERCENTAGE = user_counts['crm_users_with_transactions_percentage']
+        self.TOTAL_WEBSITE_EVENTS_USERS = user_counts['total_website_events_users']
+        self.WEBSITE_USERS_WITH_TRANSACTIONS_PERCENTAGE = user_counts['website_users_with_transactions_percentage']
+        self.WEBSITE_USERS_IN_CRM_PERCENTAGE = user_counts['website_users_in_crm_percentage']
+        self.TOTAL_DATA_PROVIDER_USERS = user_counts['total_data_provider_users']
+        self.DATA_PROVIDER_USERS_IN_WEBSITE_PERCENTAGE = user_counts['data_provider_users_in_website_percentage']
+        self.DATA_PROVIDER_USERS_IN_CRM_PERCENTAGE = user_counts['data_provider_users_in_crm_percentage']
+
+        # Root seed of the run's random streams (the CLI --seed takes precedence)
+        self.SEED = self.config.get('seed')
+
+        # Allowed deviation of generated pool overlaps from the percentages above
+        self.OVERLAP_TOLERANCE = self.config['validation']['overlap_tolerance']
 
         # Website-related constants
-        self.WEBSITE_NAMES = self.config.get('website', {}).get('names', [])
-        self.PAGE_CATEGORIES = self.config.get('website', {}).get('page_categories', [])
-        self.PAGE_URLS = self.config.get('website', {}).get('page_urls', {})
-        self.EVENT_TYPES = self.config.get('website', {}).get('event_types', [])
-        self.DEVICE_TYPES = self.config.get('website', {}).get('device_types', [])
-        self.BROWSERS = self.config.get('website', {}).get('browsers', [])
-        self.REFERRER_URLS = self.config.get('website', {}).get('referrer_urls', [])
-        self.URL_CATEGORY_PATTERNS = self.config.get('website', {}).get('url_category_patterns', {})
-        self.EVENT_WEIGHTS = self.config.get('website', {}).get('event_weights', {})
+        self.WEBSITE_NAMES = website['names']
+        self.PAGE_CATEGORIES = website['page_categories']
+        self.PAGE_URLS = website['page_urls']
+        self.EVENT_TYPES = website['event_types']
+        self.DEVICE_TYPES = website['device_types']
+        self.BROWSERS = website['browsers']
+        self.REFERRER_URLS = website['referrer_urls']
+        self.URL_CATEGORY_PATTERNS = website['url_category_patterns']
+        self.EVENT_WEIGHTS = website['event_weights']
+        self.ALL_EVENT_TYPES = self.compiled.event_types
+        self.EVENT_TYPE_CHOICES = self.compiled.event_type_choices
 
         # Customer/CRM related constants
-        self.LOYALTY_TIERS = self.config.get('crm', {}).get('loyalty_tiers', [])
-        self.LOYALTY_POINTS_RANGES = self.config.get('crm', {}).get('loyalty_points_ranges', {})
-        self.GENDERS = self.config.get('crm', {}).get('genders', [])
-        self.COUNTRIES = self.config.get('crm', {}).get('countries', [])
-        self.MARKETING_CONSENT_WEIGHTS = self.config.get('crm', {}).get('marketing_consent_weights', {})
+        self.LOYALTY_TIERS = crm['loyalty_tiers']
+        self.LOYALTY_POINTS_RANGES = crm['loyalty_points_ranges']
+        self.GENDERS = crm['genders']
+        self.COUNTRIES = crm['countries']
+        self.MARKETING_CONSENT_WEIGHTS = crm['marketing_consent_weights']
+        self.CRM_DAILY_UPDATE_PERCENTAGE = crm['daily_update_percentage']
+        self.LOYALTY_TIER_CHOICE = self.compiled.choices.get('crm.loyalty_tiers')
+        self.GENDER_CHOICE = self.compiled.choices.get('crm.genders')
+        self.COUNTRY_CHOICE = self.compiled.choices.get('crm.countries')
+        self.MARKETING_CONSENT_CHOICE = self.compiled.choices.get('crm.marketing_consent_weights')
 
         # Product-related constants
-        self.PRODUCT_STRUCTURE = self.config.get('products', {}).get('structure', {})
-        self.PRODUCT_BRANDS = self.config.get('products', {}).get('brands', {})
+        self.PRODUCT_STRUCTURE = self.config['products']['structure']
+        self.PRODUCT_BRANDS = self.config['products']['brands']
 
         # Sales-related constants
-        self.PAYMENT_METHODS = self.config.get('sales', {}).get('payment_methods', [])
-        self.CURRENCIES = self.config.get('sales', {}).get('currencies', [])
-        self.CHANNELS = self.config.get('sales', {}).get('channels', [])
-        self.STORE_IDS = self.config.get('sales', {}).get('store_ids', [])
-        if not self.STORE_IDS:
-            self.STORE_IDS = [f'ST{i:03d}' for i in range(1, 51)]  # Default: 50 stores
+        self.PAYMENT_METHODS = sales['payment_methods']
+        self.CURRENCIES = sales['currencies']
+        self.CHANNELS = sales['channels']
+        self.STORE_IDS = sales['store_ids']
 
         # Data provider related constants
-        self.DATA_PROVIDERS = self.config.get('data_providers', {}).get('providers', [])
-        self.SEGMENT_STRUCTURE = self.config.get('data_providers', {}).get('segment_structure', {})
+        self.DATA_PROVIDERS = self.config['data_providers']['providers']
+        self.SEGMENT_STRUCTURE = self.config['data_providers']['segment_structure']
 
 
 class Utilities:
     """Helper utility functions."""
 
-    def __init__(self):
+    def __init__(self, seed=DEFAULT_SEED, reference_time=None, locale_pools=None, delta_window=None):
+        """Initialize the shared helpers.
+
+        Args:
+            seed: Root seed for every random draw of a run
+            reference_time: The 'now' that generated dates are relative to (defaults to the
+                current time); fixing it makes a run reproducible across days and processes
+            locale_pools: Pre-built locale pools from another instance's locale_pools
+            delta_window: (start, end) datetimes of an incremental run; generators then emit
+                only the activity inside the window instead of the full history
+        """
+        self.seed = seed
+        self.reference_time = reference_time or datetime.now().replace(microsecond=0)
+        # Nothing draws from the global numpy, random or Faker state: every generator has its own
+        # stream derived from the seed, so adding a draw to one table leaves the others unchanged
         self.fake = Faker()
-        # Set random seeds for reproducibility
-        np.random.seed(42)
-        random.seed(42)
-        Faker.seed(42)
+        self.fake.seed_instance(seed)
+        self.rng = self.generator_rng('utilities')
+        self._locale_pools = dict(locale_pools or {})
+        self.delta_window = delta_window
+
+    @property
+    def locale_pools(self):
+        """The locale pools built so far, keyed by locale."""
+        return self._locale_pools
+
+    def generator_rng(self, key):
+        """Return a new random generator for one generator (or other consumer) of a run.
+
+        Each key maps to its own stream derived from the root seed, independent of the
+        streams of other keys and of the order in which they are created.
+        """
+        seed_sequence = np.random.SeedSequence(self.seed, spawn_key=(zlib.crc32(key.encode()),))
+        return np.random.default_rng(seed_sequence)
+
+    def shard_rng(self, shard_key, shard_index):
+        """Return the independent random generator of one shard of a table.
+
+        Each (shard_key, shard_index) pair maps to its own stream derived from the root
+        seed, so a shard draws the same values whichever process generates it. Incremental
+        runs key the streams by their window start as well, so every delta draws fresh values.
+        """
+        if self.delta_window is not None:
+            shard_key = f"{shard_key}@{self.delta_window[0]:%Y-%m-%dT%H:%M:%S}"
+        seed_sequence = np.random.SeedSequence(self.seed, spawn_key=(zlib.crc32(shard_key.encode()), shard_index))
+        return np.random.default_rng(seed_sequence)
+
+    def get_locale_pool(self, locale, size=LOCALE_POOL_SIZE):
+        """Return (and cache) pools of first names, last names, cities and postal codes for a Faker locale.
+
+        Pools are drawn once per locale from a Faker instance seeded for reproducibility,
+        so generators can sample them by index instead of calling Faker per row.
+        """
+        if locale not in self._locale_pools:
+            fake = Faker(locale)
+            # Some locales build their word lists from sets, whose order changes with the
+            # process hash seed; sort them so seeded draws are the same in every process
+            for provider in fake.providers:
+                for name, value in vars(type(provider)).items():
+                    if isinstance(value, list) and value and all(isinstance(item, str) for item in value):
+                        setattr(provider, name, sorted(value))
+            fake.seed_instance(self.seed)
+            self._locale_pools[locale] = {
+                'first_name': [fake.first_name() for _ in range(size)],
+                'last_name': [fake.last_name() for _ in range(size)],
+                'city': [fake.city() for _ in range(size)],
+                'postal_code': [fake.postcode() for _ in range(size)],
+            }
+        return self._locale_pools[locale]
 
     def generate_email_sha256(self, email):
         """Generate SHA256 hash for email."""
         return hashlib.sha256(email.encode()).hexdigest()
 
-    def generate_date_between(self, start_date, end_date):
-        """Generate a random date between start_date and end_date."""
-        delta = end_date - start_date
-        int_delta = delta.days
-        random_day = random.randint(0, int_delta)
-        return start_date + timedelta(days=random_day)
-
-    def generate_registration_date(self):
-        """Generate a random registration date within the last 5 years."""
-        start_date = datetime.now() - timedelta(days=5 * 365)
-        end_date = datetime.now()
-        return self.generate_date_between(start_date, end_date)
-
-    def generate_birth_date(self):
-        """Generate a random birth date for users between 18 and 80 years old."""
-        start_date = date.today() - timedelta(days=80 * 365)
-        end_date = date.today() - timedelta(days=18 * 365)
-        return self.generate_date_between(start_date, end_date)
+    def sample_datetimes(self, size, start, end, rng=None, seasonal=False, diurnal=False, unit='s'):
+        """Sample an array of timestamps between start and end.
+
+        Args:
+            size: Number of timestamps to sample
+            start: Earliest timestamp (datetime, date or np.datetime64)
+            end: Latest timestamp (datetime, date or np.datetime64)
+            rng: Random generator to draw from (defaults to the shared one)
+            seasonal: Weight days by SEASONAL_MONTH_WEIGHTS instead of uniformly
+            diurnal: Weight the time of day by DIURNAL_HOUR_WEIGHTS instead of uniformly
+            unit: datetime64 unit of the result, e.g. 's', 'us' or 'D' for dates
+
+        Returns:
+            np.ndarray: datetime64[unit] array of the requested size
+        """
+        rng = rng if rng is not None else self.rng
+        start = np.datetime64(start, 's')
+        end = np.datetime64(end, 's')
+
+        if not seasonal and not diurnal:
+            span = int((end - start) // np.timedelta64(1, 's')) + 1
+            offsets = (rng.random(size) * span).astype(np.int64).astype('timedelta64[s]')
+            return (start + offsets).astype(f'datetime64[{unit}]')
+
+        # Draw the day first, then the second within that day; weighted draws use the alias samplers
+        first_day, last_day = start.astype('datetime64[D]'), end.astype('datetime64[D]')
+        if seasonal:
+            day_choice = _seasonal_day_choice(first_day, last_day)
+            sampled_days = day_choice.keys[day_choice.sample(rng, size)]
+        else:
+            sampled_days = first_day + rng.integers(0, (last_day - first_day).astype(np.int64) + 1, size=size)
+
+        if diurnal:
+            hours = _DIURNAL_HOUR_CHOICE.sample(rng, size)
+            seconds = hours * 3600 + rng.integers(0, 3600, size=size)
+        else:
+            seconds = rng.integers(0, SECONDS_PER_DAY, size=size)
+
+        # Times before start (on the first day) or after end (on the last) wrap around to the other
+        # end of the range instead of piling up on its bounds, which matters for short windows
+        timestamps = sampled_days.astype('datetime64[s]') + seconds.astype('timedelta64[s]')
+        span = end - start + np.timedelta64(1, 's')
+        return (start + (timestamps - start) % span).astype(f'datetime64[{unit}]')
+
+    def sample_datetimes_between(self, starts, ends, rng=None, unit='s'):
+        """Sample one timestamp uniformly between each pair of start and end timestamps.
+
+        Args:
+            starts: datetime64 array of lower bounds
+            ends: datetime64 array (or scalar) of upper bounds
+            rng: Random generator to draw from (defaults to the shared one)
+            unit: datetime64 unit of the result
+
+        Returns:
+            np.ndarray: datetime64[unit] array with the shape of starts
+        """
+        rng = rng if rng is not None else self.rng
+        starts = np.asarray(starts).astype('datetime64[s]')
+        spans = np.maximum((np.datetime64(ends, 's') - starts) // np.timedelta64(1, 's'), 0) + 1
+        offsets = (rng.random(len(starts)) * spans).astype(np.int64).astype('timedelta64[s]')
+        return (starts + offsets).astype(f'datetime64[{unit}]')
+
+    def sample_registration_dates(self, size, rng=None):
+        """Sample registration timestamps within the last 5 years."""
+        now = self.reference_time
+        return self.sample_datetimes(size, now - timedelta(days=5 * 365), now, rng=rng, diurnal=True)
+
+    def sample_birth_dates(self, size, rng=None):
+        """Sample birth dates for users between 18 and 80 years old."""
+        today = self.reference_time.date()
+        return self.sample_datetimes(size, today - timedelta(days=80 * 365), today - timedelta(days=18 * 365),
+                                     rng=rng, unit='D')
 
     def generate_user_email_sha256_pool(self, num_users):
         """Generate a pool of unique user email SHA256 hashes."""
@@ -117,44 +283,146 @@ class Utilities:
             email_hashes.append(email_hash)
         return email_hashes
 
+    def generate_user_digest_pool(self, num_users, method='mix', batch_size=1_000_000, rng=None):
+        """Generate a pool of unique, deterministic 32-byte user identity digests.
+
+        Args:
+            num_users: Number of digests to generate
+            method: 'mix' derives each digest from the user's serial number with a
+                keyed 64-bit bijection (fully vectorized); 'sha256' hashes a synthetic
+                unique email per user with hashlib
+            batch_size: Number of users processed per batch
+            rng: Random generator to draw from (defaults to the shared one)
+
+        Returns:
+            np.ndarray: uint8 array of shape (num_users, 32)
+        """
+        rng = rng if rng is not None else self.rng
+        if method not in ('mix', 'sha256'):
+            raise ValueError(f'Unknown digest pool method: {method}')
+
+        digests = np.empty((num_users, DIGEST_SIZE), dtype=np.uint8)
+        if method == 'mix':
+            keys = rng.integers(0, np.iinfo(np.uint64).max, size=DIGEST_SIZE // 8,
+                                dtype=np.uint64, endpoint=True)
+            for start in range(0, num_users, batch_size):
+                end = min(start + batch_size, num_users)
+                serials = np.arange(start, end, dtype=np.uint64)
+                # Every lane is a bijection of the serial number, so digests are unique by construction
+                lanes = np.stack([_mix64(serials ^ key) for key in keys], axis=1)
+                digests[start:end] = lanes.view(np.uint8).reshape(end - start, DIGEST_SIZE)
+        else:
+            first_names = self.fake.first_name.__self__.first_names
+            last_names = self.fake.last_name.__self__.last_names
+            domains = self.fake.free_email_domain.__self__.free_email_domains
+            first_names = [name.lower() for name in first_names]
+            last_names = [name.lower() for name in last_names]
+            for start in range(0, num_users, batch_size):
+                end = min(start + batch_size, num_users)
+                count = end - start
+                first_idx = rng.integers(0, len(first_names), size=count)
+                last_idx = rng.integers(0, len(last_names), size=count)
+                domain_idx = rng.integers(0, len(domains), size=count)
+                # The serial number keeps every email, and therefore every digest, unique
+                emails = [
+                    f'{first_names[f]}.{last_names[l]}.{serial}@{domains[d]}'
+                    for f, l, d, serial in zip(first_idx.tolist(), last_idx.tolist(),
+                                               domain_idx.tolist(), range(start, end))
+                ]
+                digests[start:end] = np.frombuffer(
+                    b''.join(hashlib.sha256(email.encode()).digest() for email in emails),
+                    dtype=np.uint8
+                ).reshape(count, DIGEST_SIZE)
+        return digests
 
-class UserPoolManager:
-    """Manages user pools and their overlaps."""
+    @staticmethod
+    def _hex_chars(digests):
+        """Hex characters of an (n, width) uint8 digest array, as an (n, 2 * width) uint8 array."""
+        return np.ascontiguousarray(_HEX_PAIRS[digests].reshape(len(digests), digests.shape[1] * 2))
 
-    def __init__(self, constants, utilities):
-        self.constants = constants
-        self.utilities = utilities
-        self.crm_users = []
-        self.website_users = []
-        self.data_provider_users = []
-        self.crm_users_with_transactions = []
-        self.website_users_with_transactions = []
+    @staticmethod
+    def digests_to_hex(digests):
+        """Convert an (n, width) uint8 digest array to an array of hex strings of 2 * width characters."""
+        width = digests.shape[1] * 2
+        return Utilities._hex_chars(digests).view(f'S{width}').ravel().astype(f'U{width}')
 
+    @staticmethod
+    def digests_to_hex_array(digests):
+        """Convert an (n, width) uint8 digest array to an Arrow string array of hex digests."""
+        return fixed_width_string_array(Utilities._hex_chars(digests))
 
-class UserPoolManager:
-    """Manages user pools and their overlaps."""
+    @staticmethod
+    def _uuid4_chars(count, rng):
+        """Characters of random version 4 UUIDs drawn from RNG bytes, as a (count, 36) uint8 array."""
+        uuid_bytes = np.frombuffer(rng.bytes(16 * count), dtype=np.uint8).reshape(count, 16).copy()
+        uuid_bytes[:, 6] = (uuid_bytes[:, 6] & 0x0F) | 0x40
+        uuid_bytes[:, 8] = (uuid_bytes[:, 8] & 0x3F) | 0x80
+        hex_bytes = _HEX_PAIRS[uuid_bytes].reshape(count, 32)
+        uuid_chars = np.full((count, 36), ord('-'), dtype=np.uint8)
+        for start, end in ((0, 8), (8, 12), (12, 16), (16, 20), (20, 32)):
+            # Each hex group shifts right by the number of dashes in front of it
+            shift = (start >= 8) + (start >= 12) + (start >= 16) + (start >= 20)
+            uuid_chars[:, start + shift:end + shift] = hex_bytes[:, start:end]
+        return uuid_chars
 
-    def __init__(self, constants, utilities):
-        self.constants = constants
-        self.utilities = utilities
-        self.crm_users = []
-        self.website_users = []
-        self.data_provider_users = []
-        self.crm_users_with_transactions = []
-        self.website_users_with_transactions = []
+    @staticmethod
+    def generate_uuid4_strings(count, rng):
+        """Generate random version 4 UUID strings in bulk from RNG bytes."""
+        return Utilities._uuid4_chars(count, rng).view('S36').ravel().astype('U36')
+
+    @staticmethod
+    def generate_uuid4_array(count, rng):
+        """Generate random version 4 UUIDs in bulk from RNG bytes, as an Arrow string array."""
+        return fixed_width_string_array(Utilities._uuid4_chars(count, rng))
+
+    @staticmethod
+    def categorical(codes, values):
+        """Build a pandas categorical from integer codes into a (possibly repetitive) list of values."""
+        value_codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        return pd.Categorical.from_codes(value_codes[codes], categories=uniques)
+
+    @staticmethod
+    def dictionary_array(codes, values):
+        """Build an Arrow dictionary array from integer codes into a (possibly repetitive) list of values."""
+        value_codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        return pa.DictionaryArray.from_arrays(value_codes[codes].astype(np.int32), pa.array(uniques, pa.string()))
 
 
 class UserPoolManager:
-    """Manages user pools and their overlaps."""
+    """Manages user pools and their overlaps.
+
+    Users are identified by integer surrogates: every pool is a NumPy array of
+    indices into a single shared digest table, and hex hashes are only produced
+    when a table is written (see resolve_user_hashes).
+    """
+
+    RNG_KEY = 'user_pools'
 
     def __init__(self, constants, utilities):
         self.constants = constants
         self.utilities = utilities
-        self.crm_users = []
-        self.website_users = []
-        self.data_provider_users = []
-        self.crm_users_with_transactions = []
-        self.website_users_with_transactions = []
+        self.user_digests = np.empty((0, DIGEST_SIZE), dtype=np.uint8)
+        self.crm_users = np.empty(0, dtype=np.int32)
+        self.website_users = np.empty(0, dtype=np.int32)
+        self.data_provider_users = np.empty(0, dtype=np.int32)
+        self.crm_users_with_transactions = np.empty(0, dtype=np.int32)
+        self.website_users_with_transactions = np.empty(0, dtype=np.int32)
+
+    @property
+    def total_users(self):
+        return len(self.user_digests)
+
+    def user_hashes(self, user_ids):
+        """Return the hex email hashes for an array of user indices."""
+        return self.utilities.digests_to_hex(self.user_digests[user_ids])
+
+    def resolve_user_hashes(self, table, column='user_id'):
+        """Replace a user index column of an Arrow table with the user_email_sha256 hex column, in place of it."""
+        if column not in table.column_names:
+            return table
+        position = table.column_names.index(column)
+        hashes = self.utilities.digests_to_hex_array(self.user_digests[np.asarray(table[column])])
+        return table.set_column(position, 'user_email_sha256', hashes)
 
     def generate_user_pools(self):
         """Optimized generation of user pools with required overlaps."""
@@ -172,68 +440,46 @@ class UserPoolManager:
         DATA_PROVIDER_USERS_IN_CRM = int(
             self.constants.TOTAL_DATA_PROVIDER_USERS * self.constants.DATA_PROVIDER_USERS_IN_CRM_PERCENTAGE)
 
-        # Generate all user hashes at once
+        # Generate all user digests at once; pools hold indices into this table
         TOTAL_UNIQUE_USERS = (
                 self.constants.TOTAL_CRM_USERS
                 + self.constants.TOTAL_WEBSITE_EVENTS_USERS
                 + self.constants.TOTAL_DATA_PROVIDER_USERS
         )
-        all_users_pool = np.array(self.utilities.generate_user_email_sha256_pool(TOTAL_UNIQUE_USERS))
+        rng = self.utilities.generator_rng(self.RNG_KEY)
+        self.user_digests = self.utilities.generate_user_digest_pool(TOTAL_UNIQUE_USERS, rng=rng)
+        index_dtype = np.int32 if TOTAL_UNIQUE_USERS <= np.iinfo(np.int32).max else np.int64
 
-        # Shuffle once and then partition
-        np.random.shuffle(all_users_pool)
-
-        # Partition users into pools
-        local_crm_users = all_users_pool[:self.constants.TOTAL_CRM_USERS]
-        local_website_users = all_users_pool[self.constants.TOTAL_CRM_USERS:
-                                             self.constants.TOTAL_CRM_USERS + self.constants.TOTAL_WEBSITE_EVENTS_USERS]
-        local_data_provider_users = all_users_pool[
-                                    self.constants.TOTAL_CRM_USERS + self.constants.TOTAL_WEBSITE_EVENTS_USERS:
-                                    self.constants.TOTAL_CRM_USERS + self.constants.TOTAL_WEBSITE_EVENTS_USERS
-                                    + self.constants.TOTAL_DATA_PROVIDER_USERS]
+        # Digests are already pseudo-random, so pools can be contiguous index ranges
+        crm_end = self.constants.TOTAL_CRM_USERS
+        website_end = crm_end + self.constants.TOTAL_WEBSITE_EVENTS_USERS
+        local_crm_users = np.arange(0, crm_end, dtype=index_dtype)
+        local_website_users = np.arange(crm_end, website_end, dtype=index_dtype)
+        local_data_provider_users = np.arange(website_end, TOTAL_UNIQUE_USERS, dtype=index_dtype)
 
         # Overlap CRM -> Website
-        crm_indices = np.random.choice(len(local_crm_users), WEBSITE_USERS_IN_CRM, replace=False)
+        crm_indices = rng.choice(len(local_crm_users), WEBSITE_USERS_IN_CRM, replace=False)
         local_website_users[:WEBSITE_USERS_IN_CRM] = local_crm_users[crm_indices]
 
         # Overlap CRM -> Data Provider
-        crm_indices_for_data_provider = np.random.choice(len(local_crm_users), DATA_PROVIDER_USERS_IN_CRM,
-                                                         replace=False)
+        crm_indices_for_data_provider = rng.choice(len(local_crm_users), DATA_PROVIDER_USERS_IN_CRM, replace=False)
         local_data_provider_users[:DATA_PROVIDER_USERS_IN_CRM] = local_crm_users[crm_indices_for_data_provider]
 
-        # Overlap Website -> Data Provider (excluding CRM users)
-        website_non_crm_indices = np.setdiff1d(np.arange(len(local_website_users)), crm_indices, assume_unique=True)
-        if len(website_non_crm_indices) > 0:
-            selected_indices = np.random.choice(website_non_crm_indices, DATA_PROVIDER_USERS_IN_WEBSITE, replace=False)
+        # Overlap Website -> Data Provider (excluding CRM users, which fill the head of the website pool)
+        website_non_crm_users = local_website_users[WEBSITE_USERS_IN_CRM:]
+        if len(website_non_crm_users) > 0:
+            selected_indices = rng.choice(len(website_non_crm_users), DATA_PROVIDER_USERS_IN_WEBSITE, replace=False)
             local_data_provider_users[DATA_PROVIDER_USERS_IN_CRM:
                                       DATA_PROVIDER_USERS_IN_CRM + DATA_PROVIDER_USERS_IN_WEBSITE] = \
-            local_website_users[
-                selected_indices]
+                website_non_crm_users[selected_indices]
 
         # Users with transactions
-        local_crm_users_with_transactions = np.random.choice(local_crm_users, CRM_USERS_WITH_TRANSACTIONS,
-                                                             replace=False)
-        local_website_users_with_transactions = np.random.choice(local_website_users, WEBSITE_USERS_WITH_TRANSACTIONS,
-                                                                 replace=False)
-
-        self.crm_users = local_crm_users.tolist()
-        self.website_users = local_website_users.tolist()
-        self.data_provider_users = local_data_provider_users.tolist()
-        self.crm_users_with_transactions = local_crm_users_with_transactions.tolist()
-        self.website_users_with_transactions = local_website_users_with_transactions.tolist()
-
-        # Compute overlaps
-        crm_set = set(self.crm_users)
-        website_set = set(self.website_users)
-        data_provider_set = set(self.data_provider_users)
-        crm_transactions_set = set(self.crm_users_with_transactions)
-        website_transactions_set = set(self.website_users_with_transactions)
-
-        overlap_website_crm = len(website_set & crm_set)
-        overlap_crm_transactions = len(crm_transactions_set & crm_set)
-        overlap_website_transactions = len(website_transactions_set & website_set)
-        overlap_website_data_provider = len(website_set & data_provider_set)
-        overlap_crm_data_provider = len(crm_set & data_provider_set)
+        self.crm_users = local_crm_users
+        self.website_users = local_website_users
+        self.data_provider_users = local_data_provider_users
+        self.crm_users_with_transactions = rng.choice(local_crm_users, CRM_USERS_WITH_TRANSACTIONS, replace=False)
+        self.website_users_with_transactions = rng.choice(local_website_users, WEBSITE_USERS_WITH_TRANSACTIONS,
+                                                          replace=False)
 
         print(f"Generated user pools with following counts:")
         print(f"CRM Users: {len(self.crm_users)}")
@@ -241,11 +487,11 @@ class UserPoolManager:
         print(f"Data Provider Users: {len(self.data_provider_users)}")
         print(f"CRM Users with Transactions: {len(self.crm_users_with_transactions)}")
         print(f"Website Users with Transactions: {len(self.website_users_with_transactions)}")
-        print("\nOverlap counts:")
-        print(f"Website + CRM: {overlap_website_crm}")
-        print(f"CRM + Transactions: {overlap_crm_transactions}")
-        print(f"Website + Transactions: {overlap_website_transactions}")
-        print(f"Website + Data Provider Users: {overlap_website_data_provider}")
-        print(f"CRM + Data Provider Users: {overlap_crm_data_provider}")
+
+        # Compare the actual overlaps with the configured percentages; a mismatch fails the run
+        checks = pool_overlap_checks(self, self.constants, self.constants.OVERLAP_TOLERANCE)
+        print("\nOverlap ratios:")
+        print(format_checks(checks))
+        require_passed(checks, 'user pool overlap')
 
         return self
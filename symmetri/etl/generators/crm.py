@@ -1,33 +1,71 @@
-import random
-from datetime import datetime, timedelta
+from datetime import timedelta
+from typing import Iterator
 
 import numpy as np
 import pandas as pd
 
+from symmetri.etl.sharding import ShardExecutor
+
+# Faker locale used for the names, cities and postal codes of each country
+COUNTRY_LOCALES = {
+    'USA': 'en_US',
+    'Canada': 'en_CA',
+    'UK': 'en_GB',
+    'Germany': 'de_DE',
+    'France': 'fr_FR',
+    'Australia': 'en_AU',
+    'Japan': 'ja_JP',
+    'Brazil': 'pt_BR',
+    'China': 'zh_CN',
+    'India': 'en_IN',
+    'Italy': 'it_IT',
+    'Spain': 'es_ES',
+    'Mexico': 'es_MX',
+}
+DEFAULT_LOCALE = 'en_US'
+LOCALE_FIELDS = ['first_name', 'last_name', 'city', 'postal_code']
+
+# Columns of the CRM_USERS rows emitted by an incremental run
+CRM_UPDATE_COLUMNS = ['user_email_sha256', 'marketing_consent', 'email_engagement_score', 'last_login_date']
+
 
 class CRMDataGenerator:
     """Generates CRM user data."""
 
+    SHARD_KEY = 'crm_users'
+
     def __init__(self, user_pool_manager, constants, utilities, output_dir):
         self.user_pool_manager = user_pool_manager
         self.constants = constants
         self.utilities = utilities
         self.output_dir = output_dir
 
-    def _generate_last_login_date(self, registration_date: datetime, current_date: datetime) -> datetime:
-        """Generate a last login date that's between registration date and current date.
-        
-        Args:
-            registration_date: The user's registration date
-            current_date: The current date
-            
+    def build_locale_pools(self):
+        """Build the pools of every configured country's locale and return all pools by locale.
+
+        The pools are built once in the parent process and handed to shard workers,
+        so workers do not each draw them from Faker again.
+        """
+        for country in self.constants.COUNTRIES:
+            self.utilities.get_locale_pool(COUNTRY_LOCALES.get(country, DEFAULT_LOCALE))
+        return self.utilities.locale_pools
+
+    def _build_locale_values(self, countries):
+        """Flatten the per-locale pools of each country into one value list per field.
+
         Returns:
-            datetime: A valid last login date
+            tuple: (field -> flat value list, per-country offset into the flat lists, pool size per country)
         """
-        days_since_registration = max(0, (current_date - registration_date).days)
-        if days_since_registration == 0:
-            return registration_date
-        return registration_date + timedelta(days=random.randint(0, days_since_registration))
+        values = {field: [] for field in LOCALE_FIELDS}
+        offsets = []
+        sizes = []
+        for country in countries:
+            pool = self.utilities.get_locale_pool(COUNTRY_LOCALES.get(country, DEFAULT_LOCALE))
+            offsets.append(len(values['first_name']))
+            sizes.append(len(pool['first_name']))
+            for field in LOCALE_FIELDS:
+                values[field].extend(pool[field])
+        return values, np.array(offsets), np.array(sizes)
 
     def generate_crm_data(self) -> pd.DataFrame:
         """Generate CRM_USERS table data.
@@ -35,85 +73,126 @@ class CRMDataGenerator:
         Returns:
             pd.DataFrame: DataFrame containing generated CRM user data
         """
-        print("Generating CRM_USERS table...")
-
-        current_date = datetime.now()
-
-        # Generate all registration dates at once
-        registration_dates = [self.utilities.generate_registration_date()
-                              for _ in self.user_pool_manager.crm_users]
-
-        # Pre-generate common random choices
-        # Generate loyalty tiers with weighted distribution
-        loyalty_tier_weights = self.constants.LOYALTY_TIERS
-        loyalty_tiers = np.random.choice(
-            list(loyalty_tier_weights.keys()),
-            size=len(self.user_pool_manager.crm_users),
-            p=list(loyalty_tier_weights.values())
-        )
-        
-        # Generate genders with weighted distribution
-        gender_weights = self.constants.GENDERS
-        genders = np.random.choice(
-            list(gender_weights.keys()),
-            size=len(self.user_pool_manager.crm_users),
-            p=list(gender_weights.values())
-        )
-        
-        # Generate countries with weighted distribution
-        country_weights = self.constants.COUNTRIES
-        countries = np.random.choice(
-            list(country_weights.keys()),
-            size=len(self.user_pool_manager.crm_users),
-            p=list(country_weights.values())
-        )
-
-        # Generate marketing consents with weighted distribution
-        consent_weights = self.constants.MARKETING_CONSENT_WEIGHTS
-        marketing_consents = np.random.choice(
-            list(consent_weights.keys()),
-            size=len(self.user_pool_manager.crm_users),
-            p=list(consent_weights.values())
-        )
-
-        # Generate loyalty points based on tier
-        # Generate beta values for all users at once
-        beta_values = np.random.beta(2, 5, size=len(self.user_pool_manager.crm_users))
-        
-        # Create arrays for min and max values based on tiers
-        min_points = np.array([self.constants.LOYALTY_POINTS_RANGES[tier]['min'] for tier in loyalty_tiers])
-        max_points = np.array([self.constants.LOYALTY_POINTS_RANGES[tier]['max'] for tier in loyalty_tiers])
-        
-        # Calculate points for all users at once
-        loyalty_points = (min_points + (max_points - min_points) * beta_values).astype(int)
-
-        # Generate data using list comprehension
-        crm_data = [
-            {
-                'user_email_sha256': user_hash,
-                'registration_date': reg_date,
-                'first_name': self.utilities.fake.first_name(),
-                'last_name': self.utilities.fake.last_name(),
-                'birth_date': self.utilities.generate_birth_date(),
-                'gender': gender,
-                'country': country,
-                'city': self.utilities.fake.city(),
-                'postal_code': self.utilities.fake.zipcode(),
-                'marketing_consent': consent,
-                'loyalty_tier': tier,
-                'loyalty_points': points,
-                'email_engagement_score': round(random.uniform(0, 10), 2),
-                'last_login_date': self._generate_last_login_date(reg_date, current_date)
-            }
-            for user_hash, reg_date, gender, country, consent, tier, points
-            in zip(
-                self.user_pool_manager.crm_users,
-                registration_dates,
-                genders,
-                countries,
-                marketing_consents,
-                loyalty_tiers,
-                loyalty_points
+        return pd.concat(self.iter_crm_data(), ignore_index=True)
+
+    def iter_crm_data(self, chunk_size: int = 100_000, executor: ShardExecutor = None) -> Iterator[pd.DataFrame]:
+        """Generate CRM_USERS table data in chunks.
+
+        In an incremental run (utilities.delta_window is set) the chunks hold only the
+        CRM_UPDATE_COLUMNS of the users that changed during the window.
+
+        Args:
+            chunk_size: Number of users per yielded chunk
+            executor: Runs the shards of the table (inline when omitted)
+
+        Yields:
+            pd.DataFrame: CRM user data for one chunk of users
+        """
+        if self.utilities.delta_window is not None:
+            print("Generating CRM_USERS updates...")
+        else:
+            print("Generating CRM_USERS table...")
+        executor = executor or ShardExecutor()
+        for shard_results in executor.iter_chunks(self, self.user_pool_manager.crm_users, chunk_size):
+            yield pd.concat(shard_results, ignore_index=True)
+
+    def generate_shard(self, shard_index: int, user_ids: np.ndarray) -> pd.DataFrame:
+        """Generate the CRM users (or their updates) of one shard with the shard's own random generator."""
+        rng = self.utilities.shard_rng(self.SHARD_KEY, shard_index)
+        if self.utilities.delta_window is not None:
+            return self._generate_crm_updates_block(user_ids, rng)
+        return self._generate_crm_block(user_ids, rng)
+
+    def _generate_crm_updates_block(self, user_ids, rng) -> pd.DataFrame:
+        """Generate the CRM changes of the delta window for a block of user indices.
+
+        Each user is updated with probability CRM_DAILY_UPDATE_PERCENTAGE per day of the
+        window: they logged in during the window, and their engagement score and marketing
+        consent are drawn again.
+
+        Args:
+            user_ids: User indices that may be updated
+            rng: Random generator to draw from
+
+        Returns:
+            pd.DataFrame: The CRM_UPDATE_COLUMNS of the updated users
+        """
+        start, end = self.utilities.delta_window
+        update_probability = min(1.0, self.constants.CRM_DAILY_UPDATE_PERCENTAGE * ((end - start) / timedelta(days=1)))
+        updated_users = user_ids[rng.random(len(user_ids)) < update_probability]
+        num_users = len(updated_users)
+
+        consent_choice = self.constants.MARKETING_CONSENT_CHOICE
+        return pd.DataFrame({
+            'user_id': updated_users,
+            'marketing_consent': consent_choice.keys[consent_choice.sample(rng, num_users)],
+            'email_engagement_score': rng.uniform(0, 10, size=num_users).round(2),
+            'last_login_date': self.utilities.sample_datetimes(num_users, start, end, rng=rng, diurnal=True)
+        })
+
+    def _generate_crm_block(self, user_ids, rng) -> pd.DataFrame:
+        """Generate CRM users for a block of user indices with whole-array operations.
+
+        Names, cities and postal codes are sampled by index from per-locale pools,
+        dates are generated as datetime64 arrays and loyalty point ranges come from
+        array lookups on the tier codes.
+
+        Args:
+            user_ids: User indices to generate CRM rows for
+            rng: Random generator to draw from
+
+        Returns:
+            pd.DataFrame: DataFrame containing generated CRM user data
+        """
+        num_users = len(user_ids)
+        now = self.utilities.reference_time
+
+        # Registration within the last 5 years, last login between registration and now
+        registration_dates = self.utilities.sample_registration_dates(num_users, rng=rng)
+        last_login_dates = self.utilities.sample_datetimes_between(registration_dates, now, rng=rng)
+
+        # Birth dates for users between 18 and 80 years old
+        birth_dates = self.utilities.sample_birth_dates(num_users, rng=rng)
+
+        # Generate weighted categorical attributes as integer codes from the compiled alias tables
+        loyalty_tiers = self.constants.LOYALTY_TIER_CHOICE.keys.tolist()
+        genders = self.constants.GENDER_CHOICE.keys.tolist()
+        countries = self.constants.COUNTRY_CHOICE.keys.tolist()
+        consents = self.constants.MARKETING_CONSENT_CHOICE.keys
+        tier_codes = self.constants.LOYALTY_TIER_CHOICE.sample(rng, num_users)
+        gender_codes = self.constants.GENDER_CHOICE.sample(rng, num_users)
+        country_codes = self.constants.COUNTRY_CHOICE.sample(rng, num_users)
+        consent_codes = self.constants.MARKETING_CONSENT_CHOICE.sample(rng, num_users)
+
+        # Generate loyalty points based on tier with array lookups of the tier ranges
+        min_points_by_tier = np.array([self.constants.LOYALTY_POINTS_RANGES[tier]['min'] for tier in loyalty_tiers])
+        max_points_by_tier = np.array([self.constants.LOYALTY_POINTS_RANGES[tier]['max'] for tier in loyalty_tiers])
+        min_points = min_points_by_tier[tier_codes]
+        max_points = max_points_by_tier[tier_codes]
+        loyalty_points = (min_points + (max_points - min_points) * rng.beta(2, 5, size=num_users)).astype(int)
+
+        # Sample names, cities and postal codes from the pool of each user's country locale
+        locale_values, locale_offsets, locale_sizes = self._build_locale_values(countries)
+        person_fields = {}
+        for field in LOCALE_FIELDS:
+            positions = (rng.random(num_users) * locale_sizes[country_codes]).astype(np.int64)
+            person_fields[field] = self.utilities.categorical(
+                locale_offsets[country_codes] + positions, locale_values[field]
             )
-        ]
-        return pd.DataFrame(crm_data)
+
+        return pd.DataFrame({
+            'user_id': user_ids,
+            'registration_date': registration_dates,
+            'first_name': person_fields['first_name'],
+            'last_name': person_fields['last_name'],
+            'birth_date': birth_dates,
+            'gender': self.utilities.categorical(gender_codes, genders),
+            'country': self.utilities.categorical(country_codes, countries),
+            'city': person_fields['city'],
+            'postal_code': person_fields['postal_code'],
+            'marketing_consent': consents[consent_codes],
+            'loyalty_tier': self.utilities.categorical(tier_codes, loyalty_tiers),
+            'loyalty_points': loyalty_points,
+            'email_engagement_score': rng.uniform(0, 10, size=num_users).round(2),
+            'last_login_date': last_login_dates
+        })
@@ -1,49 +1,42 @@
-import random
-
+import numpy as np
 import pandas as pd
 
+from symmetri.etl.sharding import ShardExecutor
+
 
 class DataProviderGenerator:
     """Generates data provider and segment data."""
 
+    SHARD_KEY = 'data_provider_user_segment_map'
+
     def __init__(self, user_pool_manager, constants, utilities, output_dir):
         self.user_pool_manager = user_pool_manager
         self.constants = constants
         self.utilities = utilities
         self.output_dir = output_dir
+        self._segment_groups = None
 
     def generate_data_providers(self):
         """Generate DATA_PROVIDERS table."""
         print("Generating DATA_PROVIDERS table...")
-
-        if not self.constants.DATA_PROVIDERS:
-            # Fallback if no data providers defined
-            self.constants.DATA_PROVIDERS = [
-                {'id': 1, 'name': 'Provider 1'},
-                {'id': 2, 'name': 'Provider 2'},
-                {'id': 3, 'name': 'Provider 3'}
-            ]
-
-        return pd.DataFrame(self.constants.DATA_PROVIDERS)
+        return pd.DataFrame(self._data_providers())
 
     def generate_data_provider_segments(self):
         """Generate DATA_PROVIDER_SEGMENTS table."""
         print("Generating DATA_PROVIDER_SEGMENTS table...")
+        return pd.DataFrame(self._data_provider_segment_rows())
+
+    def _data_providers(self):
+        """Configured data providers (the compiled config falls back to three generic ones)."""
+        return self.constants.DATA_PROVIDERS
 
+    def _data_provider_segment_rows(self):
+        """Build the DATA_PROVIDER_SEGMENTS rows from the configured segment structure."""
         data_provider_segments = []
         segment_id = 1
 
-        if not self.constants.SEGMENT_STRUCTURE:
-            # Fallback if no segment structure defined
-            self.constants.SEGMENT_STRUCTURE = {
-                'Generic': {
-                    'Type1': ['Value1', 'Value2', 'Value3'],
-                    'Type2': ['ValueA', 'ValueB', 'ValueC']
-                }
-            }
-
         # Get the provider IDs
-        provider_ids = [p.get('id', i + 1) for i, p in enumerate(self.constants.DATA_PROVIDERS)]
+        provider_ids = [p.get('id', i + 1) for i, p in enumerate(self._data_providers())]
 
         for provider_id in provider_ids:
             # Each provider offers multiple segment categories
@@ -61,82 +54,108 @@ class DataProviderGenerator:
                         })
                         segment_id += 1
 
-        return pd.DataFrame(data_provider_segments)
-
-    def generate_data_provider_user_segment_map(self, data_provider_segments):
-        """Generate DATA_PROVIDER_USER_SEGMENT_MAP table."""
-        print("Generating DATA_PROVIDER_USER_SEGMENT_MAP table...")
+        return data_provider_segments
 
+    def _build_segment_groups(self, data_provider_segments):
+        """Group segment IDs by (provider, category) with the maximum selections allowed per user."""
         data_provider_segments_df = pd.DataFrame(data_provider_segments)
-        data_provider_user_segment_map_data = []
-
-        # Pre-process segments data into efficient dictionaries
-        provider_segments = {}
-        provider_segments_by_category = {}
-
-        # Convert DataFrame to dictionary for faster lookups
-        segments_dict = data_provider_segments_df.to_dict('records')
-
-        # Build provider and category mappings in one pass
-        for segment in segments_dict:
-            provider_id = segment['data_provider_id']
-            category = segment['segment_category']
-            segment_id = segment['id']
-
-            # Initialize provider segments
-            if provider_id not in provider_segments:
-                provider_segments[provider_id] = []
-            provider_segments[provider_id].append(segment_id)
-
-            # Initialize provider category segments
-            if provider_id not in provider_segments_by_category:
-                provider_segments_by_category[provider_id] = {}
-            if category not in provider_segments_by_category[provider_id]:
-                provider_segments_by_category[provider_id][category] = []
-            provider_segments_by_category[provider_id][category].append(segment_id)
 
         # Set of categories that should only have one selection
         single_selection_categories = {'Demographics', 'Age', 'Gender', 'Income'}
 
-        # Process users in batches for memory efficiency
-        batch_size = 10000
-        user_batches = [
-            self.user_pool_manager.data_provider_users[i:i + batch_size]
-            for i in range(0, len(self.user_pool_manager.data_provider_users), batch_size)
-        ]
-
-        provider_ids = list(provider_segments.keys())
-
-        for user_batch in user_batches:
-            for user_hash in user_batch:
-                # Determine which providers have data for this user
-                num_providers = random.randint(1, len(provider_segments))
-                user_providers = random.sample(provider_ids, min(num_providers, len(provider_ids)))
-
-                for provider_id in user_providers:
-                    provider_categories = provider_segments_by_category.get(provider_id, {})
-                    selected_segments = []
-
-                    # Process each category for this provider
-                    for category, segment_ids in provider_categories.items():
-                        if not segment_ids:
-                            continue
-
-                        max_selections = 1 if category in single_selection_categories else 2
-                        num_selections = random.randint(0, max_selections)
-
-                        if num_selections > 0:
-                            selected = random.sample(segment_ids, min(num_selections, len(segment_ids)))
-                            selected_segments.extend(selected)
+        provider_ids = list(dict.fromkeys(data_provider_segments_df['data_provider_id']))
+        segment_groups = []
+        grouped = data_provider_segments_df.groupby(['data_provider_id', 'segment_category'], sort=False)['id']
+        for (provider_id, category), segment_ids in grouped:
+            max_selections = 1 if category in single_selection_categories else 2
+            segment_groups.append((provider_ids.index(provider_id), segment_ids.to_numpy(), max_selections))
+        return np.array(provider_ids), segment_groups
+
+    def iter_data_provider_user_segment_map(self, data_provider_segments, chunk_size=100_000, executor=None):
+        """Generate DATA_PROVIDER_USER_SEGMENT_MAP rows in chunks of users.
+
+        Each user gets data from a random, non-empty subset of providers. For every
+        chosen provider and segment category the user is placed in 0-2 distinct
+        segments (0-1 for single-selection categories). Edges are built as integer
+        arrays, one vectorized pass per (provider, category) group.
+
+        Args:
+            data_provider_segments: The DATA_PROVIDER_SEGMENTS table
+            chunk_size: Number of users per yielded chunk
+            executor: Runs the shards of the table (inline when omitted)
+
+        Yields:
+            pd.DataFrame: Map rows for one chunk of users
+        """
+        print("Generating DATA_PROVIDER_USER_SEGMENT_MAP table...")
 
-                    # Batch append all segments for this user-provider combination
-                    data_provider_user_segment_map_data.extend([
-                        {
-                            'data_provider_id': provider_id,
-                            'data_provider_segment_id': segment_id,
-                            'user_email_sha256': user_hash
-                        }
-                        for segment_id in selected_segments
-                    ])
+        self._segment_groups = self._build_segment_groups(data_provider_segments)
+        executor = executor or ShardExecutor()
+        for shard_results in executor.iter_chunks(self, self.user_pool_manager.data_provider_users, chunk_size):
+            yield pd.concat(shard_results, ignore_index=True)
+
+    def generate_shard(self, shard_index, user_ids):
+        """Generate the map rows of one shard with the shard's own random generator."""
+        return self._generate_segment_map_block(user_ids, self.utilities.shard_rng(self.SHARD_KEY, shard_index))
+
+    def _generate_segment_map_block(self, user_ids, rng):
+        """Generate map rows for a block of users with whole-array operations.
+
+        Args:
+            user_ids: User indices to place in segments
+            rng: Random generator to draw from
+
+        Returns:
+            pd.DataFrame: The map rows of the block
+        """
+        if self._segment_groups is None:
+            # Worker processes build the groups from config instead of receiving the table
+            self._segment_groups = self._build_segment_groups(self._data_provider_segment_rows())
+        provider_ids, segment_groups = self._segment_groups
+        num_providers = len(provider_ids)
+        num_users = len(user_ids)
+
+        # Choose a random number of distinct providers per user: rank providers by random keys
+        providers_per_user = rng.integers(1, num_providers + 1, size=num_users)
+        provider_ranks = np.argsort(np.argsort(rng.random((num_users, num_providers)), axis=1), axis=1)
+        has_provider = provider_ranks < providers_per_user[:, None]
+
+        user_positions = []
+        segment_ids = []
+        provider_indices = []
+        for provider_index, group_segment_ids, max_selections in segment_groups:
+            num_segments = len(group_segment_ids)
+            selections = np.minimum(rng.integers(0, max_selections + 1, size=num_users), num_segments)
+            selections[~has_provider[:, provider_index]] = 0
+
+            # First pick for every user with at least one selection
+            first = rng.integers(0, num_segments, size=num_users)
+            picked = np.flatnonzero(selections >= 1)
+            user_positions.append(picked)
+            segment_ids.append(group_segment_ids[first[picked]])
+            provider_indices.append(np.full(len(picked), provider_index))
+
+            # Second, distinct pick for users with two selections
+            if max_selections > 1 and num_segments > 1:
+                second = rng.integers(0, num_segments - 1, size=num_users)
+                second += second >= first
+                picked = np.flatnonzero(selections >= 2)
+                user_positions.append(picked)
+                segment_ids.append(group_segment_ids[second[picked]])
+                provider_indices.append(np.full(len(picked), provider_index))
+
+        provider_indices = np.concatenate(provider_indices)
+        user_positions = np.concatenate(user_positions)
+        segment_ids = np.concatenate(segment_ids)
+
+        # Order edges by user, then provider, then segment
+        order = np.lexsort((segment_ids, provider_indices, user_positions))
+        return pd.DataFrame({
+            'data_provider_id': provider_ids[provider_indices[order]],
+            'data_provider_segment_id': segment_ids[order],
+            'user_id': user_ids[user_positions[order]]
+        })
 
-        return pd.DataFrame(data_provider_user_segment_map_data)
+    def generate_data_provider_user_segment_map(self, data_provider_segments):
+        """Generate DATA_PROVIDER_USER_SEGMENT_MAP table."""
+        return pd.concat(self.iter_data_provider_user_segment_map(data_provider_segments), ignore_index=True)
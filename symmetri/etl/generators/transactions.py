@@ -1,15 +1,20 @@
-import random
-from datetime import datetime, timedelta
-from functools import lru_cache
-from typing import Dict, Tuple
+from datetime import timedelta
+from typing import Iterator, Tuple
 
 import numpy as np
 import pandas as pd
 
+from symmetri.etl.config_compiler import WeightedChoice
+from symmetri.etl.sharding import ShardExecutor
+
+PRODUCT_COLUMNS = ['product_category', 'product_sub_category', 'product_type', 'product_brand', 'product_name']
+
 
 class SalesDataGenerator:
     """Generates sales transaction data."""
 
+    SHARD_KEY = 'sales'
+
     def __init__(self, user_pool_manager, constants, utilities, output_dir):
         self.user_pool_manager = user_pool_manager
         self.constants = constants
@@ -25,117 +30,180 @@ class SalesDataGenerator:
         self._currencies = np.array(self.constants.CURRENCIES)
         self._payment_methods = np.array(self.constants.PAYMENT_METHODS)
 
-    @lru_cache(maxsize=1000)
-    def generate_product_details(self) -> Dict[str, str]:
-        """Generate realistic product details based on configuration with caching."""
+        # Build the product catalog once; line items sample integer catalog indices
+        self._product_catalog = self.generate_product_catalog()
+        self._product_ids = self._product_catalog['product_id'].to_numpy()
+        self._product_choice = WeightedChoice.from_weights(self._product_ids,
+                                                           self._product_catalog['sampling_weight'].to_numpy())
+        self._product_columns = {
+            column: pd.factorize(self._product_catalog[column])
+            for column in PRODUCT_COLUMNS
+        }
+
+    def generate_product_catalog(self) -> pd.DataFrame:
+        """Generate the PRODUCTS dimension from the configured product structure and brands.
+
+        The catalog holds one row per category x subcategory x type x brand line, with a
+        product_id that is stable for a given configuration. A 'sampling_weight' column
+        carries the probability of drawing each product when every level of the hierarchy
+        is chosen uniformly.
+        """
+        rows = []
         if not self.constants.PRODUCT_STRUCTURE:
-            return {
-                'product_category': 'Generic',
-                'product_type': 'Product',
-                'product_brand': 'Brand',
-                'product_name': f"Generic Product {random.randint(1, 100)}"
-            }
-
-        # Select random category and subcategory using pre-computed keys
-        category_key = random.choice(self._product_structure_keys)
-        subcategory_keys = list(self.constants.PRODUCT_STRUCTURE[category_key].keys())
-        subcategory_key = random.choice(subcategory_keys)
-        product_type = random.choice(self.constants.PRODUCT_STRUCTURE[category_key][subcategory_key])
-
-        # Select appropriate brand if available
-        if self._brand_keys:
-            brand_key = random.choice(self._brand_keys)
-            if self.constants.PRODUCT_BRANDS[brand_key]:
-                brand_line = random.choice(self.constants.PRODUCT_BRANDS[brand_key])
-                product_name = f"{brand_key} {brand_line} {product_type}"
-            else:
-                product_name = f"{brand_key} {product_type}"
+            for product_number in range(1, 101):
+                rows.append(('Generic', 'Generic', 'Product', 'Brand', f"Generic Product {product_number}", 1 / 100))
         else:
-            brand_key = 'Generic Brand'
-            product_name = f"{brand_key} {product_type}"
-
-        return {
-            'product_category': category_key,
-            'product_sub_category': subcategory_key,
-            'product_type': product_type,
-            'product_brand': brand_key,
-            'product_name': product_name
-        }
+            brand_lines = {
+                brand_key: self.constants.PRODUCT_BRANDS[brand_key] or [None] for brand_key in self._brand_keys
+            } or {'Generic Brand': [None]}
+            category_weight = 1 / len(self._product_structure_keys)
+            for category_key in self._product_structure_keys:
+                subcategories = self.constants.PRODUCT_STRUCTURE[category_key]
+                subcategory_weight = category_weight / len(subcategories)
+                for subcategory_key, product_types in subcategories.items():
+                    type_weight = subcategory_weight / len(product_types)
+                    for product_type in product_types:
+                        brand_weight = type_weight / len(brand_lines)
+                        for brand_key, lines in brand_lines.items():
+                            for brand_line in lines:
+                                if brand_line is None:
+                                    product_name = f"{brand_key} {product_type}"
+                                else:
+                                    product_name = f"{brand_key} {brand_line} {product_type}"
+                                rows.append((category_key, subcategory_key, product_type, brand_key,
+                                             product_name, brand_weight / len(lines)))
+
+        catalog = pd.DataFrame(rows, columns=['product_category', 'product_sub_category', 'product_type',
+                                              'product_brand', 'product_name', 'sampling_weight'])
+        catalog.insert(0, 'product_id', np.arange(1, len(catalog) + 1))
+        return catalog
+
+    @property
+    def products(self) -> pd.DataFrame:
+        """The PRODUCTS table data, without the sampling weights."""
+        return self._product_catalog.drop(columns='sampling_weight')
+
+    def _sample_categorical(self, values: np.ndarray, size: int, rng: np.random.Generator) -> pd.Categorical:
+        """Uniformly sample the configured values by integer code; a value listed twice is drawn twice as often."""
+        return self.utilities.categorical(rng.integers(0, len(values), size=size), values)
 
     def generate_sales_data(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
         """Generate SALES_TRANSACTIONS and SALES_LINE_ITEMS table data using vectorized operations."""
+        transactions, line_items = zip(*self.iter_sales_data())
+        return pd.concat(transactions, ignore_index=True), pd.concat(line_items, ignore_index=True)
+
+    def iter_sales_data(self, chunk_size: int = 100_000, executor: ShardExecutor = None,
+                        first_transaction_id: int = 1,
+                        first_line_item_id: int = 1) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+        """Generate SALES_TRANSACTIONS and SALES_LINE_ITEMS table data in chunks of users.
+
+        In an incremental run (utilities.delta_window is set) only the transactions inside
+        the window are generated.
+
+        Args:
+            chunk_size: Number of users with transactions per yielded chunk
+            executor: Runs the shards of the table (inline when omitted)
+            first_transaction_id: ID of the first generated transaction
+            first_line_item_id: ID of the first generated line item
+
+        Yields:
+            Tuple[pd.DataFrame, pd.DataFrame]: The transactions and line items of one chunk
+        """
         print("Generating SALES_TRANSACTIONS and SALES_LINE_ITEMS tables...")
 
-        # Combine users with transactions efficiently using set operations
-        all_users_with_transactions = list(
-            set(self.user_pool_manager.crm_users_with_transactions) |
-            set(self.user_pool_manager.website_users_with_transactions)
+        # Combine users with transactions efficiently using sorted array operations
+        all_users_with_transactions = np.union1d(
+            self.user_pool_manager.crm_users_with_transactions,
+            self.user_pool_manager.website_users_with_transactions
         )
 
-        # Calculate transactions per user using vectorized operations
+        # Shards number their rows from 1; shift them to continue the table's ID sequences
+        executor = executor or ShardExecutor()
+        transaction_id_offset = first_transaction_id - 1
+        line_item_id_offset = first_line_item_id - 1
+        for shard_results in executor.iter_chunks(self, all_users_with_transactions, chunk_size):
+            for transactions_df, line_items_df in shard_results:
+                transactions_df['transaction_id'] += transaction_id_offset
+                line_items_df['transaction_id'] += transaction_id_offset
+                line_items_df['line_item_id'] += line_item_id_offset
+                transaction_id_offset += len(transactions_df)
+                line_item_id_offset += len(line_items_df)
+            transactions, line_items = zip(*shard_results)
+            yield pd.concat(transactions, ignore_index=True), pd.concat(line_items, ignore_index=True)
+
+    def generate_shard(self, shard_index: int, user_ids: np.ndarray) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Generate the transactions and line items of one shard with the shard's own random generator."""
+        return self._generate_sales_block(user_ids, self.utilities.shard_rng(self.SHARD_KEY, shard_index))
+
+    def _generate_sales_block(self, user_ids: np.ndarray,
+                              rng: np.random.Generator) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Generate transactions and line items for a block of users with whole-array operations.
+
+        Transaction and line item IDs of the block start at 1.
+
+        Args:
+            user_ids: User indices that have transactions
+            rng: Random generator to draw from
+
+        Returns:
+            Tuple[pd.DataFrame, pd.DataFrame]: The transactions and line items of the block
+        """
+        # Calculate transactions per user over the last year: every user has at least one. A delta
+        # window keeps the same yearly rate, so most users have none in a short window.
         avg_transactions_per_user = 3
-        num_users = len(all_users_with_transactions)
-        transactions_per_user = np.maximum(1, np.random.poisson(avg_transactions_per_user, size=num_users))
+        num_users = len(user_ids)
+        now = self.utilities.reference_time
+        start, end = now - timedelta(days=365), now
+        if self.utilities.delta_window is None:
+            transactions_per_user = np.maximum(1, rng.poisson(avg_transactions_per_user, size=num_users))
+        else:
+            start, end = self.utilities.delta_window
+            window_rate = avg_transactions_per_user * ((end - start) / timedelta(days=365))
+            transactions_per_user = rng.poisson(window_rate, size=num_users)
         total_transactions = int(np.sum(transactions_per_user))
 
         # Generate base transaction data
         transaction_ids = np.arange(1, total_transactions + 1)
-        user_indices = np.repeat(np.arange(num_users), transactions_per_user)
-
-        # Generate timestamps vectorized
-        date_range = (datetime.now() - timedelta(days=365), datetime.now())
-        timestamps = [
-            self.utilities.generate_date_between(*date_range)
-            for _ in range(total_transactions)
-        ]
-
-        # Generate transaction attributes vectorized
-        store_ids = np.random.choice(self._store_ids, total_transactions)
-        channels = np.random.choice(self._channels, total_transactions)
-        currencies = np.random.choice(self._currencies, total_transactions)
-        payment_methods = np.random.choice(self._payment_methods, total_transactions)
-
-        # Prepare line items data
-        line_items_data = []
-        transaction_totals = np.zeros(total_transactions)
-        current_line_item_id = 1
-
-        for idx in range(total_transactions):
-            num_items = random.randint(1, 5)
-
-            # Generate line items in bulk for this transaction
-            quantities = np.random.randint(1, 4, size=num_items)
-            unit_prices = np.random.uniform(10, 500, size=num_items).round(2)
-            discount_mask = np.random.random(num_items) < 0.4
-            discount_amounts = np.where(
-                discount_mask,
-                unit_prices * np.random.uniform(0, 0.3, size=num_items),
-                0
-            ).round(2)
-
-            total_line_amounts = ((unit_prices - discount_amounts / quantities) * quantities).round(2)
-            transaction_totals[idx] = np.sum(total_line_amounts)
-
-            # Generate product details for each line item
-            for item_idx in range(num_items):
-                product_details = self.generate_product_details()
-                line_items_data.append({
-                    'line_item_id': current_line_item_id + item_idx,
-                    'transaction_id': transaction_ids[idx],
-                    'product_id': random.randint(1, 1000),
-                    **product_details,
-                    'quantity': quantities[item_idx],
-                    'unit_price': unit_prices[item_idx],
-                    'discount_amount': discount_amounts[item_idx],
-                    'total_line_amount': total_line_amounts[item_idx]
-                })
-
-            current_line_item_id += num_items
-
-        # Create transactions DataFrame
+        transaction_users = np.repeat(user_ids, transactions_per_user)
+
+        # Generate timestamps within the period with seasonal and intra-day variation
+        timestamps = self.utilities.sample_datetimes(total_transactions, start, end,
+                                                     rng=rng, seasonal=True, diurnal=True)
+
+        # Generate transaction attributes as categorical codes
+        store_ids = self._sample_categorical(self._store_ids, total_transactions, rng)
+        channels = self._sample_categorical(self._channels, total_transactions, rng)
+        currencies = self._sample_categorical(self._currencies, total_transactions, rng)
+        payment_methods = self._sample_categorical(self._payment_methods, total_transactions, rng)
+
+        # Draw all line item counts at once and expand them to one row per line item
+        items_per_transaction = rng.integers(1, 6, size=total_transactions)
+        total_line_items = int(np.sum(items_per_transaction))
+        transaction_offsets = np.cumsum(items_per_transaction) - items_per_transaction
+        line_item_transaction_ids = np.repeat(transaction_ids, items_per_transaction)
+
+        quantities = rng.integers(1, 4, size=total_line_items)
+        unit_prices = rng.uniform(10, 500, size=total_line_items).round(2)
+        discount_mask = rng.random(total_line_items) < 0.4
+        discount_amounts = np.where(
+            discount_mask,
+            unit_prices * rng.uniform(0, 0.3, size=total_line_items),
+            0
+        ).round(2)
+        total_line_amounts = ((unit_prices - discount_amounts / quantities) * quantities).round(2)
+
+        # Aggregate line amounts into transaction totals with a segment reduction
+        if total_transactions > 0:
+            transaction_totals = np.add.reduceat(total_line_amounts, transaction_offsets)
+        else:
+            transaction_totals = np.zeros(0)
+
+        # Sample products by catalog index and emit the product columns as categoricals
+        product_indices = self._product_choice.sample(rng, total_line_items)
+
         transactions_df = pd.DataFrame({
             'transaction_id': transaction_ids,
-            'user_email_sha256': [all_users_with_transactions[i] for i in user_indices],
+            'user_id': transaction_users,
             'transaction_timestamp': timestamps,
             'total_amount': transaction_totals.round(2),
             'currency': currencies,
@@ -144,7 +212,18 @@ class SalesDataGenerator:
             'channel': channels
         })
 
-        # Create line items DataFrame
-        line_items_df = pd.DataFrame(line_items_data)
+        line_items_df = pd.DataFrame({
+            'line_item_id': np.arange(1, total_line_items + 1),
+            'transaction_id': line_item_transaction_ids,
+            'product_id': self._product_ids[product_indices],
+            **{
+                column: pd.Categorical.from_codes(codes[product_indices], categories=uniques)
+                for column, (codes, uniques) in self._product_columns.items()
+            },
+            'quantity': quantities,
+            'unit_price': unit_prices,
+            'discount_amount': discount_amounts,
+            'total_line_amount': total_line_amounts
+        })
 
         return transactions_df, line_items_df
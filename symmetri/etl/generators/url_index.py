@@ -0,0 +1,72 @@
+import zlib
+
+import numpy as np
+
+
+class UrlCategoryIndex:
+    """Compiled URL -> page category lookup.
+
+    Every URL is registered once and classified once against the configured
+    substring patterns (first pattern in configuration order wins). Afterwards
+    categories are resolved by integer URL index, so per-event classification is
+    a single array take. URLs matching no pattern get a category derived from a
+    stable hash of the URL, so the same URL always lands in the same category.
+    """
+
+    def __init__(self, url_category_patterns, page_categories, urls=()):
+        self.patterns = list(url_category_patterns.items())
+        self.categories = list(dict.fromkeys(
+            list(page_categories) + [category for _, category in self.patterns]
+        ))
+        if not self.categories:
+            raise ValueError('UrlCategoryIndex needs at least one page category')
+        self._fallback_categories = list(page_categories) or self.categories
+        self._category_codes = {category: code for code, category in enumerate(self.categories)}
+        self.urls = []
+        self._url_indices = {}
+        self._url_category_codes = []
+        self.add_urls(urls)
+
+    @classmethod
+    def from_constants(cls, constants):
+        """Build an index over every page URL configured for the website(s)."""
+        urls = [url for name in constants.WEBSITE_NAMES for url in constants.PAGE_URLS.get(name, [])]
+        return cls(constants.URL_CATEGORY_PATTERNS, constants.PAGE_CATEGORIES, urls)
+
+    def _classify(self, url):
+        for pattern, category in self.patterns:
+            if pattern in url:
+                return self._category_codes[category]
+        fallback = self._fallback_categories[zlib.crc32(url.encode()) % len(self._fallback_categories)]
+        return self._category_codes[fallback]
+
+    def add_url(self, url):
+        """Register a URL (if new) and return its integer index."""
+        index = self._url_indices.get(url)
+        if index is None:
+            index = len(self.urls)
+            self._url_indices[url] = index
+            self.urls.append(url)
+            self._url_category_codes.append(self._classify(url))
+        return index
+
+    def add_urls(self, urls):
+        """Register URLs and return their integer indices."""
+        return np.array([self.add_url(url) for url in urls], dtype=np.int64)
+
+    @property
+    def url_category_codes(self):
+        """Category code of every registered URL, aligned with URL indices."""
+        return np.asarray(self._url_category_codes, dtype=np.int64)
+
+    def category_codes(self, url_indices):
+        """Resolve category codes for an array of URL indices."""
+        return self.url_category_codes[url_indices]
+
+    def category(self, url):
+        """Return the page category of a single URL."""
+        return self.categories[self._url_category_codes[self.add_url(url)]]
+
+    def categorize(self, urls):
+        """Return the page categories of a sequence of URLs as an array of strings."""
+        return np.asarray(self.categories, dtype=object)[self.category_codes(self.add_urls(urls))]
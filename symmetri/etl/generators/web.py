@@ -1,190 +1,224 @@
-import random
-import uuid
-from datetime import datetime, timedelta
+from datetime import timedelta
 
 import numpy as np
-import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from symmetri.etl.generators.url_index import UrlCategoryIndex
+from symmetri.etl.sharding import ShardExecutor
 
 
 class WebsiteEventsGenerator:
     """Generates website event data."""
 
+    SHARD_KEY = 'website_events'
+
     def __init__(self, user_pool_manager, constants, utilities, output_dir):
         self.user_pool_manager = user_pool_manager
         self.constants = constants
         self.utilities = utilities
         self.output_dir = output_dir
-        # Load URL to category mapping logic from config if available
-        self.url_category_patterns = self.constants.config.get('website', {}).get('url_category_patterns', {})
+        # Compile the URL to category patterns from config once for all events
+        self.url_category_index = UrlCategoryIndex.from_constants(self.constants)
+        self._event_lookups = None
 
     def get_page_category_from_url(self, url):
         """Determine page category from URL based on configuration."""
-        # Use the URL patterns from configuration to determine category
-        for pattern, category in self.url_category_patterns.items():
-            if pattern in url:
-                return category
-
-        # If no pattern matches or no patterns defined, return a random category
-        return random.choice(self.constants.PAGE_CATEGORIES)
-
-    def get_event_type_weights(self, page_category):
-        """Get weighted event types based on page category."""
-        # Try to get weights from configuration
-        event_weights = self.constants.config.get('website', {}).get(
-            'event_weights', {}).get(page_category, {})
-
-        if event_weights:
-            return event_weights
-
-        # Default weights if not in configuration
-        if page_category == "Product Pages":
-            return {
-                'page_view': 0.3,
-                'product_view': 0.25,
-                'add_to_cart': 0.15,
-                'click': 0.1,
-                'wishlist_add': 0.1,
-                'product_comparison': 0.05,
-                'scroll': 0.05
-            }
+        return self.url_category_index.category(url)
+
+    def _time_on_page_profile(self, page_category):
+        """Return the time-on-page distribution used for a page category."""
+        if "Tips" in page_category or "Tutorial" in page_category or "Product" in page_category:
+            return 'long_exponential'
         elif "Checkout" in page_category or "Cart" in page_category:
-            return {
-                'page_view': 0.25,
-                'form_submit': 0.25,
-                'purchase': 0.2,
-                'click': 0.15,
-                'remove_from_cart': 0.1,
-                'scroll': 0.05
-            }
-        else:
-            return {
-                'page_view': 0.4,
-                'click': 0.25,
-                'scroll': 0.15,
-                'search': 0.1,
-                'form_submit': 0.05,
-                'login': 0.05
-            }
+            return 'normal'
+        return 'short_exponential'
+
+    def _build_event_lookups(self):
+        """Pre-compute the flattened URL table and per-category lookups used by the columnar engine."""
+        urls = []
+        url_offsets = []
+        url_counts = []
+        for name in self.constants.WEBSITE_NAMES:
+            website_urls = self.constants.PAGE_URLS.get(name, [])
+            if not website_urls:
+                website_urls = [f"https://{name}/page-{page}" for page in range(1, 101)]
+            url_offsets.append(len(urls))
+            url_counts.append(len(website_urls))
+            urls.extend(website_urls)
+
+        url_indices = self.url_category_index.add_urls(urls)
+        categories = self.url_category_index.categories
+        category_codes = {category: code for code, category in enumerate(categories)}
+
+        # Map the compiled event type choice of each category to codes into all event types
+        event_types = list(self.constants.ALL_EVENT_TYPES)
+        event_type_codes = {event_type: code for code, event_type in enumerate(event_types)}
+        event_weights_by_category = {}
+        for category, choice in self.constants.EVENT_TYPE_CHOICES.items():
+            type_codes = np.array([event_type_codes[event_type] for event_type in choice.keys.tolist()])
+            event_weights_by_category[category_codes[category]] = (type_codes, choice)
+
+        default_weights = event_weights_by_category[category_codes[self.constants.PAGE_CATEGORIES[0]]]
+
+        return {
+            'urls': urls,
+            'url_offsets': np.array(url_offsets),
+            'url_counts': np.array(url_counts),
+            'url_categories': self.url_category_index.category_codes(url_indices),
+            'categories': categories,
+            'event_types': event_types,
+            'event_weights': [event_weights_by_category.get(code, default_weights) for code in range(len(categories))],
+            'time_on_page_profiles': [self._time_on_page_profile(category) for category in categories],
+        }
 
     def generate_website_events(self):
         """Generate WEBSITE_EVENTS table data."""
+        return pa.concat_tables(self.iter_website_events())
+
+    def iter_website_events(self, chunk_size=100_000, executor=None, first_event_id=1):
+        """Generate WEBSITE_EVENTS table data in chunks of users.
+
+        In an incremental run (utilities.delta_window is set) only the events inside the
+        window are generated.
+
+        Args:
+            chunk_size: Number of users per yielded chunk
+            executor: Runs the shards of the table (inline when omitted)
+            first_event_id: ID of the first generated event
+
+        Yields:
+            pa.Table: The website events of one chunk of users
+        """
         print("Generating WEBSITE_EVENTS table...")
 
         if not self.constants.WEBSITE_NAMES or not self.constants.PAGE_URLS:
             print("Error: Website names or page URLs not defined in configuration.")
-            return pd.DataFrame()
-
-        # Pre-compute constants and lookups
-        website_name = self.constants.WEBSITE_NAMES[0] if len(self.constants.WEBSITE_NAMES) == 1 else None
-        urls_by_website = {
-            name: self.constants.PAGE_URLS.get(name, []) for name in self.constants.WEBSITE_NAMES
-        }
-
-        # Cache frequently used values
+            yield pa.table({})
+            return
+
+        # Shards number their events from 1; shift them to continue the table's ID sequence
+        executor = executor or ShardExecutor()
+        event_id_offset = first_event_id - 1
+        for shard_results in executor.iter_chunks(self, self.user_pool_manager.website_users, chunk_size):
+            for i, events in enumerate(shard_results):
+                shard_results[i] = events.set_column(0, 'event_id', pc.add(events['event_id'], event_id_offset))
+                event_id_offset += len(events)
+            yield pa.concat_tables(shard_results)
+
+    def generate_shard(self, shard_index, user_ids):
+        """Generate the website events of one shard with the shard's own random generator."""
+        return self._generate_events_block(user_ids, self.utilities.shard_rng(self.SHARD_KEY, shard_index))
+
+    def _generate_events_block(self, user_ids, rng):
+        """Generate website events for a block of users with whole-array operations.
+
+        Event IDs of the block start at 1.
+
+        Args:
+            user_ids: User indices to generate events for
+            rng: Random generator to draw from
+
+        Returns:
+            pa.Table: The website events of the block, with dictionary-encoded text columns
+        """
+        if self._event_lookups is None:
+            self._event_lookups = self._build_event_lookups()
+        lookups = self._event_lookups
+        avg_events_per_user = 10
+        num_users = len(user_ids)
+        num_websites = len(self.constants.WEBSITE_NAMES)
+
+        # Draw event counts per user over the last 90 days, at least one each; a delta window
+        # keeps the same rate, so most users have no events in a short window
+        now = self.utilities.reference_time
+        start, end = now - timedelta(days=90), now
+        if self.utilities.delta_window is None:
+            events_per_user = np.maximum(1, rng.poisson(avg_events_per_user, size=num_users))
+        else:
+            start, end = self.utilities.delta_window
+            events_per_user = rng.poisson(avg_events_per_user * ((end - start) / timedelta(days=90)), size=num_users)
+
+        # Expand users to one row per event
+        total_events = int(np.sum(events_per_user))
+        event_users = np.repeat(np.arange(num_users), events_per_user)
+        # First event of each user with events (delta windows leave many users without any)
+        user_starts = (np.cumsum(events_per_user) - events_per_user)[events_per_user > 0]
+
+        # Each user has a primary website and visits an alternate one 20% of the time
+        if num_websites > 1:
+            primary_websites = rng.integers(0, num_websites, size=num_users)[event_users]
+            alternate_websites = rng.integers(0, num_websites - 1, size=total_events)
+            alternate_websites += alternate_websites >= primary_websites
+            websites = np.where(rng.random(total_events) < 0.8, primary_websites, alternate_websites)
+        else:
+            websites = np.zeros(total_events, dtype=np.int64)
+
+        # Pick a page on the chosen website and resolve its category
+        url_counts = lookups['url_counts'][websites]
+        url_positions = (rng.random(total_events) * url_counts).astype(np.int64)
+        url_indices = lookups['url_offsets'][websites] + url_positions
+        page_categories = lookups['url_categories'][url_indices]
+
+        # Draw event types and time on page with one vectorized draw per page category group
+        event_types = np.empty(total_events, dtype=np.int64)
+        time_on_page = np.empty(total_events, dtype=np.int64)
+        for category_code in np.unique(page_categories):
+            group = np.flatnonzero(page_categories == category_code)
+            type_codes, choice = lookups['event_weights'][category_code]
+            event_types[group] = type_codes[choice.sample(rng, len(group))]
+
+            profile = lookups['time_on_page_profiles'][category_code]
+            if profile == 'long_exponential':
+                seconds = rng.exponential(scale=120, size=len(group))
+            elif profile == 'normal':
+                seconds = np.maximum(0, rng.normal(loc=60, scale=20, size=len(group)))
+            else:
+                seconds = rng.exponential(scale=45, size=len(group))
+            time_on_page[group] = seconds.astype(np.int64)
+
+        # Generate event timestamps within the period, weighted by time of day
+        event_timestamps = self.utilities.sample_datetimes(total_events, start, end, rng=rng, diurnal=True)
+
+        # Direct traffic is attributed to another page of the same website 70% of the time
+        referrer_urls = self.constants.REFERRER_URLS or ['']
+        referrer_codes = rng.integers(0, len(referrer_urls), size=total_events)
+        internal = (
+            (np.asarray(referrer_urls, dtype=object)[referrer_codes] == '')
+            & (rng.random(total_events) < 0.7)
+            & (url_counts > 1)
+        )
+        internal_positions = rng.integers(0, np.maximum(url_counts - 1, 1))
+        internal_positions += internal_positions >= url_positions
+        referrer_codes = np.where(
+            internal,
+            len(referrer_urls) + lookups['url_offsets'][websites] + internal_positions,
+            referrer_codes
+        )
+
+        # A new session starts at each user's first event and then with a 20% chance per event
+        session_starts = rng.random(total_events) < 0.2
+        session_starts[user_starts] = True
+        session_indices = np.cumsum(session_starts) - 1
+
+        # Assemble the columns as Arrow arrays: text columns are dictionary-encoded codes into their
+        # distinct values, and session IDs are built from their character bytes
+        session_ids = self.utilities.generate_uuid4_array(int(np.count_nonzero(session_starts)), rng)
         device_types = self.constants.DEVICE_TYPES or ['desktop']
         browsers = self.constants.BROWSERS or ['Chrome']
-        referrer_urls = self.constants.REFERRER_URLS or ['']
 
-        # Pre-compute event type weights by category
-        event_weights_by_category = {}
-        for category in self.constants.PAGE_CATEGORIES:
-            weights = self.get_event_type_weights(category)
-            valid_types = [et for et in weights.keys() if et in self.constants.EVENT_TYPES]
-            if not valid_types:
-                valid_types = list(weights.keys())
-
-            weights_list = [weights[et] for et in valid_types]
-            total = sum(weights_list)
-            normalized_weights = [w / total if total > 0 else 1 / len(weights_list) for w in weights_list]
-
-            event_weights_by_category[category] = (valid_types, normalized_weights)
-
-        website_events_data = []
-        event_id = 1
-        avg_events_per_user = 10
-        batch_size = 10000
-
-        # Process users in batches
-        user_batches = [
-            self.user_pool_manager.website_users[i:i + batch_size]
-            for i in range(0, len(self.user_pool_manager.website_users), batch_size)
-        ]
-
-        for user_batch in user_batches:
-            batch_events = []
-
-            for user_hash in user_batch:
-                num_events = max(1, np.random.poisson(avg_events_per_user))
-                session_id = str(uuid.uuid4())
-
-                if not website_name:  # Multiple websites case
-                    primary_website = random.choice(self.constants.WEBSITE_NAMES)
-                    alternate_websites = [w for w in self.constants.WEBSITE_NAMES if w != primary_website]
-
-                for _ in range(num_events):
-                    # Determine website
-                    if website_name:
-                        current_website = website_name
-                    else:
-                        current_website = primary_website if random.random() < 0.8 else random.choice(alternate_websites)
-
-                    # Get URL for website
-                    website_urls = urls_by_website[current_website]
-                    if website_urls:
-                        page_url = random.choice(website_urls)
-                    else:
-                        page_url = f"https://{current_website}/page-{random.randint(1, 100)}"
-
-                    # Get page category and event type
-                    page_category = self.get_page_category_from_url(page_url)
-                    event_types, weights = event_weights_by_category.get(
-                        page_category,
-                        event_weights_by_category[self.constants.PAGE_CATEGORIES[0]]
-                    )
-                    event_type = random.choices(event_types, weights=weights, k=1)[0]
-
-                    # Generate event timestamp
-                    event_timestamp = self.utilities.generate_date_between(
-                        datetime.now() - timedelta(days=90),
-                        datetime.now()
-                    )
-
-                    # Handle referrer URL
-                    referrer_url = random.choice(referrer_urls)
-                    if not referrer_url and random.random() < 0.7 and event_id > 1:
-                        website_urls = urls_by_website[current_website]
-                        if len(website_urls) > 1:
-                            referrer_candidates = [url for url in website_urls if url != page_url]
-                            if referrer_candidates:
-                                referrer_url = random.choice(referrer_candidates)
-
-                    # Calculate time on page
-                    if "Tips" in page_category or "Tutorial" in page_category or "Product" in page_category:
-                        time_on_page = int(np.random.exponential(scale=120))
-                    elif "Checkout" in page_category or "Cart" in page_category:
-                        time_on_page = int(np.random.normal(loc=60, scale=20))
-                    else:
-                        time_on_page = int(np.random.exponential(scale=45))
-
-                    batch_events.append({
-                        'event_id': event_id,
-                        'user_email_sha256': user_hash,
-                        'event_timestamp': event_timestamp,
-                        'website_name': current_website,
-                        'page_url': page_url,
-                        'page_category': page_category,
-                        'event_type': event_type,
-                        'session_id': session_id,
-                        'referrer_url': referrer_url,
-                        'device_type': random.choice(device_types),
-                        'browser': random.choice(browsers),
-                        'time_on_page': time_on_page
-                    })
-
-                    event_id += 1
-                    if random.random() < 0.2:  # ~20% chance of session change
-                        session_id = str(uuid.uuid4())
-
-            website_events_data.extend(batch_events)
-
-        return pd.DataFrame(website_events_data)
+        return pa.table({
+            'event_id': np.arange(1, total_events + 1),
+            'user_id': np.asarray(user_ids)[event_users],
+            'event_timestamp': event_timestamps,
+            'website_name': self.utilities.dictionary_array(websites, self.constants.WEBSITE_NAMES),
+            'page_url': self.utilities.dictionary_array(url_indices, lookups['urls']),
+            'page_category': self.utilities.dictionary_array(page_categories, lookups['categories']),
+            'event_type': self.utilities.dictionary_array(event_types, lookups['event_types']),
+            'session_id': pa.DictionaryArray.from_arrays(session_indices.astype(np.int32), session_ids),
+            'referrer_url': self.utilities.dictionary_array(referrer_codes, list(referrer_urls) + lookups['urls']),
+            'device_type': self.utilities.dictionary_array(rng.integers(0, len(device_types), size=total_events),
+                                                           device_types),
+            'browser': self.utilities.dictionary_array(rng.integers(0, len(browsers), size=total_events), browsers),
+            'time_on_page': time_on_page
+        })
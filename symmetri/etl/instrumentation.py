@@ -0,0 +1,159 @@
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+REPORT_FILE = 'run_report.json'
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss_bytes() -> int | None:
+    """Resident memory of this process right now (Linux only; None elsewhere)."""
+    try:
+        with open('/proc/self/statm', 'r') as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def peak_rss_bytes() -> int:
+    """High-water mark of this process's resident memory."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+@dataclass
+class StageStats:
+    """Totals of one stage of one table, over every call measured."""
+    stage: str
+    table: str | None
+    calls: int = 0
+    wall_seconds: float = 0.0  # Sum over calls; calls of concurrent tables overlap
+    cpu_seconds: float = 0.0  # CPU time of the calling thread (not of shard worker processes)
+    rows: int = 0
+    bytes: int = 0
+    peak_rss_growth_mb: float = 0.0  # How far the stage raised the process's peak resident memory
+    rss_retained_mb: float = 0.0  # Resident memory still held after the stage's calls
+
+
+class StageMeasurement:
+    """Handed to a measured block to report the rows and bytes it handled."""
+
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+
+
+class RunInstrumentation:
+    """Collects wall time, CPU time, rows, bytes and memory per (stage, table) of a run.
+
+    Thread-safe, so the concurrent tables of a pipeline can record into the same instance.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+        self.started_at = datetime.now()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._children_cpu_start = self._children_cpu_seconds()
+
+    @staticmethod
+    def _children_cpu_seconds() -> float:
+        times = os.times()
+        return times.children_user + times.children_system
+
+    @contextmanager
+    def measure(self, stage: str, table: str = None):
+        """Measure a block; the block may set rows and bytes on the yielded StageMeasurement."""
+        measurement = StageMeasurement()
+        rss_before = current_rss_bytes()
+        peak_before = peak_rss_bytes()
+        cpu_start = time.thread_time()
+        wall_start = time.perf_counter()
+        try:
+            yield measurement
+        finally:
+            wall_seconds = time.perf_counter() - wall_start
+            cpu_seconds = time.thread_time() - cpu_start
+            rss_after = current_rss_bytes()
+            retained = (rss_after - rss_before) if rss_before is not None and rss_after is not None else 0
+            self.record(stage, table, wall_seconds=wall_seconds, cpu_seconds=cpu_seconds,
+                        rows=measurement.rows, bytes=measurement.bytes,
+                        peak_rss_growth=peak_rss_bytes() - peak_before, rss_retained=retained)
+
+    def iter_measured(self, stage: str, table: str, iterable, count_rows=len):
+        """Iterate, measuring the production of each item and counting its rows with count_rows."""
+        iterator = iter(iterable)
+        while True:
+            with self.measure(stage, table) as measurement:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                measurement.rows = count_rows(item)
+            yield item
+
+    def record(self, stage: str, table: str = None, wall_seconds: float = 0.0, cpu_seconds: float = 0.0,
+               rows: int = 0, bytes: int = 0, peak_rss_growth: int = 0, rss_retained: int = 0):
+        """Add a measurement (or just rows or bytes) to the totals of a stage."""
+        with self._lock:
+            stats = self.stages.get((stage, table))
+            if stats is None:
+                stats = self.stages[(stage, table)] = StageStats(stage, table)
+            stats.calls += 1
+            stats.wall_seconds += wall_seconds
+            stats.cpu_seconds += cpu_seconds
+            stats.rows += rows
+            stats.bytes += bytes
+            stats.peak_rss_growth_mb += peak_rss_growth / (1024 * 1024)
+            stats.rss_retained_mb += rss_retained / (1024 * 1024)
+
+    def report(self) -> dict:
+        """Machine-readable run report: run totals and the stats of every stage."""
+        with self._lock:
+            stages = [asdict(stats) for stats in self.stages.values()]
+        return {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'wall_seconds': round(time.perf_counter() - self._wall_start, 3),
+            # This process plus the shard worker processes that have exited
+            'cpu_seconds': round(time.process_time() - self._cpu_start
+                                 + self._children_cpu_seconds() - self._children_cpu_start, 3),
+            'peak_rss_mb': round(peak_rss_bytes() / (1024 * 1024), 1),
+            'stages': [
+                {key: round(value, 3) if isinstance(value, float) else value for key, value in stage.items()}
+                for stage in stages
+            ]
+        }
+
+    def save(self, path: str) -> dict:
+        """Write the report to a file, or to REPORT_FILE inside a directory, and return it."""
+        if os.path.isdir(path):
+            path = os.path.join(path, REPORT_FILE)
+        report = self.report()
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=2)
+        return report
+
+    @staticmethod
+    def summary_table(report: dict) -> str:
+        """Human-readable table of a report, slowest stages first."""
+        lines = [f"{'stage':<12} {'table':<38} {'calls':>6} {'wall s':>9} {'cpu s':>9} {'rows':>13} "
+                 f"{'MB':>9} {'rows/s':>12} {'peak +MB':>9}"]
+        for stage in sorted(report['stages'], key=lambda stage: -stage['wall_seconds']):
+            rate = f"{stage['rows'] / stage['wall_seconds']:,.0f}" if stage['wall_seconds'] and stage['rows'] else ''
+            lines.append(
+                f"{stage['stage']:<12} {stage['table'] or '':<38} {stage['calls']:>6} {stage['wall_seconds']:>9.2f} "
+                f"{stage['cpu_seconds']:>9.2f} {stage['rows']:>13,} {stage['bytes'] / (1024 * 1024):>9.1f} "
+                f"{rate:>12} {stage['peak_rss_growth_mb']:>9.1f}"
+            )
+        lines.append(f"Total: {report['wall_seconds']:.2f}s wall, {report['cpu_seconds']:.2f}s cpu, "
+                     f"peak RSS {report['peak_rss_mb']:.1f} MB")
+        return '\n'.join(lines)
@@ -0,0 +1,71 @@
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+MANIFEST_FILE = 'manifest.json'
+
+
+@dataclass
+class RunManifest:
+    """Record of a generation run, enough to continue its tables with an incremental run.
+
+    An incremental run rebuilds the same user pools from the seed and config, generates the
+    activity between the previous window_end and its own, and continues the ID sequences
+    from next_ids. config_hash identifies the config contents, so a run with an edited config
+    can be refused instead of merging different user pools into the tables.
+    """
+    run_type: str  # 'full' or 'incremental'
+    config_path: str
+    seed: int
+    window_end: datetime  # Generated activity covers everything up to this time
+    config_hash: Optional[str] = None  # content_hash of the compiled config (absent in older manifests)
+    window_start: Optional[datetime] = None  # Start of an incremental run's window
+    next_ids: Dict[str, int] = field(default_factory=dict)  # Next free ID per ID column
+    tables: Dict[str, int] = field(default_factory=dict)  # Rows written per table
+    files: Dict[str, str] = field(default_factory=dict)  # Output file per table
+
+    def to_json(self) -> Dict[str, Any]:
+        """Convert RunManifest to a JSON-serializable dictionary."""
+        return {
+            'run_type': self.run_type,
+            'config_path': self.config_path,
+            'seed': self.seed,
+            'config_hash': self.config_hash,
+            'window_start': self.window_start.isoformat() if self.window_start else None,
+            'window_end': self.window_end.isoformat(),
+            'next_ids': self.next_ids,
+            'tables': self.tables,
+            'files': self.files
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> 'RunManifest':
+        """Create a RunManifest instance from a JSON dictionary."""
+        return cls(
+            run_type=data['run_type'],
+            config_path=data['config_path'],
+            seed=data['seed'],
+            config_hash=data.get('config_hash'),
+            window_start=datetime.fromisoformat(data['window_start']) if data.get('window_start') else None,
+            window_end=datetime.fromisoformat(data['window_end']),
+            next_ids=data.get('next_ids', {}),
+            tables=data.get('tables', {}),
+            files=data.get('files', {})
+        )
+
+    def save(self, path: str):
+        """Write the manifest to a file, or to MANIFEST_FILE inside a directory."""
+        if os.path.isdir(path):
+            path = os.path.join(path, MANIFEST_FILE)
+        with open(path, 'w') as file:
+            json.dump(self.to_json(), file, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> 'RunManifest':
+        """Read a manifest from a file, or from MANIFEST_FILE inside a directory."""
+        if os.path.isdir(path):
+            path = os.path.join(path, MANIFEST_FILE)
+        with open(path, 'r') as file:
+            return cls.from_json(json.load(file))
@@ -0,0 +1,101 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+# Default concurrency limits: 'tables' bounds the tasks running at once, the others bound
+# how many tasks may be inside a stage (generating a chunk, writing a file, loading a table)
+DEFAULT_STAGE_LIMITS = {
+    'tables': 4,
+    'generate': 2,
+    'write': 2,
+    'load': 4,
+}
+
+
+class PipelineTask:
+    """A named unit of work that runs once all the tasks it depends on have finished."""
+
+    def __init__(self, name: str, func, depends_on: tuple[str, ...] = ()):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+
+
+class Pipeline:
+    """Runs tasks concurrently on a thread pool in dependency order.
+
+    A task is called with the results of its dependencies, in depends_on order. Tasks bound
+    their own stages with stage() or iter_stage(), so each stage runs with at most its
+    configured number of tasks at a time.
+    """
+
+    def __init__(self, stage_limits: dict[str, int] = None):
+        for stage, limit in (stage_limits or {}).items():
+            if stage not in DEFAULT_STAGE_LIMITS:
+                raise ValueError(f'Unknown pipeline stage: {stage}')
+            if limit < 1:
+                raise ValueError(f'The {stage} limit must be at least 1, got {limit}')
+        self.stage_limits = {**DEFAULT_STAGE_LIMITS, **(stage_limits or {})}
+        self.tasks = {}
+        self._semaphores = {
+            stage: threading.BoundedSemaphore(limit)
+            for stage, limit in self.stage_limits.items() if stage != 'tables'
+        }
+
+    def add(self, name: str, func, depends_on: tuple[str, ...] = ()):
+        """Add a task; its dependencies must already have been added."""
+        if name in self.tasks:
+            raise ValueError(f'Duplicate pipeline task: {name}')
+        missing = [dependency for dependency in depends_on if dependency not in self.tasks]
+        if missing:
+            raise ValueError(f'Pipeline task {name} depends on unknown tasks: {missing}')
+        self.tasks[name] = PipelineTask(name, func, depends_on)
+
+    @contextmanager
+    def stage(self, stage: str):
+        """Hold one of the stage's concurrency slots for the duration of the block."""
+        semaphore = self._semaphores.get(stage)
+        if semaphore is None:
+            yield
+            return
+        with semaphore:
+            yield
+
+    def iter_stage(self, stage: str, iterable):
+        """Iterate, holding a slot of the stage only while each item is produced."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(stage):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def run(self) -> dict:
+        """Run every task and return their results by task name.
+
+        The first failing task stops the scheduling of further tasks; tasks already running
+        are waited for and the failure is raised.
+        """
+        results = {}
+        remaining = dict(self.tasks)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.stage_limits['tables'],
+                                thread_name_prefix='pipeline') as executor:
+            while remaining or running:
+                for name, task in list(remaining.items()):
+                    if all(dependency in results for dependency in task.depends_on):
+                        arguments = [results[dependency] for dependency in task.depends_on]
+                        running[executor.submit(task.func, *arguments)] = name
+                        del remaining[name]
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        wait(running)
+                        raise error
+                    results[name] = future.result()
+        return results
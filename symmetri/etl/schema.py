@@ -0,0 +1,85 @@
+import os
+import re
+from functools import lru_cache
+
+from symmetri.db.base import Column, Table
+
+# The customer data model the generated tables are loaded into
+DATA_MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'schema', 'customer_data_model.sql')
+
+_CREATE_TABLE_PATTERN = re.compile(r'CREATE\s+(?:OR\s+REPLACE\s+)?TABLE\s+(\w+)\s*\((.*?)\);', re.IGNORECASE | re.DOTALL)
+_TYPE_PATTERN = re.compile(r'(\w+)(?:\s*\(\s*(\d+)\s*(?:,\s*(\d+)\s*)?\))?')
+
+
+def _split_definitions(body: str) -> list[str]:
+    """Split a CREATE TABLE body on the commas that are not inside parentheses."""
+    definitions = []
+    depth = 0
+    current = []
+    for char in body:
+        if char == ',' and depth == 0:
+            definitions.append(''.join(current).strip())
+            current = []
+            continue
+        depth += {'(': 1, ')': -1}.get(char, 0)
+        current.append(char)
+    definitions.append(''.join(current).strip())
+    return [definition for definition in definitions if definition]
+
+
+def parse_data_model(sql: str) -> dict[str, Table]:
+    """Parse the CREATE TABLE statements of a data model.
+
+    Args:
+        sql: SQL text with CREATE [OR REPLACE] TABLE statements
+
+    Returns:
+        dict[str, Table]: Tables by name, with columns in declaration order. Column data
+            types are kept as declared, e.g. 'DECIMAL(10,2)' or 'TIMESTAMP_NTZ(9)'.
+    """
+    sql = re.sub(r'--[^\n]*', '', sql)
+    tables = {}
+    for table_name, body in _CREATE_TABLE_PATTERN.findall(sql):
+        columns = []
+        primary_keys = []
+        for definition in _split_definitions(body):
+            if definition.upper().startswith('PRIMARY KEY'):
+                primary_keys.extend(name.strip() for name in definition[definition.index('(') + 1:-1].split(','))
+                continue
+            name, declaration = definition.split(None, 1)
+            data_type = _TYPE_PATTERN.match(declaration).group(0).replace(' ', '')
+            modifiers = declaration[len(data_type):].upper()
+            columns.append(Column(
+                name=name,
+                data_type=data_type.upper(),
+                nullable='NOT NULL' not in modifiers and 'PRIMARY KEY' not in modifiers,
+                primary_key='PRIMARY KEY' in modifiers
+            ))
+        for column in columns:
+            if column.name in primary_keys:
+                column.primary_key = True
+                column.nullable = False
+        tables[table_name.upper()] = Table(table_name.upper(), columns)
+    return tables
+
+
+@lru_cache(maxsize=None)
+def load_data_model(path: str = DATA_MODEL_PATH) -> dict[str, Table]:
+    """Load and parse a data model file (cached per path)."""
+    with open(path, 'r') as file:
+        return parse_data_model(file.read())
+
+
+def parse_data_type(data_type: str) -> tuple[str, int | None, int | None]:
+    """Split a declared data type such as 'DECIMAL(10,2)' into ('DECIMAL', 10, 2)."""
+    base_type, precision, scale = _TYPE_PATTERN.match(data_type).groups()
+    return (
+        base_type.upper(),
+        int(precision) if precision is not None else None,
+        int(scale) if scale is not None else None
+    )
+
+
+def primary_key_columns(table: Table) -> list[str]:
+    """Names of the primary key columns of a table, in declaration order."""
+    return [column.name for column in table.columns if column.primary_key]
@@ -0,0 +1,109 @@
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from symmetri.etl.generators.common import Constants, Utilities
+
+# Users per shard. Shards are the unit of seeding: each one draws from its own RNG
+# stream, so output depends only on the root seed and this size, never on the
+# number of workers or on how shards are grouped into chunks.
+SHARD_USERS = 20_000
+
+# Generator instances of a worker process, created by _init_worker
+_worker_generators = {}
+
+
+def _generator_classes():
+    # Imported lazily: generators depend on this module for their iter_* methods
+    from symmetri.etl.generators.crm import CRMDataGenerator
+    from symmetri.etl.generators.data_providers import DataProviderGenerator
+    from symmetri.etl.generators.transactions import SalesDataGenerator
+    from symmetri.etl.generators.web import WebsiteEventsGenerator
+    return {
+        generator_class.SHARD_KEY: generator_class
+        for generator_class in (CRMDataGenerator, SalesDataGenerator, WebsiteEventsGenerator, DataProviderGenerator)
+    }
+
+
+def _init_worker(config_path, seed, reference_time, locale_pools, delta_window):
+    constants = Constants(config_path)
+    utilities = Utilities(seed=seed, reference_time=reference_time, locale_pools=locale_pools,
+                          delta_window=delta_window)
+    for key, generator_class in _generator_classes().items():
+        _worker_generators[key] = generator_class(None, constants, utilities, None)
+
+
+def _generate_shard(shard_key, shard_index, user_ids):
+    return _worker_generators[shard_key].generate_shard(shard_index, user_ids)
+
+
+class ShardExecutor:
+    """Runs per-shard generation either inline or on a pool of worker processes.
+
+    Workers rebuild the generators from the config path, root seed, reference time,
+    delta window and the parent's locale pools, so a shard produces the same output
+    wherever it runs. Results are always returned in shard order.
+    """
+
+    def __init__(self, config_path=None, seed=42, reference_time=None, locale_pools=None, workers=1,
+                 shard_size=SHARD_USERS, delta_window=None):
+        self.shard_size = shard_size
+        self.workers = workers
+        self._pool = None
+        if workers > 1:
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(config_path, seed, reference_time, locale_pools, delta_window)
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def _shards(self, users):
+        """Split users into (shard_index, user_ids) pairs; there is always at least one shard."""
+        starts = range(0, max(len(users), 1), self.shard_size)
+        return [(shard_index, users[start:start + self.shard_size]) for shard_index, start in enumerate(starts)]
+
+    def iter_shards(self, generator, users):
+        """Yield generator.generate_shard results for every shard of users, in shard order."""
+        shards = self._shards(users)
+        if self._pool is None:
+            for shard_index, user_ids in shards:
+                yield generator.generate_shard(shard_index, user_ids)
+            return
+
+        # Keep a bounded number of shards in flight so memory stays flat
+        pending = deque()
+        shards = iter(shards)
+        for shard_index, user_ids in shards:
+            pending.append(self._pool.submit(_generate_shard, generator.SHARD_KEY, shard_index, user_ids))
+            if len(pending) >= 2 * self.workers:
+                break
+        while pending:
+            result = pending.popleft().result()
+            for shard_index, user_ids in shards:
+                pending.append(self._pool.submit(_generate_shard, generator.SHARD_KEY, shard_index, user_ids))
+                break
+            yield result
+
+    def iter_chunks(self, generator, users, chunk_size):
+        """Yield lists of consecutive shard results holding about chunk_size users each."""
+        shards_per_chunk = max(1, chunk_size // self.shard_size)
+        chunk = []
+        for result in self.iter_shards(generator, users):
+            chunk.append(result)
+            if len(chunk) == shards_per_chunk:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
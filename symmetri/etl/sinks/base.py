@@ -0,0 +1,84 @@
+from abc import ABC, abstractmethod
+
+import pandas as pd
+import pyarrow as pa
+
+# How a load treats the rows already in the table
+LOAD_MODES = ('replace', 'append', 'merge')
+
+
+def check_load_mode(mode: str, primary_keys: list[str]):
+    if mode not in LOAD_MODES:
+        raise ValueError(f'Unknown load mode: {mode}')
+    if mode == 'merge' and not primary_keys:
+        raise ValueError('Merge loads need the primary key columns of the table')
+
+
+class TableLoader(ABC):
+    """Loads the chunks of one table, Arrow tables typed after the data model; the rows become visible on commit()."""
+
+    @abstractmethod
+    def append(self, table: pa.Table):
+        """Write a chunk of rows to the table."""
+        pass
+
+    @abstractmethod
+    def commit(self):
+        pass
+
+    @abstractmethod
+    def close(self):
+        """Release the loader's connection; an uncommitted load is rolled back."""
+        pass
+
+
+class DataSink(ABC):
+    """A warehouse the generated tables are loaded into.
+
+    Loads run in one of the LOAD_MODES: 'replace' empties the table first, 'append' adds
+    the rows, and 'merge' matches them on primary_keys, updating the given columns of
+    existing rows and inserting the others.
+    """
+
+    @abstractmethod
+    def open_table_loader(self, table_name: str, chunk_size: int = 1000000, mode: str = 'replace',
+                          primary_keys: list[str] = None) -> TableLoader:
+        """Start a load into table_name that accepts Arrow table chunks as they are generated."""
+        pass
+
+    @abstractmethod
+    def copy_files_into_table(self, table_name: str, file_paths: list[str], file_format: str,
+                              mode: str = 'replace', primary_keys: list[str] = None,
+                              columns: list[str] = None, **options) -> int:
+        """Bulk load already-written output files into table_name.
+
+        Args:
+            table_name: Target table name
+            file_paths: Local files holding the table's rows
+            file_format: The writer's Snowflake file format options
+            mode: 'replace', 'append' or 'merge'
+            primary_keys: Columns rows are matched on in merge mode
+            columns: Columns present in the files
+            options: Sink-specific options, e.g. upload_parallel for Snowflake
+
+        Returns:
+            int: Number of rows loaded
+        """
+        pass
+
+    def write_df_to_table(self, df: pd.DataFrame, table_name: str, chunk_size: int = 1000000):
+        """Replace the rows of table_name with a DataFrame."""
+        loader = self.open_table_loader(table_name, chunk_size=chunk_size)
+        try:
+            loader.append(pa.Table.from_pandas(df, preserve_index=False))
+            loader.commit()
+        finally:
+            loader.close()
+
+    @abstractmethod
+    def summary(self) -> str:
+        """One-line summary of the sink's connection and load costs, for load reports."""
+        pass
+
+    def close(self):
+        pass
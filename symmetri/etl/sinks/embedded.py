@@ -0,0 +1,317 @@
+import os
+import sqlite3
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from symmetri.db.base import Table
+from symmetri.etl.schema import load_data_model, parse_data_type
+from symmetri.etl.sinks.base import DataSink, TableLoader, check_load_mode
+from symmetri.etl.writers import csv_schema
+
+try:
+    import duckdb
+except ImportError:  # The sqlite engine needs nothing beyond the standard library
+    duckdb = None
+
+EMBEDDED_ENGINES = ('duckdb', 'sqlite')
+
+# Rows converted to Python values at a time when inserting into SQLite
+DEFAULT_SQLITE_BATCH_ROWS = 50_000
+
+# Data model types the embedded engines spell differently from Snowflake
+_EMBEDDED_TYPES = {
+    'STRING': 'VARCHAR',
+    'TEXT': 'VARCHAR',
+    'NUMBER': 'DECIMAL',
+    'TIMESTAMP_NTZ': 'TIMESTAMP',
+}
+
+
+def embedded_type(data_type: str) -> str:
+    """Translate a data model column type, e.g. 'TIMESTAMP_NTZ(9)' -> 'TIMESTAMP'."""
+    base_type, precision, scale = parse_data_type(data_type)
+    base_type = _EMBEDDED_TYPES.get(base_type, base_type)
+    if base_type == 'DECIMAL' and precision is not None:
+        return f'DECIMAL({precision},{scale or 0})'
+    return base_type
+
+
+class EmbeddedSink(DataSink):
+    """Loads the generated tables into a local DuckDB or SQLite database file.
+
+    A stand-in for Snowflake that needs no credentials or network, so generation and
+    load throughput can be measured end to end on a laptop or in CI. Tables are created
+    from the customer data model; as in Snowflake, primary keys are not enforced.
+
+    DuckDB loads write to their table in a transaction per loader and append chunks with
+    its native appender. SQLite allows one writer at a time, so its loaders stage the
+    chunks in a temporary table and publish them in one short transaction on commit().
+    """
+
+    def __init__(self, path: str, schema: str = 'SYMMETRI', engine: str = None,
+                 data_model: dict[str, Table] = None):
+        """Open (or create) the database file.
+
+        Args:
+            path: Database file
+            schema: Schema the tables are created in (DuckDB only; SQLite has no schemas)
+            engine: 'duckdb' or 'sqlite'; defaults to duckdb when it is installed
+            data_model: Tables by name (defaults to schema/customer_data_model.sql)
+        """
+        engine = engine or ('duckdb' if duckdb is not None else 'sqlite')
+        if engine not in EMBEDDED_ENGINES:
+            raise ValueError(f'Unknown embedded engine: {engine}')
+        if engine == 'duckdb' and duckdb is None:
+            raise ImportError('The duckdb sink needs the duckdb package')
+        self.path = path
+        self.schema = schema
+        self.engine = engine
+        self.data_model = data_model or load_data_model()
+        self._lock = threading.Lock()
+        self._database = None
+
+        # Load summary counters
+        self.rows_loaded = 0
+        self.load_seconds = 0.0
+
+        if engine == 'duckdb':
+            self._database = duckdb.connect(path)
+            self._database.execute(f'CREATE SCHEMA IF NOT EXISTS {schema}')
+
+    def connect(self):
+        """Open a connection for one loader; DuckDB connections share the open database."""
+        if self.engine == 'duckdb':
+            connection = self._database.cursor()
+            connection.execute(f"SET search_path = '{self.schema}'")
+            return connection
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        return connection
+
+    def qualified_name(self, table_name: str) -> str:
+        return f'{self.schema}.{table_name}' if self.engine == 'duckdb' else table_name
+
+    def create_table_sql(self, table_name: str, target_name: str = None, temporary: bool = False) -> str:
+        """CREATE TABLE statement of a data model table, optionally under another name."""
+        definitions = [
+            f'{column.name} {embedded_type(column.data_type)}'
+            for column in self.data_model[table_name].columns
+        ]
+        return (f"CREATE {'TEMPORARY ' if temporary else ''}TABLE {target_name or self.qualified_name(table_name)} "
+                f"({', '.join(definitions)})")
+
+    def _record_load(self, rows: int, seconds: float):
+        with self._lock:
+            self.rows_loaded += rows
+            self.load_seconds += seconds
+
+    def open_table_loader(self, table_name: str, chunk_size: int = 1000000, mode: str = 'replace',
+                          primary_keys: list[str] = None) -> 'EmbeddedTableLoader':
+        return EmbeddedTableLoader(self, table_name, mode, primary_keys)
+
+    def copy_files_into_table(self, table_name: str, file_paths: list[str], file_format: str,
+                              mode: str = 'replace', primary_keys: list[str] = None,
+                              columns: list[str] = None, **options) -> int:
+        """Load output files; the file type is taken from the extension, not the Snowflake file_format.
+
+        DuckDB scans the files natively; for SQLite they are read in record batches and
+        loaded like generated chunks.
+        """
+        loader = self.open_table_loader(table_name, mode=mode, primary_keys=primary_keys)
+        try:
+            if self.engine == 'duckdb':
+                loader.append_files(file_paths, columns)
+            else:
+                schema = csv_schema(self.data_model[table_name])
+                for file_path in file_paths:
+                    for batch in _iter_file_batches(file_path, schema):
+                        loader.append(pa.Table.from_batches([batch]))
+            loader.commit()
+        finally:
+            loader.close()
+        return loader.total_rows
+
+    def table_rows(self, table_name: str) -> int:
+        """Number of rows in a loaded table."""
+        connection = self.connect()
+        try:
+            return connection.execute(f'SELECT COUNT(*) FROM {self.qualified_name(table_name)}').fetchone()[0]
+        finally:
+            connection.close()
+
+    def summary(self) -> str:
+        return (f"{self.engine} sink {self.path}: {self.rows_loaded} rows loaded in "
+                f"{self.load_seconds:.2f}s of load time")
+
+    def close(self):
+        if self._database is not None:
+            self._database.close()
+            self._database = None
+
+
+class EmbeddedTableLoader(TableLoader):
+    """Appends Arrow table chunks to one table of an EmbeddedSink."""
+
+    def __init__(self, sink: EmbeddedSink, table_name: str, mode: str = 'replace', primary_keys: list[str] = None):
+        check_load_mode(mode, primary_keys)
+        self.sink = sink
+        self.table_name = table_name
+        self.target_table = sink.qualified_name(table_name)
+        self.mode = mode
+        self.primary_keys = primary_keys
+        self.columns = None
+        self.total_rows = 0
+        self.conn = sink.connect()
+
+        # Rows go straight to the table in a DuckDB transaction, or to a staging table that is
+        # published on commit() for merges and for SQLite, which has a single writer
+        self.staged = mode == 'merge' or sink.engine == 'sqlite'
+        # (by bare name: DuckDB resolves it through the connection's search_path)
+        self.load_table = f'{table_name}_STAGE' if self.staged else table_name
+        self._started = time.perf_counter()
+        self.conn.execute('BEGIN TRANSACTION')
+        if not self.staged:
+            self._prepare_target()
+        else:
+            self.conn.execute(f'DROP TABLE IF EXISTS temp.{self.load_table}')
+            self.conn.execute(sink.create_table_sql(table_name, self.load_table, temporary=True))
+
+    def _prepare_target(self):
+        """Create the target table, or recreate it empty in replace mode."""
+        if self.mode == 'replace':
+            self.conn.execute(f'DROP TABLE IF EXISTS {self.target_table}')
+        self.conn.execute(self.sink.create_table_sql(self.table_name).replace(
+            'CREATE TABLE', 'CREATE TABLE IF NOT EXISTS', 1))
+
+    def append(self, table: pa.Table):
+        """Write a chunk of rows with the engine's bulk insert path."""
+        start = time.perf_counter()
+        if self.columns is None:
+            self.columns = list(table.column_names)
+        if self.sink.engine == 'duckdb':
+            # DuckDB scans the Arrow buffers in place
+            view = f'{self.load_table}_CHUNK'
+            self.conn.register(view, table)
+            try:
+                self.conn.execute(f'INSERT INTO {self.load_table} BY NAME SELECT * FROM {view}')
+            finally:
+                self.conn.unregister(view)
+        else:
+            placeholders = ', '.join('?' for _ in table.column_names)
+            self.conn.executemany(
+                f"INSERT INTO temp.{self.load_table} ({', '.join(table.column_names)}) VALUES ({placeholders})",
+                _sqlite_rows(table)
+            )
+        self.total_rows += len(table)
+        self.sink._record_load(len(table), time.perf_counter() - start)
+
+    def append_files(self, file_paths: list[str], columns: list[str] = None):
+        """Have DuckDB scan output files into the table directly.
+
+        CSV files are read with the data model types instead of sniffed ones, and only an unquoted
+        empty field is NULL, so the rows match the ones a stream load of the same chunks stores.
+        """
+        start = time.perf_counter()
+        data_types = {
+            column.name: embedded_type(column.data_type) for column in self.sink.data_model[self.table_name].columns
+        }
+        columns = columns or list(data_types)
+        files = ', '.join(f"'{os.path.abspath(file_path)}'" for file_path in file_paths)
+        if all(file_path.endswith('.parquet') for file_path in file_paths):
+            source = f'read_parquet([{files}])'
+        else:
+            column_types = ', '.join(f"'{name}': '{data_types[name]}'" for name in columns)
+            source = (f"read_csv([{files}], header = true, delim = ',', quote = '\"', escape = '\"', "
+                      f"columns = {{{column_types}}}, allow_quoted_nulls = false)")
+        rows = self.conn.execute(f'INSERT INTO {self.load_table} BY NAME SELECT * FROM {source}').fetchone()[0]
+        if self.columns is None:
+            self.columns = columns
+        self.total_rows += rows
+        self.sink._record_load(rows, time.perf_counter() - start)
+
+    def commit(self):
+        start = time.perf_counter()
+        if self.staged:
+            self._publish_staged_rows()
+        self.conn.execute('COMMIT')
+        self.sink._record_load(0, time.perf_counter() - start)
+        print(f"Completed: Successfully stored {self.total_rows} total rows in {self.sink.schema}.{self.table_name} "
+              f"({time.perf_counter() - self._started:.2f}s)")
+
+    def _publish_staged_rows(self):
+        """Move the staged rows into the table: copy them, or merge them on the primary keys."""
+        staging_table = f'temp.{self.load_table}' if self.sink.engine == 'sqlite' else self.load_table
+        if self.sink.engine == 'sqlite':
+            # Take the write lock only now, so loads of other tables are not blocked while generating
+            self.conn.execute('COMMIT')
+            self.conn.execute('BEGIN IMMEDIATE')
+        self._prepare_target()
+        columns = self.columns or [column.name for column in self.sink.data_model[self.table_name].columns]
+        column_list = ', '.join(columns)
+
+        if self.mode != 'merge':
+            self.conn.execute(f'INSERT INTO {self.target_table} ({column_list}) '
+                              f'SELECT {column_list} FROM {staging_table}')
+            return
+
+        if self.sink.engine == 'sqlite':
+            # Without enforced keys, the index is what keeps repeated merges from scanning the table
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table_name}_PK "
+                              f"ON {self.table_name} ({', '.join(self.primary_keys)})")
+        condition = ' AND '.join(f't.{key} = s.{key}' for key in self.primary_keys)
+        updates = ', '.join(f'{column} = s.{column}' for column in columns if column not in self.primary_keys)
+        if updates:
+            self.conn.execute(f'UPDATE {self.target_table} AS t SET {updates} FROM {staging_table} AS s '
+                              f'WHERE {condition}')
+        self.conn.execute(f'INSERT INTO {self.target_table} ({column_list}) '
+                          f'SELECT {", ".join(f"s.{column}" for column in columns)} FROM {staging_table} AS s '
+                          f'WHERE NOT EXISTS (SELECT 1 FROM {self.target_table} AS t WHERE {condition})')
+
+    def close(self):
+        # An uncommitted load is rolled back
+        try:
+            self.conn.execute('ROLLBACK')
+        except Exception:
+            pass
+        self.conn.close()
+
+
+def _iter_file_batches(file_path: str, schema: pa.Schema):
+    """Record batches of a Parquet or (compressed) CSV output file.
+
+    CSV columns are read as the types of schema (see writers.csv_schema) instead of guessed
+    ones, so e.g. a postal code 01234 stays a string; only an unquoted empty field is null.
+    """
+    if file_path.endswith('.parquet'):
+        yield from pq.ParquetFile(file_path).iter_batches()
+        return
+    convert_options = pa_csv.ConvertOptions(column_types=schema, strings_can_be_null=True,
+                                            quoted_strings_can_be_null=False)
+    with pa.input_stream(file_path, compression='detect') as stream:
+        yield from pa_csv.open_csv(stream, convert_options=convert_options)
+
+
+def _sqlite_compatible(table: pa.Table) -> pa.Table:
+    """Cast the Arrow types sqlite3 cannot bind: decimals to floats, dates and timestamps to text."""
+    columns = []
+    for column in table.columns:
+        if pa.types.is_decimal(column.type):
+            # Through text: Arrow's direct cast can land a float off the decimal's nearest one
+            column = column.cast(pa.string()).cast(pa.float64())
+        elif pa.types.is_timestamp(column.type):
+            column = column.cast(pa.timestamp('s'), safe=False).cast(pa.string())
+        elif pa.types.is_date(column.type) or pa.types.is_dictionary(column.type):
+            column = column.cast(pa.string())
+        columns.append(column)
+    return pa.Table.from_arrays(columns, names=table.column_names)
+
+
+def _sqlite_rows(table: pa.Table):
+    """Rows of plain Python values of a chunk, in batches of rows to bound the objects alive at once."""
+    for batch in _sqlite_compatible(table).to_batches(max_chunksize=DEFAULT_SQLITE_BATCH_ROWS):
+        yield from zip(*(column.to_pylist() for column in batch.columns))
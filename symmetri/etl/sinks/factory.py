@@ -0,0 +1,25 @@
+from symmetri.etl.sinks.base import DataSink
+from symmetri.etl.sinks.embedded import EMBEDDED_ENGINES, EmbeddedSink
+
+SINKS = ('snowflake',) + EMBEDDED_ENGINES
+
+
+def get_sink(name: str, database: str, schema: str, path: str = None) -> DataSink:
+    """Open the sink the generated tables are loaded into.
+
+    Args:
+        name: 'snowflake', or 'duckdb' / 'sqlite' for a local database file
+        database: Snowflake database
+        schema: Schema of the tables
+        path: Database file of the embedded sinks
+    """
+    if name == 'snowflake':
+        # The connector takes over half a second to import; local sinks do without it
+        from symmetri.etl.snowflake.connection_manager import SnowflakeConnectionManager
+        return SnowflakeConnectionManager(snowflake_database=database, snowflake_schema=schema)
+    elif name in EMBEDDED_ENGINES:
+        if path is None:
+            raise ValueError(f'The {name} sink needs a database file path')
+        return EmbeddedSink(path, schema, engine=name)
+    else:
+        raise ValueError(f'Unknown sink: {name}')
@@ -1,123 +1,230 @@
 import os
-import pandas as pd
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
-import snowflake.connector as snow
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import serialization
-from snowflake.connector.pandas_tools import write_pandas
+import pyarrow as pa
+import pyarrow.parquet as pq
 
+from symmetri.db.snowflake_sessions import get_session_pool
+from symmetri.etl.sinks.base import DataSink, TableLoader, check_load_mode
 
-class SnowflakeConnectionManager(object):
+
+class SnowflakeConnectionManager(DataSink):
 
     def __init__(self, snowflake_database: str, snowflake_schema: str):
-        self.user = os.environ.get('SNOWFLAKE_DB_USER', None)
-        self.private_key_path = os.environ.get('SNOWFLAKE_PRIVATE_KEY_PATH', None)
-        self.private_key_passphrase = os.environ.get('SNOWFLAKE_PRIVATE_KEY_PASSPHRASE', None)
-        self.account = os.environ.get('SNOWFLAKE_ACCOUNT', None)
-        self.warehouse = os.environ.get('SNOWFLAKE_COMPUTE_WAREHOUSE', None)
-        self.role = os.environ.get('SNOWFLAKE_DB_ROLE', None)
         self.database = snowflake_database
         self.schema = snowflake_schema
-        self.private_key = self._load_private_key()
+        # Sessions and the key-pair credential are shared by every manager and provider of the database
+        self.session_pool = get_session_pool(snowflake_database)
         self.current_tables = set()
         self._load_current_tables()
 
     def get_connection(self):
-        snow.paramstyle = 'qmark'
-        return snow.connect(
-            user=self.user.upper(),
-            private_key=self._get_private_key_pkcs8(),
-            account=self.account.upper(),
-            database=self.database.upper(),
-            warehouse=self.warehouse.upper(),
-            role=self.role.upper(),
-            autocommit=False
-        )
-        
+        """Borrow a pooled session; hand it back with release_connection()."""
+        return self.session_pool.acquire()
+
+    def release_connection(self, connection, discard: bool = False):
+        self.session_pool.release(connection, discard=discard)
+
     def _load_current_tables(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Check if table exists
-        cursor.execute(f"""
-            SELECT COUNT(*) 
-            FROM INFORMATION_SCHEMA.TABLES 
-            WHERE TABLE_SCHEMA = '{self.schema.upper()}' 
-        """)
-        rows = cursor.fetchall()
-        for row in rows:
-            self.current_tables.add(row[0])
-        cursor.close()
+        with self.session_pool.session() as conn:
+            cursor = conn.cursor()
+
+            # Collect the tables that already exist in the schema
+            cursor.execute(f"""
+                SELECT TABLE_NAME
+                FROM INFORMATION_SCHEMA.TABLES
+                WHERE TABLE_SCHEMA = '{self.schema.upper()}'
+            """)
+            rows = cursor.fetchall()
+            for row in rows:
+                self.current_tables.add(row[0])
+            cursor.close()
+
+    def open_table_loader(self, table_name: str, chunk_size: int = 1000000, mode: str = 'replace',
+                          primary_keys: list[str] = None) -> 'SnowflakeTableLoader':
+        """Start a load into table_name that accepts Arrow table chunks as they are generated.
+
+        Every appended chunk is written in the same transaction and the load is made visible
+        on commit(). In 'replace' mode the table is truncated once when the loader is opened,
+        in 'append' mode the rows are added to the table, and in 'merge' mode they are staged
+        in a temporary table and merged on primary_keys, updating existing rows.
+        """
+        return SnowflakeTableLoader(self, table_name, chunk_size, mode, primary_keys)
+
+    def copy_files_into_table(self, table_name: str, file_paths: list[str], file_format: str,
+                              mode: str = 'replace', primary_keys: list[str] = None, columns: list[str] = None,
+                              upload_parallel: int = 4, max_concurrent_puts: int = 4) -> int:
+        """Bulk load already-written files: PUT them to the table stage, then COPY INTO the table.
+
+        Files are uploaded as they are (no re-compression) over pooled sessions, several at a
+        time, and loaded by column name with a single COPY that purges the staged files. The
+        modes are those of open_table_loader(): 'replace' truncates the table first, 'append'
+        adds the rows, and 'merge' copies them into a temporary table merged on primary_keys.
 
-    def write_df_to_table(self, df: pd.DataFrame, table_name: str, chunk_size: int = 1000000):
-        """Store a pandas DataFrame in Snowflake.
-        
         Args:
-            df: DataFrame to write
             table_name: Target table name
-            chunk_size: Number of rows to process in each chunk (default: 100,000)
+            file_paths: Local files holding the table's rows
+            file_format: Snowflake file format options, e.g. "TYPE = PARQUET"
+            mode: 'replace', 'append' or 'merge'
+            primary_keys: Columns rows are matched on in merge mode
+            columns: Columns present in the files, required in merge mode
+            upload_parallel: PARALLEL option of each PUT (threads uploading one file)
+            max_concurrent_puts: Number of files uploaded at the same time
+
+        Returns:
+            int: Number of rows loaded
         """
-        # Reset index to ensure it's in the standard format
-        df = df.reset_index(drop=True)
-        
-        conn = self.get_connection()
-        try:
-            table_exists = table_name in self.current_tables
-            
-            if table_exists:
+        check_load_mode(mode, primary_keys)
+        if mode == 'merge' and not columns:
+            raise ValueError('Merge loads need the columns of the files')
+        stage = f"@{self.database}.{self.schema}.%{table_name}"
+
+        def put(file_path):
+            with self.session_pool.session() as conn:
                 cursor = conn.cursor()
-                cursor.execute(f"TRUNCATE TABLE {self.database}.{self.schema}.{table_name}")
+                cursor.execute(
+                    f"PUT 'file://{os.path.abspath(file_path)}' {stage} "
+                    f"AUTO_COMPRESS = FALSE PARALLEL = {upload_parallel} OVERWRITE = TRUE"
+                )
                 cursor.close()
 
-            total_rows = len(df)
-            chunks = range(0, total_rows, chunk_size)
-            
-            for i, chunk_start in enumerate(chunks):
-                chunk_end = min(chunk_start + chunk_size, total_rows)
-                df_chunk = df.iloc[chunk_start:chunk_end]
-                
-                write_pandas(
-                    conn,
-                    df_chunk,
-                    table_name,
-                    database=self.database,
-                    schema=self.schema,
-                    quote_identifiers=False,
-                    auto_create_table=False
-                )
-                
-                print(f"Chunk {i+1}/{len(chunks)}: Successfully stored rows {chunk_start+1}-{chunk_end} in {self.schema}.{table_name}")
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrent_puts, len(file_paths)))) as executor:
+            list(executor.map(put, file_paths))
 
+        file_names = ', '.join(f"'{os.path.basename(file_path)}'" for file_path in file_paths)
+        with self.session_pool.session() as conn:
+            cursor = conn.cursor()
+            target_table = self._prepare_load(cursor, table_name, mode)
+            cursor.execute(f"""
+                COPY INTO {self.database}.{self.schema}.{target_table}
+                FROM {stage}
+                FILES = ({file_names})
+                FILE_FORMAT = ({file_format})
+                MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE
+                PURGE = TRUE
+            """)
+            # One result row per file: (file, status, rows_parsed, rows_loaded, ...)
+            rows_loaded = sum(row[3] for row in cursor.fetchall())
+            if mode == 'merge':
+                self._merge_staged_rows(cursor, table_name, target_table, columns, primary_keys)
+            cursor.close()
             conn.commit()
-            print(f"Completed: Successfully stored {total_rows} total rows in {self.schema}.{table_name}")
-        finally:
-            conn.close()
 
-    def _load_private_key(self):
-        """Load the private key from file and return the key object."""
-        try:
-            with open(self.private_key_path, 'rb') as key_file:
-                p_key = serialization.load_pem_private_key(
-                    key_file.read(),
-                    password=self.private_key_passphrase.encode() if self.private_key_passphrase else None,
-                    backend=default_backend()
-                )
-                return p_key
-        except Exception as e:
-            raise Exception(f"Failed to load private key: {str(e)}")
-
-    def _get_private_key_pkcs8(self):
-        """Convert the private key to PKCS8 format as required by Snowflake."""
-        if not self.private_key:
-            raise Exception("Private key not loaded")
-        
+        print(f"Completed: Successfully copied {rows_loaded} total rows into {self.schema}.{table_name}")
+        return rows_loaded
+
+    def summary(self) -> str:
+        return self.session_pool.summary()
+
+    def close(self):
+        """Close the idle sessions of the pool once the run's loads are done."""
+        self.session_pool.close()
+
+    def _prepare_load(self, cursor, table_name: str, mode: str) -> str:
+        """Prepare the session for a load and return the table the rows are written to."""
+        if mode == 'replace' and table_name in self.current_tables:
+            cursor.execute(f"TRUNCATE TABLE {self.database}.{self.schema}.{table_name}")
+        if mode != 'merge':
+            return table_name
+
+        # Temporary tables are private to the session and dropped with it
+        staging_table = f"{table_name}_MERGE"
+        cursor.execute(f"CREATE OR REPLACE TEMPORARY TABLE {self.database}.{self.schema}.{staging_table} "
+                       f"LIKE {self.database}.{self.schema}.{table_name}")
+        return staging_table
+
+    def _merge_staged_rows(self, cursor, table_name: str, staging_table: str, columns: list[str],
+                           primary_keys: list[str]):
+        """MERGE the staged rows into table_name: update rows whose key exists, insert the others.
+
+        Only the given columns are written, so a merge of partial rows (e.g. CRM updates)
+        leaves the other columns of existing rows as they are.
+        """
+        columns = [column.upper() for column in columns]
+        primary_keys = [key.upper() for key in primary_keys]
+        condition = ' AND '.join(f"t.{key} = s.{key}" for key in primary_keys)
+        updates = ', '.join(f"t.{column} = s.{column}" for column in columns if column not in primary_keys)
+        matched = f"WHEN MATCHED THEN UPDATE SET {updates}" if updates else ''
+        cursor.execute(f"""
+            MERGE INTO {self.database}.{self.schema}.{table_name} t
+            USING {self.database}.{self.schema}.{staging_table} s
+            ON {condition}
+            {matched}
+            WHEN NOT MATCHED THEN INSERT ({', '.join(columns)})
+            VALUES ({', '.join(f's.{column}' for column in columns)})
+        """)
+        cursor.execute(f"DROP TABLE IF EXISTS {self.database}.{self.schema}.{staging_table}")
+
+
+class SnowflakeTableLoader(TableLoader):
+    """Appends Arrow table chunks to one Snowflake table over a single pooled session.
+
+    Each chunk is written as Parquet files of at most chunk_size rows, PUT to the table
+    stage and copied in by column name, so the rows never pass through pandas.
+    """
+
+    def __init__(self, manager: SnowflakeConnectionManager, table_name: str, chunk_size: int = 1000000,
+                 mode: str = 'replace', primary_keys: list[str] = None):
+        check_load_mode(mode, primary_keys)
+        self.manager = manager
+        self.table_name = table_name
+        self.chunk_size = chunk_size
+        self.mode = mode
+        self.primary_keys = primary_keys
+        self.columns = None
+        self.total_rows = 0
+        self.conn = manager.get_connection()
+
+        cursor = self.conn.cursor()
+        self.target_table = manager._prepare_load(cursor, table_name, mode)
+        cursor.close()
+
+    def append(self, table: pa.Table):
+        """Write a chunk of rows to the table, splitting it into chunk_size pieces."""
+        if self.columns is None:
+            self.columns = list(table.column_names)
+        total_rows = len(table)
+        chunks = range(0, total_rows, self.chunk_size)
+        stage = f"@{self.manager.database}.{self.manager.schema}.%{self.table_name}"
+
+        cursor = self.conn.cursor()
         try:
-            private_key_bytes = self.private_key.private_bytes(
-                encoding=serialization.Encoding.DER,
-                format=serialization.PrivateFormat.PKCS8,
-                encryption_algorithm=serialization.NoEncryption()
-            )
-            return private_key_bytes
-        except Exception as e:
-            raise Exception(f"Failed to convert private key to PKCS8: {str(e)}")
+            with tempfile.TemporaryDirectory() as directory:
+                for i, chunk_start in enumerate(chunks):
+                    chunk_end = min(chunk_start + self.chunk_size, total_rows)
+                    # Unique names, so loads into the same table stage do not overwrite each other's files
+                    file_path = os.path.join(directory, f"{self.table_name}_{uuid.uuid4().hex}.parquet")
+                    pq.write_table(table.slice(chunk_start, chunk_end - chunk_start), file_path)
+
+                    cursor.execute(f"PUT 'file://{file_path}' {stage} AUTO_COMPRESS = FALSE OVERWRITE = TRUE")
+                    cursor.execute(f"""
+                        COPY INTO {self.manager.database}.{self.manager.schema}.{self.target_table}
+                        FROM {stage}
+                        FILES = ('{os.path.basename(file_path)}')
+                        FILE_FORMAT = (TYPE = PARQUET USE_LOGICAL_TYPE = TRUE)
+                        MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE
+                        PURGE = TRUE
+                    """)
+                    os.remove(file_path)
+
+                    print(f"Chunk {i+1}/{len(chunks)}: Successfully stored rows {self.total_rows + chunk_start + 1}-"
+                          f"{self.total_rows + chunk_end} in {self.manager.schema}.{self.table_name}")
+        finally:
+            cursor.close()
+
+        self.total_rows += total_rows
+
+    def commit(self):
+        if self.mode == 'merge' and self.columns is not None:
+            cursor = self.conn.cursor()
+            self.manager._merge_staged_rows(cursor, self.table_name, self.target_table,
+                                            self.columns, self.primary_keys)
+            cursor.close()
+        self.conn.commit()
+        print(f"Completed: Successfully stored {self.total_rows} total rows in {self.manager.schema}.{self.table_name}")
 
+    def close(self):
+        # An uncommitted load is rolled back before the session goes back to the pool
+        self.manager.release_connection(self.conn)
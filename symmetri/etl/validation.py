@@ -0,0 +1,337 @@
+"""Array-based statistics and integrity checks of generated data.
+
+Everything works on NumPy arrays: overlaps of user pools are counted with boolean
+membership masks over the user indices (or sorted arrays when values are not small
+indices), and foreign keys are matched against bitmaps of the parent IDs or with a binary
+search in the sorted, distinct parent keys. Both scale to many millions of rows without
+building Python sets.
+"""
+import threading
+from dataclasses import dataclass, field
+
+import numpy as np
+
+DEFAULT_OVERLAP_TOLERANCE = 0.01
+
+
+class ValidationError(ValueError):
+    """Raised when generated data fails one or more checks."""
+
+
+@dataclass
+class OverlapCheck:
+    """How many users of a pool are also in another, against the configured ratio."""
+    name: str
+    overlap: int
+    pool_size: int  # Size of the pool the ratio is relative to
+    expected_ratio: float
+    tolerance: float
+
+    @property
+    def ratio(self) -> float:
+        return self.overlap / self.pool_size if self.pool_size else 0.0
+
+    @property
+    def passed(self) -> bool:
+        if not self.pool_size:
+            return self.overlap == 0
+        # Pool sizes are truncated to whole users, which can shift a ratio by up to one user
+        return abs(self.ratio - self.expected_ratio) <= self.tolerance + 1 / self.pool_size
+
+    def describe(self) -> str:
+        return (f"{self.overlap:,} of {self.pool_size:,} = {self.ratio:.2%} "
+                f"(configured {self.expected_ratio:.2%} +/- {self.tolerance:.2%})")
+
+
+@dataclass
+class ForeignKeyCheck:
+    """Rows of a child table whose key is missing from the parent table."""
+    name: str
+    rows: int
+    missing: int
+    missing_examples: list = field(default_factory=list)
+
+    @property
+    def passed(self) -> bool:
+        return self.missing == 0
+
+    def describe(self) -> str:
+        if self.passed:
+            return f"{self.rows:,} rows, all keys found"
+        return f"{self.missing:,} of {self.rows:,} rows without a parent, e.g. {self.missing_examples}"
+
+
+def overlap_count(pool_a: np.ndarray, pool_b: np.ndarray, universe_size: int = None) -> int:
+    """Count the distinct values present in both pools.
+
+    Args:
+        pool_a: Values of the first pool
+        pool_b: Values of the second pool
+        universe_size: When the values are indices below this size, they are counted with a
+            boolean membership mask instead of sorting both pools
+    """
+    if universe_size is not None:
+        membership = np.zeros(universe_size, dtype=bool)
+        membership[pool_a] = True
+        return int(np.count_nonzero(membership[np.unique(pool_b)]))
+    return len(np.intersect1d(pool_a, pool_b))
+
+
+def _row_keys(columns) -> np.ndarray:
+    """One comparable key per row: the column itself, or the packed bytes of several integer columns."""
+    if isinstance(columns, np.ndarray):
+        return columns
+    if len(columns) == 1:
+        return np.asarray(columns[0])
+    packed = np.ascontiguousarray(np.column_stack([np.asarray(column, dtype=np.int64) for column in columns]))
+    return packed.view(np.dtype((np.void, packed.dtype.itemsize * packed.shape[1]))).ravel()
+
+
+def missing_keys(child_keys, parent_keys) -> np.ndarray:
+    """Mask of the child rows whose key is not among the parent keys.
+
+    Args:
+        child_keys: Key array of the child rows, or a sequence of integer key columns
+        parent_keys: Key array (or integer key columns) of the parent rows
+    """
+    child = _row_keys(child_keys)
+    parent = np.unique(_row_keys(parent_keys))
+    if len(parent) == 0:
+        return np.ones(len(child), dtype=bool)
+    positions = np.minimum(np.searchsorted(parent, child), len(parent) - 1)
+    return parent[positions] != child
+
+
+def check_foreign_key(name: str, child_keys, parent_keys, examples: int = 5) -> ForeignKeyCheck:
+    """Check that every child key is present among the parent keys (see missing_keys)."""
+    missing = missing_keys(child_keys, parent_keys)
+    missing_rows = np.flatnonzero(missing)
+    if isinstance(child_keys, np.ndarray) or len(child_keys) == 1:
+        key_columns = [np.asarray(child_keys if isinstance(child_keys, np.ndarray) else child_keys[0])]
+    else:
+        key_columns = [np.asarray(column) for column in child_keys]
+    missing_examples = [
+        tuple(column[row].item() for column in key_columns) if len(key_columns) > 1 else key_columns[0][row].item()
+        for row in missing_rows[:examples]
+    ]
+    return ForeignKeyCheck(name, rows=len(missing), missing=len(missing_rows), missing_examples=missing_examples)
+
+
+def pool_overlap_checks(user_manager, constants, tolerance: float = DEFAULT_OVERLAP_TOLERANCE) -> list[OverlapCheck]:
+    """Compare the overlaps of the generated user pools with the configured percentages."""
+    total_users = user_manager.total_users
+    crm_users = user_manager.crm_users
+    website_users = user_manager.website_users
+    data_provider_users = user_manager.data_provider_users
+
+    # Data provider users are drawn from CRM and from the website users outside CRM
+    in_crm = np.zeros(total_users, dtype=bool)
+    in_crm[crm_users] = True
+    website_only_users = website_users[~in_crm[website_users]]
+
+    return [
+        OverlapCheck('Website users in CRM', overlap_count(crm_users, website_users, total_users),
+                     len(website_users), constants.WEBSITE_USERS_IN_CRM_PERCENTAGE, tolerance),
+        OverlapCheck('CRM users with transactions',
+                     overlap_count(crm_users, user_manager.crm_users_with_transactions, total_users),
+                     len(crm_users), constants.CRM_USERS_WITH_TRANSACTIONS_PERCENTAGE, tolerance),
+        OverlapCheck('Website users with transactions',
+                     overlap_count(website_users, user_manager.website_users_with_transactions, total_users),
+                     len(website_users), constants.WEBSITE_USERS_WITH_TRANSACTIONS_PERCENTAGE, tolerance),
+        OverlapCheck('Data provider users in CRM', overlap_count(crm_users, data_provider_users, total_users),
+                     len(data_provider_users), constants.DATA_PROVIDER_USERS_IN_CRM_PERCENTAGE, tolerance),
+        OverlapCheck('Data provider users in website (not CRM)',
+                     overlap_count(website_only_users, data_provider_users, total_users),
+                     len(data_provider_users), constants.DATA_PROVIDER_USERS_IN_WEBSITE_PERCENTAGE, tolerance),
+    ]
+
+
+def format_checks(checks) -> str:
+    """One line per check: status, name and details."""
+    width = max((len(check.name) for check in checks), default=0)
+    return '\n'.join(f"{'ok  ' if check.passed else 'FAIL'} {check.name:<{width}}  {check.describe()}"
+                     for check in checks)
+
+
+def require_passed(checks, what: str):
+    """Raise a ValidationError listing the failed checks, if any."""
+    failed = [check for check in checks if not check.passed]
+    if failed:
+        raise ValidationError(f"{len(failed)} {what} check(s) failed:\n{format_checks(failed)}")
+
+
+def _comparable(keys: np.ndarray) -> np.ndarray:
+    """Integer keys as int64, so keys of different integer widths compare equal."""
+    return keys.astype(np.int64, copy=False) if keys.dtype.kind in 'iu' else keys
+
+
+class KeySet:
+    """Distinct keys of a parent table, added chunk by chunk.
+
+    Integer IDs are kept as a membership bitmap over the range of IDs seen, one byte per ID;
+    other keys (and IDs too sparse for a bitmap) as a sorted array of distinct row keys.
+    """
+
+    # A bitmap may span at most this many bytes per key added (plus BITMAP_SLACK) before the
+    # keys move to a sorted array
+    BITMAP_BYTES_PER_KEY = 64
+    BITMAP_SLACK = 1 << 20
+
+    def __init__(self):
+        self.size = 0  # Keys added, duplicates included
+        self._offset = 0
+        self._bitmap = None
+        self._sorted = None
+
+    def add(self, keys: np.ndarray):
+        if len(keys) == 0:
+            return
+        keys = _comparable(keys)
+        self.size += len(keys)
+        if self._sorted is None and keys.dtype.kind in 'iu':
+            low, high = int(keys.min()), int(keys.max())
+            if self._bitmap is not None:
+                low, high = min(low, self._offset), max(high, self._offset + len(self._bitmap) - 1)
+            if high - low + 1 <= self.BITMAP_BYTES_PER_KEY * self.size + self.BITMAP_SLACK:
+                self._grow_bitmap(low, high)
+                self._bitmap[keys - self._offset] = True
+                return
+            self._sorted = self._bitmap_keys()
+            self._bitmap = None
+        self._sorted = np.union1d(self._sorted, keys) if self._sorted is not None else np.unique(keys)
+
+    def _grow_bitmap(self, low: int, high: int):
+        if self._bitmap is None:
+            self._offset, self._bitmap = low, np.zeros(high - low + 1, dtype=bool)
+            return
+        if low >= self._offset and high < self._offset + len(self._bitmap):
+            return
+        # Grow upwards geometrically, as IDs of later chunks are usually higher
+        size = max(high - low + 1, self._offset + 2 * len(self._bitmap) - low)
+        bitmap = np.zeros(size, dtype=bool)
+        bitmap[self._offset - low:self._offset - low + len(self._bitmap)] = self._bitmap
+        self._offset, self._bitmap = low, bitmap
+
+    def _bitmap_keys(self) -> np.ndarray:
+        if self._bitmap is None:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(self._bitmap).astype(np.int64) + self._offset
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        """Mask of the keys present in the set."""
+        keys = _comparable(keys)
+        if self._bitmap is not None and keys.dtype.kind in 'iu':
+            positions = keys - self._offset
+            inside = (positions >= 0) & (positions < len(self._bitmap))
+            found = np.zeros(len(keys), dtype=bool)
+            found[inside] = self._bitmap[positions[inside]]
+            return found
+        known = self._sorted if self._sorted is not None else self._bitmap_keys()
+        if len(known) == 0 or known.dtype != keys.dtype:
+            return np.zeros(len(keys), dtype=bool)
+        positions = np.minimum(np.searchsorted(known, keys), len(known) - 1)
+        return known[positions] == keys
+
+
+class _ForeignKeyState:
+    """Running totals of one foreign key: rows checked and the distinct keys not found (yet)."""
+
+    def __init__(self, name: str, width: int):
+        self.name = name
+        self.width = width  # Number of key columns
+        self.rows = 0
+        self.unresolved = []  # (distinct keys, rows per key) of child chunks
+        self.unresolved_keys = 0
+        self.compacted_keys = 0
+
+    def add_unresolved(self, keys: np.ndarray):
+        distinct, counts = np.unique(keys, return_counts=True)
+        self.unresolved.append((distinct, counts))
+        self.unresolved_keys += len(distinct)
+
+    def resolve(self, parent_keys: KeySet):
+        """Merge the unresolved keys into one set and drop the keys the parent has by now."""
+        if not self.unresolved:
+            return
+        keys = np.concatenate([keys for keys, _ in self.unresolved])
+        counts = np.concatenate([counts for _, counts in self.unresolved])
+        distinct, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=counts, minlength=len(distinct)).astype(np.int64)
+        missing = ~parent_keys.contains(distinct)
+        self.unresolved = [(distinct[missing], counts[missing])] if missing.any() else []
+        self.unresolved_keys = self.compacted_keys = int(np.count_nonzero(missing))
+
+    def examples(self, count: int) -> list:
+        keys = self.unresolved[0][0][:count] if self.unresolved else np.empty(0, dtype=np.int64)
+        if self.width > 1:
+            return [tuple(row) for row in np.ascontiguousarray(keys).view(np.int64).reshape(-1, self.width).tolist()]
+        return keys.tolist()
+
+
+class ForeignKeyCollector:
+    """Checks foreign keys on streamed chunks, as the tables of a run are written.
+
+    Only the distinct keys of the parent tables are kept. Each child chunk is checked when it
+    arrives; its keys the parent does not have yet (a parent table may still be streaming)
+    are kept as distinct keys with their row counts and resolved against the final parent
+    keys by checks(). Memory is bounded by the distinct keys, not by the rows of the children.
+
+    Thread-safe, so the concurrent tables of a pipeline can add their chunks.
+    """
+
+    def __init__(self, foreign_keys, examples: int = 5):
+        """
+        Args:
+            foreign_keys: (child table, child columns, parent table, parent columns) tuples
+            examples: Missing keys listed per failed check
+        """
+        self.foreign_keys = foreign_keys
+        self.examples = examples
+        self._parent_keys = {(parent_table, parent_columns): KeySet()
+                             for _, _, parent_table, parent_columns in foreign_keys}
+        self._states = [
+            _ForeignKeyState(f"{child_table}({', '.join(child_columns)}) -> "
+                             f"{parent_table}({', '.join(parent_columns)})", len(child_columns))
+            for child_table, child_columns, parent_table, parent_columns in foreign_keys
+        ]
+        self._tables = set()
+        self._lock = threading.Lock()
+
+    def add(self, table: str, dataset):
+        """Check a chunk (a DataFrame or an Arrow table) of a table and record its parent keys."""
+        parent_keys = {
+            columns: _row_keys([np.asarray(dataset[column]) for column in columns])
+            for parent_table, columns in self._parent_keys if parent_table == table
+        }
+        child_keys = {
+            i: _row_keys([np.asarray(dataset[column]) for column in child_columns])
+            for i, (child_table, child_columns, _, _) in enumerate(self.foreign_keys) if child_table == table
+        }
+        with self._lock:
+            self._tables.add(table)
+            for columns, keys in parent_keys.items():
+                self._parent_keys[(table, columns)].add(keys)
+            for i, keys in child_keys.items():
+                _, _, parent_table, parent_columns = self.foreign_keys[i]
+                state = self._states[i]
+                parent = self._parent_keys[(parent_table, parent_columns)]
+                state.rows += len(keys)
+                missing = ~parent.contains(keys)
+                if missing.any():
+                    state.add_unresolved(keys[missing])
+                    # Merge the unresolved keys whenever they double, so they stay distinct
+                    if state.unresolved_keys > 2 * state.compacted_keys + 100_000:
+                        state.resolve(parent)
+
+    def checks(self) -> list[ForeignKeyCheck]:
+        """Check every foreign key whose child and parent tables were both added."""
+        checks = []
+        with self._lock:
+            for (child_table, _, parent_table, parent_columns), state in zip(self.foreign_keys, self._states):
+                if child_table not in self._tables or parent_table not in self._tables:
+                    continue
+                state.resolve(self._parent_keys[(parent_table, parent_columns)])
+                missing = int(sum(counts.sum() for _, counts in state.unresolved))
+                checks.append(ForeignKeyCheck(state.name, rows=state.rows, missing=missing,
+                                              missing_examples=state.examples(self.examples)))
+        return checks
@@ -0,0 +1,353 @@
+import gzip
+import os
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from symmetri.db.base import Table
+from symmetri.etl.schema import parse_data_type
+
+# Low-cardinality columns that are dictionary-encoded in Parquet output
+DICTIONARY_COLUMNS = {
+    'gender', 'country', 'loyalty_tier',
+    'currency', 'payment_method', 'store_id', 'channel',
+    'product_category', 'product_sub_category', 'product_type', 'product_brand', 'product_name',
+    'website_name', 'page_url', 'page_category', 'event_type', 'referrer_url', 'device_type', 'browser',
+    'segment_category', 'segment_type', 'segment_name',
+}
+
+PARQUET_COMPRESSIONS = ('snappy', 'zstd')
+DEFAULT_ROW_GROUP_SIZE = 1_000_000
+
+# CSV compression codec -> file extension
+CSV_COMPRESSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+DEFAULT_CSV_BLOCK_ROWS = 50_000
+
+# How Snowflake reads the CSV files back: an unquoted empty field is NULL and "" an empty string
+SNOWFLAKE_CSV_FORMAT = ("TYPE = CSV PARSE_HEADER = TRUE FIELD_OPTIONALLY_ENCLOSED_BY = '\"' "
+                        "EMPTY_FIELD_AS_NULL = TRUE NULL_IF = ()")
+
+# TIMESTAMP_NTZ precision -> Arrow timestamp unit
+_TIMESTAMP_UNITS = {0: 's', 3: 'ms', 6: 'us', 9: 'ns'}
+
+
+def arrow_type(data_type: str, dictionary: bool = False) -> pa.DataType:
+    """Arrow type for a data model column type such as 'DECIMAL(18,2)' or 'TIMESTAMP_NTZ(9)'."""
+    base_type, precision, scale = parse_data_type(data_type)
+    if base_type in ('STRING', 'VARCHAR', 'TEXT'):
+        return pa.dictionary(pa.int32(), pa.string()) if dictionary else pa.string()
+    if base_type in ('INT', 'INTEGER', 'BIGINT', 'NUMBER') and not scale:
+        return pa.int64()
+    if base_type in ('DECIMAL', 'NUMERIC', 'NUMBER'):
+        return pa.decimal128(precision or 38, scale or 0)
+    if base_type == 'BOOLEAN':
+        return pa.bool_()
+    if base_type == 'DATE':
+        return pa.date32()
+    if base_type.startswith('TIMESTAMP'):
+        return pa.timestamp(_TIMESTAMP_UNITS.get(9 if precision is None else precision, 'ns'))
+    if base_type in ('FLOAT', 'DOUBLE', 'REAL'):
+        return pa.float64()
+    raise ValueError(f'Unsupported column type: {data_type}')
+
+
+def arrow_schema(table: Table, dictionary_columns: set[str] = DICTIONARY_COLUMNS) -> pa.Schema:
+    """Arrow schema of a data model table, with its low-cardinality string columns dictionary-encoded."""
+    return pa.schema([
+        pa.field(column.name, arrow_type(column.data_type, column.name in dictionary_columns), column.nullable)
+        for column in table.columns
+    ])
+
+
+def csv_schema(table: Table) -> pa.Schema:
+    """Arrow schema of a table's CSV output; generated timestamps are whole seconds, written without a fraction."""
+    return pa.schema([
+        field.with_type(pa.timestamp('s')) if pa.types.is_timestamp(field.type) else field
+        for field in arrow_schema(table)
+    ])
+
+
+def to_arrow_table(dataset: pa.Table | pd.DataFrame, schema: pa.Schema = None) -> pa.Table:
+    """Convert a generated chunk to an Arrow table, typed and ordered by schema when one is given.
+
+    DataFrame chunks are converted column by column, their categoricals to dictionary arrays.
+    A chunk that already has the schema is returned as it is.
+    """
+    if isinstance(dataset, pd.DataFrame):
+        dataset = pa.Table.from_pandas(dataset, preserve_index=False)
+    if schema is None or dataset.schema.equals(schema):
+        return dataset
+    if dataset.num_columns == 0:
+        return schema.empty_table()
+    columns = []
+    for field in schema:
+        column = dataset[field.name]
+        if pa.types.is_dictionary(field.type) and not pa.types.is_dictionary(column.type):
+            column = pc.dictionary_encode(column)
+        columns.append(column.cast(field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+class DatasetWriter(ABC):
+    """Writes the chunks of one generated table to a file."""
+
+    extension = ''
+
+    def __init__(self, path: str, table: Table):
+        self.path = path
+        self.table = table
+        self.rows_written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @classmethod
+    def file_extension(cls, **options) -> str:
+        """Extension of the output file for the given writer options."""
+        return cls.extension
+
+    @property
+    @abstractmethod
+    def snowflake_file_format(self) -> str:
+        """Snowflake FILE_FORMAT options that read the written file back by column name."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def write(self, table: pa.Table):
+        """Write a chunk, an Arrow table with the columns of the data model table."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def close(self):
+        raise NotImplementedError()
+
+
+def _csv_field(text: pa.Array) -> pa.Array:
+    """Quote the values that contain a delimiter, quote or line break, as the csv module's QUOTE_MINIMAL does.
+
+    Empty strings are quoted as well, so they read back as '' and not as the NULL of an empty field.
+    """
+    quoted = pc.binary_join_element_wise('"', pc.replace_substring(text, '"', '""'), '"', '')
+    return pc.if_else(pc.match_substring_regex(text, r'^$|[,"\r\n]'), quoted, text)
+
+
+def to_csv_text(array: pa.Array) -> pa.Array:
+    """Format a column the way DataFrame.to_csv formats the generated DataFrames.
+
+    Booleans become True/False, decimals and floats are written like Python floats (12.50 as
+    12.5, 3.00 as 3.0), nulls are empty and strings are quoted only when they need it. Unlike
+    to_csv, an empty string is written as "", so it stays distinct from a null.
+    """
+    if pa.types.is_dictionary(array.type):
+        array = array.cast(array.type.value_type)
+    if pa.types.is_boolean(array.type):
+        text = pc.if_else(array, 'True', 'False')
+    else:
+        text = pc.cast(array, pa.string())
+    if pa.types.is_decimal(array.type) or pa.types.is_floating(array.type):
+        text = pc.replace_substring_regex(text, r'(\.\d*?)0+$', r'\1')
+        text = pc.replace_substring_regex(text, r'^(-?\d+)\.?$', r'\1.0')
+    elif pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+        text = _csv_field(text)
+    return pc.fill_null(text, '')
+
+
+def csv_header(schema: pa.Schema) -> bytes:
+    """Header row of a CSV file with the columns of schema."""
+    header = _csv_field(pa.array(schema.names, pa.string()))
+    return (','.join(header.to_pylist()) + '\n').encode('utf-8')
+
+
+def csv_lines(table: pa.Table):
+    """Yield the CSV rows of a table, formatted by to_csv_text(), as one buffer of lines per record batch."""
+    for batch in table.to_batches():
+        if not len(batch):
+            continue
+        # Fields are joined into lines and lines into one string without leaving Arrow
+        rows = pc.binary_join_element_wise(*[to_csv_text(column) for column in batch.columns], ',')
+        lines = pc.binary_join_element_wise(rows, '\n', '')
+        yield pc.binary_join(pa.ListArray.from_arrays([0, len(lines)], lines), '')[0].as_buffer()
+
+
+class CsvGzipWriter(DatasetWriter):
+    """Writes a table as one gzip-compressed CSV file with a single header row.
+
+    Values are formatted as DataFrame.to_csv formats them, see to_csv_text(), so the files
+    read the same as the ones written before the chunks became Arrow tables.
+    """
+
+    extension = '.gz'
+
+    def __init__(self, path: str, table: Table):
+        super().__init__(path, table)
+        self.schema = csv_schema(table)
+        # mtime=0 keeps the gzip header, and so the file, identical across runs
+        self._file = gzip.GzipFile(path, 'wb', mtime=0)
+
+    @property
+    def snowflake_file_format(self) -> str:
+        return f"{SNOWFLAKE_CSV_FORMAT} COMPRESSION = GZIP"
+
+    def write(self, table: pa.Table):
+        if not len(table):
+            return
+        if self.rows_written == 0:
+            self._file.write(csv_header(self.schema))
+        for lines in csv_lines(to_arrow_table(table, self.schema)):
+            self._file.write(lines)
+        self.rows_written += len(table)
+
+    def close(self):
+        try:
+            if self.rows_written == 0:
+                self._file.write(csv_header(self.schema))
+        finally:
+            self._file.close()
+
+
+class ParallelCsvWriter(DatasetWriter):
+    """Writes a table as compressed CSV, formatting and compressing blocks of rows on a thread pool.
+
+    Every block becomes an independent gzip member or zstd frame; written back to back in
+    block order they form one valid compressed file. Arrow compute, zlib and zstd all release
+    the GIL, so the blocks of a chunk are encoded in parallel. Values are formatted as in
+    CsvGzipWriter, see to_csv_text(), so both writers produce the same CSV text.
+    """
+
+    def __init__(self, path: str, table: Table, compression: str = 'gzip', threads: int = None,
+                 block_rows: int = DEFAULT_CSV_BLOCK_ROWS, compresslevel: int = 6):
+        super().__init__(path, table)
+        if compression not in CSV_COMPRESSIONS:
+            raise ValueError(f'Unknown CSV compression: {compression}')
+        self.compression = compression
+        self.compresslevel = compresslevel
+        self.block_rows = block_rows
+        self.threads = threads or os.cpu_count() or 1
+        self.schema = csv_schema(table)
+        self._executor = ThreadPoolExecutor(max_workers=self.threads)
+        self._pending = deque()
+        self._file = open(path, 'wb')
+
+    @classmethod
+    def file_extension(cls, compression: str = 'gzip', **options) -> str:
+        return CSV_COMPRESSIONS[compression]
+
+    @property
+    def snowflake_file_format(self) -> str:
+        return f"{SNOWFLAKE_CSV_FORMAT} COMPRESSION = {self.compression.upper()}"
+
+    def _encode_block(self, block: pa.Table, include_header: bool) -> bytes:
+        data = b''.join(([csv_header(self.schema)] if include_header else []) + list(csv_lines(block)))
+        if self.compression == 'zstd':
+            return pa.compress(data, codec='zstd', asbytes=True)
+        return gzip.compress(data, compresslevel=self.compresslevel, mtime=0)
+
+    def _submit(self, block: pa.Table):
+        # Keep a bounded number of blocks in flight, writing finished ones in order
+        while len(self._pending) >= 2 * self.threads:
+            self._file.write(self._pending.popleft().result())
+        include_header = self.rows_written == 0
+        self._pending.append(self._executor.submit(self._encode_block, block, include_header))
+        self.rows_written += len(block)
+
+    def write(self, table: pa.Table):
+        arrow_table = to_arrow_table(table, self.schema)
+        for start in range(0, len(arrow_table), self.block_rows):
+            self._submit(arrow_table.slice(start, self.block_rows))
+
+    def close(self):
+        try:
+            if self.rows_written == 0:
+                # Header only
+                self._submit(self.schema.empty_table())
+            while self._pending:
+                self._file.write(self._pending.popleft().result())
+        finally:
+            self._executor.shutdown(cancel_futures=True)
+            self._file.close()
+
+
+class ParquetDatasetWriter(DatasetWriter):
+    """Writes a table as a Parquet file typed after the data model.
+
+    Chunks are buffered so every row group but the last holds exactly row_group_size rows,
+    whatever the chunk size of the generator.
+    """
+
+    extension = '.parquet'
+
+    def __init__(self, path: str, table: Table, compression: str = 'snappy',
+                 row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        super().__init__(path, table)
+        if compression not in PARQUET_COMPRESSIONS:
+            raise ValueError(f'Unknown Parquet compression: {compression}')
+        self.schema = arrow_schema(table)
+        self.row_group_size = row_group_size
+        self._buffer = []
+        self._buffered_rows = 0
+        self._writer = pq.ParquetWriter(
+            path, self.schema, compression=compression,
+            use_dictionary=[field.name for field in self.schema if pa.types.is_dictionary(field.type)]
+        )
+
+    @property
+    def snowflake_file_format(self) -> str:
+        return "TYPE = PARQUET USE_LOGICAL_TYPE = TRUE"
+
+    def write(self, table: pa.Table):
+        self._buffer.append(to_arrow_table(table, self.schema))
+        self._buffered_rows += len(table)
+        self.rows_written += len(table)
+        if self._buffered_rows >= self.row_group_size:
+            self._flush(final=False)
+
+    def _flush(self, final: bool):
+        buffered = pa.concat_tables(self._buffer)
+        full_groups = len(buffered) if final else len(buffered) - len(buffered) % self.row_group_size
+        for start in range(0, full_groups, self.row_group_size):
+            self._writer.write_table(buffered.slice(start, self.row_group_size), row_group_size=self.row_group_size)
+        remainder = buffered.slice(full_groups)
+        self._buffer = [remainder] if len(remainder) else []
+        self._buffered_rows = len(remainder)
+
+    def close(self):
+        if self._buffer:
+            self._flush(final=True)
+        self._writer.close()
+
+
+OUTPUT_FORMATS = {
+    'csv': CsvGzipWriter,
+    'parallel_csv': ParallelCsvWriter,
+    'parquet': ParquetDatasetWriter,
+}
+
+
+def open_dataset_writer(output_format: str, output_dir: str, file_name: str, table: Table,
+                        **options) -> DatasetWriter:
+    """Open a writer for one table.
+
+    Args:
+        output_format: One of OUTPUT_FORMATS
+        output_dir: Directory of the output file
+        file_name: File name without the format's extension
+        table: Data model table the chunks are written as
+        **options: Format-specific options, e.g. compression and threads for parallel CSV or
+            compression and row_group_size for Parquet
+
+    Returns:
+        DatasetWriter: The opened writer
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f'Unknown output format: {output_format}')
+    writer_class = OUTPUT_FORMATS[output_format]
+    path = os.path.join(output_dir, file_name + writer_class.file_extension(**options))
+    return writer_class(path, table, **options)
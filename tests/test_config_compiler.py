@@ -0,0 +1,42 @@
+import os
+import shutil
+import stat
+
+import pytest
+
+from symmetri.etl import config_compiler
+from symmetri.etl.config_compiler import compile_config
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'loreal.yaml')
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / 'loreal.yaml'
+    shutil.copy(CONFIG, path)
+    # Every test compiles from disk, not from an earlier test's in-process entry
+    config_compiler._compiled_configs.clear()
+    return str(path)
+
+
+def test_failed_cache_write_keeps_the_config(config_path, tmp_path):
+    not_a_directory = tmp_path / 'cache'
+    not_a_directory.write_text('')
+    compiled = compile_config(config_path, cache_dir=str(not_a_directory / 'config'))
+    assert compiled.path == config_path
+    assert os.path.exists(config_path)
+
+
+def test_cache_directory_is_private(config_path, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    compile_config(config_path, cache_dir=str(cache_dir))
+    assert stat.S_IMODE(os.stat(cache_dir).st_mode) == 0o700
+    assert len(list(cache_dir.glob('*.pickle'))) == 1
+
+
+def test_shared_cache_directory_is_not_used(config_path, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    cache_dir.mkdir()
+    os.chmod(cache_dir, 0o777)
+    compile_config(config_path, cache_dir=str(cache_dir))
+    assert not list(cache_dir.iterdir())
@@ -0,0 +1,80 @@
+import os
+from datetime import datetime
+
+import pytest
+from click.testing import CliRunner
+
+from main import commands
+from symmetri.etl.config_compiler import compile_config
+from symmetri.etl.data_generator import DataGenerator
+from symmetri.etl.manifest import RunManifest
+from symmetri.etl.pipeline import Pipeline
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'loreal.yaml')
+
+
+def test_full_run_is_dated_by_reference_time(tmp_path):
+    reference_time = datetime(2025, 6, 1, 12, 0, 0)
+    generator = DataGenerator(CONFIG, str(tmp_path), 'DB', 'SYMMETRI', sink='duckdb',
+                              window_end=datetime(2030, 1, 1), reference_time=reference_time)
+    try:
+        assert generator.utilities.reference_time == reference_time
+        assert generator.utilities.delta_window is None
+    finally:
+        generator.sink.close()
+
+
+def test_window_needs_a_previous_manifest(tmp_path):
+    result = CliRunner().invoke(commands, [
+        'data-generator', '--config_file', CONFIG, '--output_dir', str(tmp_path), '--snowflake_db', 'DB',
+        '--sink', 'duckdb', '--window_end', '2025-06-02T12:00:00',
+    ])
+    assert result.exit_code == 2
+    assert '--window_start and --window_end need --previous_manifest' in result.output
+
+
+def _previous_run(output_dir, config_hash):
+    RunManifest(run_type='full', config_path=CONFIG, seed=42, window_end=datetime(2025, 6, 1, 12, 0, 0),
+                config_hash=config_hash).save(str(output_dir))
+    return str(output_dir)
+
+
+def test_incremental_run_continues_the_same_config(tmp_path):
+    previous = _previous_run(tmp_path, compile_config(CONFIG).content_hash)
+    generator = DataGenerator(CONFIG, str(tmp_path), 'DB', 'SYMMETRI', sink='duckdb', previous_manifest=previous,
+                              window_end=datetime(2025, 6, 2, 12, 0, 0))
+    try:
+        assert generator.incremental
+    finally:
+        generator.sink.close()
+
+
+def test_incremental_run_of_another_config_is_refused(tmp_path):
+    previous = _previous_run(tmp_path, '0' * 64)
+    result = CliRunner().invoke(commands, [
+        'data-generator', '--config_file', CONFIG, '--output_dir', str(tmp_path), '--snowflake_db', 'DB',
+        '--sink', 'duckdb', '--previous_manifest', previous, '--window_end', '2025-06-02T12:00:00',
+    ])
+    assert result.exit_code == 2
+    assert 'is not the config the previous run was generated from' in result.output
+
+
+@pytest.mark.parametrize('limit, message', [
+    ('genrate=2', "unknown stage 'genrate'"),
+    ('load=0', 'expected STAGE=N with N >= 1'),
+])
+def test_stage_limits_are_checked_before_connecting(tmp_path, limit, message):
+    # The default snowflake sink would connect first; a bad limit must stop the command before that
+    result = CliRunner().invoke(commands, [
+        'data-generator', '--config_file', CONFIG, '--output_dir', str(tmp_path), '--snowflake_db', 'DB',
+        '--stage_limit', limit,
+    ])
+    assert result.exit_code == 2
+    assert message in result.output
+
+
+def test_pipeline_rejects_invalid_stage_limits():
+    with pytest.raises(ValueError):
+        Pipeline({'genrate': 2})
+    with pytest.raises(ValueError):
+        Pipeline({'load': 0})
@@ -0,0 +1,99 @@
+import os
+import sqlite3
+from datetime import datetime
+
+import duckdb
+import pyarrow as pa
+import pytest
+import yaml
+
+from symmetri.db.base import Table
+from symmetri.etl.data_generator import DataGenerator
+from symmetri.etl.schema import load_data_model
+from symmetri.etl.sinks.embedded import EmbeddedSink
+from symmetri.etl.writers import CsvGzipWriter
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'loreal.yaml')
+
+
+@pytest.fixture(scope='module')
+def small_config(tmp_path_factory):
+    with open(CONFIG) as config_file:
+        config = yaml.safe_load(config_file)
+    config['user_counts'].update(total_crm_users=500, total_website_events_users=800,
+                                 total_data_provider_users=1000)
+    path = tmp_path_factory.mktemp('config') / 'small.yaml'
+    path.write_text(yaml.safe_dump(config))
+    return str(path)
+
+
+@pytest.fixture(scope='module')
+def stream_loads(small_config, tmp_path_factory):
+    """Rows of a stream load of the small run, per sink, generated once for all tests."""
+    loads = {}
+
+    def load(sink):
+        if sink not in loads:
+            loads[sink] = _load_tables(small_config, tmp_path_factory.mktemp('stream'), sink,
+                                       output_format='parquet')
+        return loads[sink]
+    return load
+
+
+def _load_tables(config_path, output_dir, sink, **options):
+    """Generate the small run into a sink and return the sorted rows of every table."""
+    generator = DataGenerator(config_path, str(output_dir), 'DB', 'SYMMETRI', sink=sink,
+                              reference_time=datetime(2025, 6, 1, 12, 0, 0), **options)
+    generator.generate_all_data()
+    sink_path = os.path.join(str(output_dir), f'db.{sink}')
+    if sink == 'duckdb':
+        connection = duckdb.connect(sink_path, read_only=True)
+        table_name = 'SYMMETRI.{}'.format
+    else:
+        connection = sqlite3.connect(sink_path)
+        table_name = str
+    try:
+        return {
+            name: sorted(connection.execute(f'SELECT * FROM {table_name(name)}').fetchall(), key=repr)
+            for name in load_data_model()
+        }
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize('sink, options', [
+    ('duckdb', {'output_format': 'csv'}),
+    ('duckdb', {'output_format': 'parallel_csv', 'csv_compression': 'zstd'}),
+    ('sqlite', {'output_format': 'csv'}),
+])
+def test_copy_loads_the_rows_of_stream_loads(small_config, stream_loads, tmp_path, sink, options):
+    streamed = stream_loads(sink)
+    copied = _load_tables(small_config, tmp_path, sink, load_mode='copy', **options)
+    assert copied == streamed
+    # Direct visits have an empty referrer, which must not turn into NULL on the way through the files
+    referrers = [row[8] for row in streamed['WEBSITE_EVENTS']]
+    assert '' in referrers and None not in referrers
+
+
+@pytest.mark.parametrize('engine', ['duckdb', 'sqlite'])
+def test_copied_csv_columns_keep_their_data_model_types(tmp_path, engine):
+    columns = [column for column in load_data_model()['CRM_USERS'].columns
+               if column.name in ('user_email_sha256', 'postal_code', 'city')]
+    path = str(tmp_path / 'crm_users.gz')
+    with CsvGzipWriter(path, Table('CRM_USERS', columns)) as writer:
+        # Postal codes that look numeric, one with a leading zero, then an alphanumeric one
+        writer.write(pa.table({'user_email_sha256': ['a', 'b'], 'city': ['Paris', ''],
+                               'postal_code': ['01234', '75001']}))
+        writer.write(pa.table({'user_email_sha256': ['c'], 'city': [None], 'postal_code': ['SW1A 1AA']}))
+
+    sink = EmbeddedSink(str(tmp_path / f'db.{engine}'), engine=engine)
+    try:
+        sink.copy_files_into_table('CRM_USERS', [path], writer.snowflake_file_format,
+                                   columns=[column.name for column in columns])
+        connection = sink.connect()
+        rows = connection.execute(f"SELECT user_email_sha256, city, postal_code "
+                                  f"FROM {sink.qualified_name('CRM_USERS')} ORDER BY 1").fetchall()
+        connection.close()
+    finally:
+        sink.close()
+    assert rows == [('a', 'Paris', '01234'), ('b', '', '75001'), ('c', None, 'SW1A 1AA')]
@@ -0,0 +1,20 @@
+import os
+from datetime import datetime
+
+import numpy as np
+
+from symmetri.etl.generators.common import Constants, UserPoolManager, Utilities
+from symmetri.etl.generators.transactions import SalesDataGenerator
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'loreal.yaml')
+
+
+def test_repeated_config_values_are_sampled(tmp_path):
+    constants = Constants(CONFIG)
+    utilities = Utilities(reference_time=datetime(2025, 6, 1, 12, 0, 0))
+    generator = SalesDataGenerator(UserPoolManager(constants, utilities), constants, utilities, str(tmp_path))
+
+    store_ids = generator._sample_categorical(np.array(['ST001', 'ST002', 'ST001']), 10_000,
+                                              np.random.default_rng(1))
+    assert list(store_ids.categories) == ['ST001', 'ST002']
+    assert 0.6 < np.mean(store_ids == 'ST001') < 0.73
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from symmetri.etl.validation import ForeignKeyCollector, KeySet
+
+FOREIGN_KEYS = [
+    ('CHILD', ('parent_id',), 'PARENT', ('id',)),
+    ('MAP', ('group_id', 'segment_id'), 'SEGMENTS', ('group_id', 'id')),
+]
+
+
+def test_children_are_checked_as_they_stream():
+    collector = ForeignKeyCollector(FOREIGN_KEYS)
+    # A child chunk may arrive before its parent keys
+    collector.add('CHILD', pd.DataFrame({'parent_id': [1, 2, 5, 5, 9]}))
+    collector.add('PARENT', pd.DataFrame({'id': [1, 2, 3, 5]}))
+    collector.add('CHILD', pd.DataFrame({'parent_id': np.array([3, 3, 11], dtype=np.int32)}))
+    collector.add('SEGMENTS', pd.DataFrame({'group_id': [1, 1, 2], 'id': [10, 11, 12]}))
+    collector.add('MAP', pd.DataFrame({'group_id': [1, 2, 2, 1], 'segment_id': [10, 12, 11, 11]}))
+
+    child, segment_map = collector.checks()
+    assert (child.rows, child.missing, child.missing_examples) == (8, 2, [9, 11])
+    assert (segment_map.rows, segment_map.missing, segment_map.missing_examples) == (4, 1, [(2, 11)])
+
+
+def test_keys_without_both_tables_are_not_checked():
+    collector = ForeignKeyCollector(FOREIGN_KEYS)
+    collector.add('CHILD', pd.DataFrame({'parent_id': [1]}))
+    assert collector.checks() == []
+
+
+def test_key_set_bitmap_and_sparse_keys():
+    ids = KeySet()
+    ids.add(np.arange(100, 200))
+    ids.add(np.arange(50, 60))
+    assert ids.contains(np.array([49, 50, 59, 60, 150, 199, 200, -5])).tolist() == [
+        False, True, True, False, True, True, False, False]
+
+    sparse = KeySet()
+    sparse.add(np.array([10 ** 15, 3]))
+    assert sparse.contains(np.array([3, 4, 10 ** 15])).tolist() == [True, False, True]
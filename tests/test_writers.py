@@ -0,0 +1,99 @@
+import datetime
+import gzip
+from decimal import Decimal
+
+import pandas as pd
+import pyarrow as pa
+
+from symmetri.db.base import Column, Table
+from symmetri.etl.writers import CsvGzipWriter, ParallelCsvWriter, arrow_schema, to_arrow_table
+
+TABLE = Table('ORDERS', [
+    Column('order_id', 'INTEGER', nullable=False),
+    Column('customer', 'VARCHAR'),
+    Column('channel', 'VARCHAR'),
+    Column('amount', 'DECIMAL(18,2)'),
+    Column('gift', 'BOOLEAN'),
+    Column('ordered_at', 'TIMESTAMP_NTZ(9)'),
+    Column('ship_date', 'DATE'),
+])
+
+
+def test_gzip_csv_keeps_the_to_csv_format(tmp_path):
+    chunk = to_arrow_table(pa.table({
+        'order_id': [1, 2, 3],
+        'customer': ['Ada', 'Smith, John', 'say "hi"'],
+        'channel': pa.array(['Web', 'Store', None]).dictionary_encode(),
+        'amount': pa.array([Decimal('12.50'), Decimal('3.00'), None], pa.decimal128(18, 2)),
+        'gift': [True, False, None],
+        'ordered_at': pa.array([datetime.datetime(2025, 4, 5, 8, 30, 57)] * 3, pa.timestamp('ns')),
+        'ship_date': pa.array([datetime.date(2025, 4, 7)] * 3, pa.date32()),
+    }), arrow_schema(TABLE))
+    path = str(tmp_path / 'orders.gz')
+    with CsvGzipWriter(path, TABLE) as writer:
+        writer.write(chunk.slice(0, 2))
+        writer.write(chunk.slice(2))
+
+    expected = pd.DataFrame({
+        'order_id': [1, 2, 3],
+        'customer': ['Ada', 'Smith, John', 'say "hi"'],
+        'channel': pd.Categorical(['Web', 'Store', None]),
+        'amount': [12.5, 3.0, None],
+        'gift': [True, False, None],
+        'ordered_at': pd.to_datetime(['2025-04-05 08:30:57'] * 3),
+        'ship_date': [datetime.date(2025, 4, 7)] * 3,
+    }).to_csv(index=False)
+    with gzip.open(path, 'rt', newline='') as csv_file:
+        text = csv_file.read()
+    assert text == expected
+    assert text.splitlines()[1:] == [
+        '1,Ada,Web,12.5,True,2025-04-05 08:30:57,2025-04-07',
+        '2,"Smith, John",Store,3.0,False,2025-04-05 08:30:57,2025-04-07',
+        '3,"say ""hi""",,,,2025-04-05 08:30:57,2025-04-07',
+    ]
+
+
+def test_gzip_csv_without_rows_has_a_header(tmp_path):
+    path = str(tmp_path / 'orders.gz')
+    CsvGzipWriter(path, TABLE).close()
+    with gzip.open(path, 'rt') as csv_file:
+        assert csv_file.read() == 'order_id,customer,channel,amount,gift,ordered_at,ship_date\n'
+
+
+def test_gzip_csv_tells_empty_strings_from_nulls(tmp_path):
+    table = Table('ORDERS', TABLE.columns[:3])
+    chunk = to_arrow_table(pa.table({
+        'order_id': [1, 2],
+        'customer': ['', None],
+        'channel': pa.array(['', None]).dictionary_encode(),
+    }), arrow_schema(table))
+    path = str(tmp_path / 'orders.gz')
+    with CsvGzipWriter(path, table) as writer:
+        writer.write(chunk)
+    with gzip.open(path, 'rt', newline='') as csv_file:
+        assert csv_file.read().splitlines()[1:] == ['1,"",""', '2,,']
+
+
+def test_parallel_csv_writes_the_gzip_csv_text(tmp_path):
+    chunk = to_arrow_table(pa.table({
+        'order_id': list(range(1, 8)),
+        'customer': ['Ada', 'Smith, John', '', None, 'say "hi"', 'Bo', 'Cy'],
+        'channel': pa.array(['Web', 'Store', '', None, 'Web', 'Web', 'Store']).dictionary_encode(),
+        'amount': pa.array([Decimal('12.50'), Decimal('3.00'), None, Decimal('0.10'), Decimal('1.00'),
+                            Decimal('2.25'), Decimal('7.00')], pa.decimal128(18, 2)),
+        'gift': [True, False, None, True, False, True, False],
+        'ordered_at': pa.array([datetime.datetime(2025, 4, 5, 8, 30, 57)] * 7, pa.timestamp('ns')),
+        'ship_date': pa.array([datetime.date(2025, 4, 7)] * 7, pa.date32()),
+    }), arrow_schema(TABLE))
+    texts = []
+    for writer in (CsvGzipWriter(str(tmp_path / 'orders.gz'), TABLE),
+                   ParallelCsvWriter(str(tmp_path / 'orders.csv.gz'), TABLE, threads=2, block_rows=2),
+                   ParallelCsvWriter(str(tmp_path / 'orders.zst'), TABLE, compression='zstd', block_rows=3)):
+        with writer:
+            writer.write(chunk.slice(0, 5))
+            writer.write(chunk.slice(5))
+        with pa.input_stream(writer.path, compression='detect') as stream:
+            texts.append(stream.read().decode('utf-8'))
+    assert texts[0] == texts[1] == texts[2]
+    assert texts[0].splitlines()[3:5] == ['3,"","",,,2025-04-05 08:30:57,2025-04-07',
+                                          '4,,,0.1,True,2025-04-05 08:30:57,2025-04-07']